@@ -0,0 +1,109 @@
+import asyncio
+import sqlite3
+
+import aiosqlite
+from quart import current_app, g
+
+import database
+
+# 异步部署（asgi.py）使用的数据库连接层，基于 aiosqlite，每个连接在各自的后台线程中执行查询
+
+
+# 创建并配置一个新的异步数据库连接
+async def connect(path=None, pragmas=None):
+    conn = await aiosqlite.connect(
+        path or database.DEFAULT_DB_PATH,
+        cached_statements=database.STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+
+    for name, value in (pragmas or database.DEFAULT_PRAGMAS).items():
+        await conn.execute(f'PRAGMA {name} = {value}')
+
+    return conn
+
+
+class AsyncConnectionPool:
+    """有界的异步连接池，连接全部被占用时后来的请求排队等待，而不是无限制地创建连接"""
+
+    def __init__(self, path, size=8, pragmas=None):
+        self.path = path
+        self.size = size
+        self.pragmas = pragmas
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    # 取出一个空闲连接，没有则新建
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+            return await connect(self.path, self.pragmas)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    # 归还连接，未提交的事务会被回滚
+    async def release(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    # 关闭所有空闲连接
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
+
+
+# 获取当前请求使用的数据库连接
+async def get_db():
+    if '_database' not in g:
+        g._database = await current_app.extensions['salus_aio_db'].acquire()
+    return g._database
+
+
+# 请求结束时把连接归还连接池
+async def release_db(exception=None):
+    conn = g.pop('_database', None)
+    if conn is not None:
+        await current_app.extensions['salus_aio_db'].release(conn)
+
+
+# 执行查询并返回所有行（字典列表）
+async def fetchall(query, params=()):
+    conn = await get_db()
+    async with conn.execute(query, params) as cursor:
+        return [dict(row) for row in await cursor.fetchall()]
+
+
+# 执行查询并返回第一行，没有时返回 None
+async def fetchone(query, params=()):
+    conn = await get_db()
+    async with conn.execute(query, params) as cursor:
+        row = await cursor.fetchone()
+    return dict(row) if row is not None else None
+
+
+# 在应用上注册异步数据库连接层
+def init_app(app):
+    app.config.setdefault('DATABASE', database.DEFAULT_DB_PATH)
+    app.config.setdefault('DATABASE_PRAGMAS', dict(database.DEFAULT_PRAGMAS))
+    app.config.setdefault('ASYNC_DATABASE_POOL_SIZE', 8)
+
+    @app.before_serving
+    async def open_pool():
+        app.extensions['salus_aio_db'] = AsyncConnectionPool(
+            app.config['DATABASE'],
+            size=app.config['ASYNC_DATABASE_POOL_SIZE'],
+            pragmas=app.config['DATABASE_PRAGMAS'],
+        )
+
+    @app.after_serving
+    async def close_pool():
+        await app.extensions['salus_aio_db'].close()
+
+    app.teardown_appcontext(release_db)
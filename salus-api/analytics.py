@@ -0,0 +1,276 @@
+import threading
+from datetime import date
+
+from database import read_transaction
+
+# numpy 为可选依赖，未安装时 /analytics 返回 501
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 长周期的康复数据分析：把完成汇总表和按 (周期, 日期) 聚合的任务实例以列式数组缓存在进程内存中，
+# 通过 analytics_changes 变更日志（见迁移 9）增量刷新，统计用 numpy 向量化计算
+
+# 日期在内存中表示为自 1970-01-01 起的天数
+_EPOCH = date(1970, 1, 1)
+_DAYS = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+
+# 滚动平均的默认窗口和最大窗口（天）
+DEFAULT_WINDOW = 7
+MAX_WINDOW = 90
+
+# 一次分析的最大天数（约 5 年）：每日序列按天数分配数组，范围不加限制时一个请求就能占满内存和 CPU
+MAX_DAYS = 1830
+
+# 完成汇总：(周期, 运动, 日期) 的完成次数和组数
+ROLLUP_SQL = f'''
+    SELECT r.cycle_id, r.exercise_id, {_DAYS.format('r.day')}, r.completions, r.total_sets
+    FROM completion_rollups r
+'''
+
+# 任务实例：每个 (周期, 日期) 计划的实例数和已完成的实例数
+OCCURRENCE_SQL = f'''
+    SELECT o.cycle_id, {_DAYS.format('o.occurs_on')}, COUNT(*), COALESCE(SUM(o.is_completed), 0)
+    FROM task_occurrences o
+'''
+
+# 内存中数组的列，与上面两个查询的结果列一一对应
+ROLLUP_FIELDS = [('cycle', 'i4'), ('exercise', 'i4'), ('day', 'i4'), ('completions', 'i4'), ('sets', 'i4')]
+OCCURRENCE_FIELDS = [('cycle', 'i4'), ('day', 'i4'), ('scheduled', 'i4'), ('completed', 'i4')]
+KEY_FIELDS = [('cycle', 'i4'), ('day', 'i4')]
+
+# 上次刷新之后发生变化的 (周期, 日期)
+CHANGED_KEYS = '''
+    WITH changed AS (
+        SELECT DISTINCT cycle_id, day FROM analytics_changes WHERE seq > ?
+    )
+'''
+
+
+# 'YYYY-MM-DD' 转换为天数
+def to_days(value):
+    return (date.fromisoformat(value) - _EPOCH).days
+
+
+# 天数数组转换为 'YYYY-MM-DD' 列表
+def to_dates(days):
+    return np.datetime_as_string(np.datetime64(_EPOCH, 'D') + np.asarray(days, dtype='i8'), unit='D').tolist()
+
+
+# 执行查询并把结果读入按列存放的数组 {列名: 数组}
+# 另加 key 列：(周期, 日期) 合并为一个 int64，用于按键替换增量数据
+def _fetch(cursor, sql, params, fields):
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    records = np.fromiter(rows, dtype=np.dtype(fields), count=len(rows))
+    columns = {name: np.ascontiguousarray(records[name]) for name, _ in fields}
+    columns['key'] = (columns['cycle'].astype('i8') << 32) | (columns['day'].astype('i8') & 0xFFFFFFFF)
+    return columns
+
+
+# 按布尔掩码筛选所有列
+def _select(columns, mask):
+    return {name: values[mask] for name, values in columns.items()}
+
+
+# 去掉 keys 中各键的旧行，追加新读取的行
+def _replace(columns, keys, rows):
+    keep = ~np.isin(columns['key'], keys)
+    return {name: np.concatenate([values[keep], rows[name]]) for name, values in columns.items()}
+
+
+class AnalyticsStore:
+    """进程内的列式数据快照，每次查询前按变更日志增量刷新"""
+
+    def __init__(self):
+        self.rollups = None
+        self.occurrences = None
+        self.seq = None
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self._lock = threading.Lock()
+
+    # 刷新到数据库的最新状态并返回 (完成汇总, 任务实例) 快照；变更日志与数据在同一个读事务中读取
+    def refresh(self, conn):
+        with self._lock, read_transaction(conn):
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # 分成两个子查询，MIN/MAX 才能各自直接读取主键两端，而不是扫描整个变更日志
+            cursor.execute('SELECT (SELECT MIN(seq) FROM analytics_changes), (SELECT MAX(seq) FROM analytics_changes)')
+            first, last = cursor.fetchone()
+            last = last or 0
+
+            if self.seq is None or (first is not None and first > self.seq + 1):
+                # 首次加载，或需要的变更已被清理
+                self._load_all(cursor)
+            elif last > self.seq:
+                self._load_changes(cursor)
+            self.seq = last
+
+            return self.rollups, self.occurrences
+
+    def _load_all(self, cursor):
+        self.rollups = _fetch(cursor, ROLLUP_SQL, (), ROLLUP_FIELDS)
+        self.occurrences = _fetch(cursor, f'{OCCURRENCE_SQL} GROUP BY o.cycle_id, o.occurs_on', (), OCCURRENCE_FIELDS)
+        self.full_loads += 1
+
+    # 只重新读取变化过的 (周期, 日期)，替换掉旧数据中对应的行
+    def _load_changes(self, cursor):
+        changed = _fetch(
+            cursor, f'{CHANGED_KEYS} SELECT cycle_id, {_DAYS.format("day")} FROM changed', (self.seq,), KEY_FIELDS
+        )
+        rollups = _fetch(
+            cursor,
+            f'{CHANGED_KEYS} {ROLLUP_SQL} JOIN changed c ON r.cycle_id = c.cycle_id AND r.day = c.day',
+            (self.seq,), ROLLUP_FIELDS
+        )
+        occurrences = _fetch(
+            cursor,
+            f'{CHANGED_KEYS} {OCCURRENCE_SQL} JOIN changed c ON o.occurs_on = c.day AND o.cycle_id = c.cycle_id '
+            'GROUP BY o.cycle_id, o.occurs_on',
+            (self.seq,), OCCURRENCE_FIELDS
+        )
+
+        self.rollups = _replace(self.rollups, changed['key'], rollups)
+        self.occurrences = _replace(self.occurrences, changed['key'], occurrences)
+        self.incremental_loads += 1
+
+    def stats(self):
+        return {
+            "seq": self.seq,
+            "rollup_rows": 0 if self.rollups is None else len(self.rollups['key']),
+            "occurrence_rows": 0 if self.occurrences is None else len(self.occurrences['key']),
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads,
+        }
+
+
+# 以 window 天为窗口的尾随平均，开头不足一个窗口时按已有天数平均
+def rolling_mean(values, window):
+    sums = np.concatenate([[0.0], np.cumsum(values, dtype='f8')])
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+
+# 连续有完成记录的天数：最长一段及截止到最后一天的当前一段
+def streaks(active, start):
+    padded = np.concatenate([[False], active, [False]]).astype('i1')
+    edges = np.flatnonzero(np.diff(padded))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    if len(run_starts) == 0:
+        return {"current": 0, "longest": 0, "longest_start": None, "longest_end": None}
+
+    lengths = run_ends - run_starts
+    best = int(np.argmax(lengths))
+    first, last = to_dates([start + run_starts[best], start + run_ends[best] - 1])
+    return {
+        "current": int(lengths[-1]) if run_ends[-1] == len(active) else 0,
+        "longest": int(lengths[best]),
+        "longest_start": first,
+        "longest_end": last,
+    }
+
+
+# 按筛选条件计算统计；未指定日期范围时取数据覆盖的范围
+# exercises 为 {运动ID: 名称}
+def compute(rollups, occurrences, exercises, cycle_id=None, start_date=None, end_date=None, window=DEFAULT_WINDOW):
+    if cycle_id is not None:
+        rollups = _select(rollups, rollups['cycle'] == cycle_id)
+        occurrences = _select(occurrences, occurrences['cycle'] == cycle_id)
+
+    # 未指定的一端取数据覆盖的日期，并限制在 MAX_DAYS 天以内；两端都指定时由调用方检查范围
+    start = to_days(start_date) if start_date else None
+    end = to_days(end_date) if end_date else None
+    days = np.concatenate([rollups['day'], occurrences['day']])
+    if len(days):
+        if end is None:
+            end = int(days.max()) if start is None else min(int(days.max()), start + MAX_DAYS - 1)
+        if start is None:
+            start = max(int(days.min()), end - MAX_DAYS + 1)
+
+    empty = {
+        "start_date": start_date, "end_date": end_date, "window": window,
+        "daily": [], "weekly": [], "exercise_weekly": [],
+        "streaks": streaks(np.zeros(0, dtype=bool), 0),
+    }
+    if start is None or end is None or end < start:
+        return empty
+
+    rollups = _select(rollups, (rollups['day'] >= start) & (rollups['day'] <= end))
+    occurrences = _select(occurrences, (occurrences['day'] >= start) & (occurrences['day'] <= end))
+    length = end - start + 1
+
+    # 每日序列
+    day_index = rollups['day'] - start
+    occurrence_index = occurrences['day'] - start
+    completions = np.bincount(day_index, weights=rollups['completions'], minlength=length)
+    sets = np.bincount(day_index, weights=rollups['sets'], minlength=length)
+    scheduled = np.bincount(occurrence_index, weights=occurrences['scheduled'], minlength=length)
+    completed = np.bincount(occurrence_index, weights=occurrences['completed'], minlength=length)
+    completions_avg = rolling_mean(completions, window)
+    sets_avg = rolling_mean(sets, window)
+    dates = to_dates(np.arange(start, end + 1))
+
+    daily = [
+        {
+            "date": day, "completions": int(c), "total_sets": int(s),
+            "scheduled": int(sc), "completed": int(cd),
+            "completions_avg": round(float(ca), 2), "sets_avg": round(float(sa), 2),
+        }
+        for day, c, s, sc, cd, ca, sa in zip(dates, completions, sets, scheduled, completed, completions_avg, sets_avg)
+    ]
+
+    # 按周（周一开始）汇总；1970-01-01 为周四
+    first_monday = start - (start + 3) % 7
+    week_of_day = (np.arange(start, end + 1) - first_monday) // 7
+    weeks = int(week_of_day[-1]) + 1
+    weekly_values = [
+        np.bincount(week_of_day, weights=values, minlength=weeks)
+        for values in (scheduled, completed, completions, sets)
+    ]
+    week_dates = to_dates(first_monday + 7 * np.arange(weeks))
+    weekly = [
+        {
+            "week": week, "scheduled": int(sc), "completed": int(cd),
+            "adherence": round(float(cd) / float(sc), 4) if sc else None,
+            "completions": int(c), "total_sets": int(s),
+        }
+        for week, sc, cd, c, s in zip(week_dates, *weekly_values)
+    ]
+
+    # 每周各运动的完成次数和组数
+    exercise_ids, exercise_index = np.unique(rollups['exercise'], return_inverse=True)
+    exercise_weekly = []
+    if len(exercise_ids):
+        key = week_of_day[day_index] * len(exercise_ids) + exercise_index
+        cells = weeks * len(exercise_ids)
+        counts = np.bincount(key, weights=rollups['completions'], minlength=cells)
+        totals = np.bincount(key, weights=rollups['sets'], minlength=cells)
+        for cell in np.flatnonzero(counts):
+            week, exercise = divmod(int(cell), len(exercise_ids))
+            exercise_id = int(exercise_ids[exercise])
+            exercise_weekly.append({
+                "week": week_dates[week],
+                "exercise_id": exercise_id,
+                "name": exercises.get(exercise_id),
+                "completions": int(counts[cell]),
+                "total_sets": int(totals[cell]),
+            })
+
+    return {
+        **empty,
+        "start_date": dates[0],
+        "end_date": dates[-1],
+        "daily": daily,
+        "weekly": weekly,
+        "exercise_weekly": exercise_weekly,
+        "streaks": streaks(completions > 0, start),
+    }
+
+
+# 在应用上注册列式数据缓存，未安装 numpy 时不注册
+def init_app(app):
+    if np is not None:
+        app.extensions['salus_analytics'] = AnalyticsStore()
@@ -1,19 +1,85 @@
 from flask import Flask
 from flask_cors import CORS
+import analytics
+import cache
+import database
+import jobs
+import llm
+import metrics
+import migrations
+import ocr
+import plan_import
+import result_cache
+import rollups
 # 确保导入所有蓝图
 from routes.exercises import exercises_bp
 from routes.tasks import tasks_bp
 from routes.completions import completions_bp
 from routes.cycles import cycles_bp
+from routes.dashboard import dashboard_bp
+from routes.analytics import analytics_bp
+from routes.ocr import ocr_bp
+from routes.plans import plans_bp
+from routes.jobs import jobs_bp
+from routes.llm import llm_bp
 
-app = Flask(__name__)
-CORS(app)
 
-# 注册所有蓝图
-app.register_blueprint(exercises_bp)
-app.register_blueprint(tasks_bp)
-app.register_blueprint(completions_bp)
-app.register_blueprint(cycles_bp)
+# 应用工厂，config 用于覆盖默认配置（如 DATABASE、AUTO_MIGRATE）
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_prefixed_env('SALUS')
+    if config:
+        app.config.update(config)
+
+    CORS(app)
+
+    # 注册数据库连接层
+    database.init_app(app)
+
+    # 启动时执行数据库迁移
+    migrations.init_app(app)
+
+    # 注册汇总表维护命令
+    rollups.init_app(app)
+
+    # 注册响应缓存
+    cache.init_app(app)
+
+    # 注册请求与SQL语句的性能指标
+    metrics.init_app(app)
+
+    # 注册数据分析使用的列式数据缓存
+    analytics.init_app(app)
+
+    # 注册 OCR 与大模型结果的持久化缓存
+    result_cache.init_app(app)
+
+    # 注册常驻的表格识别（OCR）服务
+    ocr.init_app(app)
+
+    # 注册常驻的大模型生成服务（医嘱表格导入、流式生成）
+    llm.init_app(app)
+
+    # 注册医嘱表格导入的配置（结构化输出、思考过程、重新生成次数）
+    plan_import.init_app(app)
+
+    # 注册后台任务队列（OCR、计划导入等耗时任务）
+    jobs.init_app(app)
+
+    # 注册所有蓝图
+    app.register_blueprint(exercises_bp)
+    app.register_blueprint(tasks_bp)
+    app.register_blueprint(completions_bp)
+    app.register_blueprint(cycles_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(ocr_bp)
+    app.register_blueprint(plans_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(llm_bp)
+
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=False, port=5000)
+    create_app().run(debug=False, port=5000)
@@ -0,0 +1,103 @@
+# 异步部署入口：hypercorn asgi:app
+# GET 读接口由 Quart + aiosqlite 在事件循环中处理（routes/async_reads.py），长时间的查询不会占住 worker；
+# 其余请求（写接口、OPTIONS 预检等）转发给同步的 Flask 应用，在有界线程池中执行。
+# SQLite 同一时刻只允许一个写事务，写接口异步化不会带来额外的并发，因此沿用同步实现
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import ClosingIterator
+
+import aio_database
+import cache
+from app import create_app as create_wsgi_app
+from config import get_bool
+from routes.async_reads import async_reads_bp
+
+# 与同步应用共用的配置项
+SHARED_CONFIG = ('DATABASE', 'DATABASE_PRAGMAS', 'RESPONSE_CACHE', 'RESPONSE_CACHE_MAX_ENTRIES')
+
+
+# hypercorn 的 WSGI 适配在响应体为空（如 OPTIONS 预检）时不会发送响应头，在末尾补一个空块
+def non_empty_body(wsgi_app):
+    def wrapped(environ, start_response):
+        body = wsgi_app(environ, start_response)
+        return ClosingIterator(chain(body, [b'']), getattr(body, 'close', None))
+    return wrapped
+
+
+class Dispatcher:
+    """按路由把请求分发给异步应用或同步应用"""
+
+    def __init__(self, async_app, wsgi_app, max_body_size):
+        self.async_app = async_app
+        self.wsgi = AsyncioWSGIMiddleware(non_empty_body(wsgi_app), max_body_size=max_body_size)
+        self._urls = async_app.url_map.bind('localhost')
+
+    # 只有异步应用注册了的 GET/HEAD 路由交给异步应用
+    def is_async(self, scope):
+        if scope['method'] not in ('GET', 'HEAD'):
+            return False
+        try:
+            self._urls.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return False
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not self.is_async(scope):
+            await self.wsgi(scope, receive, send)
+        else:
+            # lifespan 事件交给异步应用，用于建立和关闭连接池
+            await self.async_app(scope, receive, send)
+
+
+# 创建异步部署的 ASGI 应用，config 同时作用于同步应用
+def create_app(config=None):
+    # 同步应用负责迁移和写接口
+    wsgi_app = create_wsgi_app(config)
+
+    async_app = Quart(__name__)
+    async_app.config.update({key: wsgi_app.config[key] for key in SHARED_CONFIG})
+    async_app.config.from_prefixed_env('SALUS')
+    if config:
+        async_app.config.update(config)
+    async_app.config.setdefault('ASYNC_WSGI_THREADS', 8)
+    async_app.config.setdefault('ASYNC_MAX_BODY_SIZE', 16 * 1024 * 1024)
+
+    # 注册异步数据库连接层
+    aio_database.init_app(async_app)
+
+    # 读接口的响应缓存（与同步应用各自独立）
+    if get_bool(async_app.config, 'RESPONSE_CACHE'):
+        async_app.extensions['salus_cache'] = cache.ResponseCache(async_app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+
+        @async_app.route('/cache/stats')
+        async def cache_stats():
+            return jsonify(async_app.extensions['salus_cache'].stats())
+
+    async_app.register_blueprint(async_reads_bp)
+
+    # 转发给同步应用的请求在有界线程池中执行
+    @async_app.before_serving
+    async def bound_executor():
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(async_app.config['ASYNC_WSGI_THREADS'], thread_name_prefix='salus-wsgi')
+        )
+
+    # 与同步应用（flask_cors 默认配置）的 CORS 响应头一致
+    @async_app.after_request
+    async def allow_cors(response):
+        origin = request.headers.get('Origin')
+        response.headers['Access-Control-Allow-Origin'] = origin or '*'
+        if origin:
+            response.vary.add('Origin')
+        return response
+
+    return Dispatcher(async_app, wsgi_app, async_app.config['ASYNC_MAX_BODY_SIZE'])
+
+
+app = create_app()
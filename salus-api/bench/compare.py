@@ -0,0 +1,84 @@
+import argparse
+import json
+import sys
+
+# 对比两份 bench/run.py 生成的报告，某个场景的延迟增长超过阈值时视为性能回退并返回非零退出码
+# 示例：python bench/compare.py before.json after.json --threshold 0.2
+
+# 默认比较的指标
+DEFAULT_METRICS = ('p50_ms', 'p90_ms')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 返回 (对比行, 回退列表, 提示信息)
+# 对比行为 (场景, 指标, 旧值, 新值, 变化比例)；变化同时超过比例阈值和绝对阈值才算回退，避免亚毫秒级的抖动误报
+def compare(before, after, metrics=DEFAULT_METRICS, threshold=0.2, min_delta_ms=1.0):
+    rows = []
+    regressions = []
+    notes = []
+
+    if before['meta'].get('dataset') != after['meta'].get('dataset'):
+        notes.append('两份报告使用的数据量不同，结果仅供参考')
+    for key in ('iterations', 'concurrency', 'response_cache'):
+        if before['meta'].get(key) != after['meta'].get(key):
+            notes.append(f'两份报告的 {key} 不同：{before["meta"].get(key)} / {after["meta"].get(key)}')
+
+    for name in sorted(set(before['scenarios']) | set(after['scenarios'])):
+        old = before['scenarios'].get(name)
+        new = after['scenarios'].get(name)
+        if old is None or new is None:
+            notes.append(f'场景 {name} 只存在于{"新" if old is None else "旧"}报告中')
+            continue
+
+        if new['errors'] and not old['errors']:
+            regressions.append((name, 'errors', old['errors'], new['errors'], None))
+
+        for metric in metrics:
+            change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            row = (name, metric, old[metric], new[metric], change)
+            rows.append(row)
+            if change > threshold and new[metric] - old[metric] > min_delta_ms:
+                regressions.append(row)
+
+    return rows, regressions, notes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两份 Salus 基准测试报告')
+    parser.add_argument('before', help='基准报告（如修改前的提交）')
+    parser.add_argument('after', help='待检查的报告')
+    parser.add_argument('--metrics', default=','.join(DEFAULT_METRICS), help='比较的指标，逗号分隔')
+    parser.add_argument('--threshold', type=float, default=0.2, help='延迟增长比例阈值，默认 0.2 即 20%%')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='延迟增长的绝对阈值（毫秒）')
+    args = parser.parse_args(argv)
+
+    before = load(args.before)
+    after = load(args.after)
+    rows, regressions, notes = compare(
+        before, after, args.metrics.split(','), args.threshold, args.min_delta_ms
+    )
+
+    print(f'{before["meta"].get("commit") or "?"} -> {after["meta"].get("commit") or "?"}')
+    for note in notes:
+        print(f'注意：{note}')
+    for name, metric, old, new, change in rows:
+        flag = ' <- 回退' if (name, metric, old, new, change) in regressions else ''
+        print(f'{name:32} {metric:8} {old:10.3f} -> {new:10.3f}  {change:+7.1%}{flag}')
+
+    for name, metric, old, new, _ in regressions:
+        if metric == 'errors':
+            print(f'{name}: 新报告出现错误请求 ({old} -> {new})')
+
+    if regressions:
+        print(f'发现 {len(regressions)} 项性能回退')
+        return 1
+    print('没有发现性能回退')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import migrations
+import occurrences
+
+# 生成压测用的合成数据库：运动类型、康复周期、每个周期的训练任务及完成记录
+# 示例：python bench/generate_data.py --db bench.db --cycles 1000 --completions 1000000
+# 生成后在压测数据上检查热点查询的执行计划（与 migrations.py --check 相同），出现全表扫描时返回 1
+
+# 每批插入的行数
+BATCH_SIZE = 10000
+
+# 周期的开始日期从该日起按天错开
+FIRST_DAY = date(2025, 1, 6)
+
+
+def batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(conn, cycles, exercises, tasks_per_cycle, completions, cycle_weeks, seed):
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    counts = {}
+
+    cursor.executemany(
+        'INSERT INTO exercises (name, duration_sec, rest_sec, description) VALUES (?, ?, ?, ?)',
+        [(f'运动{i:04d}', rng.choice([5, 10, 20, 30]), rng.choice([5, 10, 20]), f'合成数据 {i}') for i in range(exercises)]
+    )
+    exercise_ids = [row[0] for row in cursor.execute('SELECT id FROM exercises')]
+
+    cycle_rows = []
+    for i in range(cycles):
+        start = FIRST_DAY + timedelta(days=i % 365)
+        cycle_rows.append((f'周期{i:05d}', start.isoformat(), (start + timedelta(weeks=cycle_weeks, days=-1)).isoformat(), ''))
+    cursor.executemany('INSERT INTO recovery_cycles (name, start_date, end_date, notes) VALUES (?, ?, ?, ?)', cycle_rows)
+    cycle_ids = [row[0] for row in cursor.execute('SELECT id FROM recovery_cycles')]
+
+    # 约一半任务每天执行，其余每周固定一天
+    def task_rows():
+        for cycle_id in cycle_ids:
+            for _ in range(tasks_per_cycle):
+                yield (
+                    cycle_id,
+                    rng.choice(exercise_ids),
+                    f'{rng.randint(6, 21):02d}:{rng.choice([0, 15, 30, 45]):02d}:00',
+                    rng.randint(1, 5),
+                    rng.choice([None, rng.randint(0, 6)]),
+                )
+    for batch in batched(task_rows()):
+        cursor.executemany(
+            'INSERT INTO training_tasks (cycle_id, exercise_id, scheduled_time, sets, day_of_week) VALUES (?, ?, ?, ?, ?)',
+            batch
+        )
+
+    occurrences.sync_occurrences(cursor)
+
+    # 完成记录随机分布在已生成的任务实例上，完成时间为实例日期的计划时间之后
+    # （实例和任务的完成状态由触发器更新）
+    cursor.execute('''
+        SELECT o.id, o.task_id, o.occurs_on, t.scheduled_time, t.sets
+        FROM task_occurrences o JOIN training_tasks t ON o.task_id = t.id
+    ''')
+    instances = cursor.fetchall()
+
+    def completion_rows():
+        for _ in range(completions):
+            occurrence_id, task_id, occurs_on, scheduled_time, sets = rng.choice(instances)
+            minutes = rng.randint(0, 59)
+            yield (
+                task_id,
+                occurrence_id,
+                f'{occurs_on} {scheduled_time[:3]}{minutes:02d}:00',
+                rng.randint(max(sets - 1, 0), sets),
+            )
+    for batch in batched(completion_rows()):
+        cursor.executemany(
+            'INSERT INTO completions (task_id, occurrence_id, completed_at, actual_sets, notes) VALUES (?, ?, ?, ?, \'\')',
+            batch
+        )
+
+    for table in ('exercises', 'recovery_cycles', 'training_tasks', 'task_occurrences', 'completions', 'completion_rollups'):
+        counts[table] = cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成 Salus 压测数据库')
+    parser.add_argument('--db', required=True, help='输出的数据库文件路径（已存在时需指定 --force）')
+    parser.add_argument('--cycles', type=int, default=1000, help='康复周期数')
+    parser.add_argument('--exercises', type=int, default=50, help='运动类型数')
+    parser.add_argument('--tasks-per-cycle', type=int, default=8, help='每个周期的训练任务数')
+    parser.add_argument('--completions', type=int, default=1000000, help='完成记录数')
+    parser.add_argument('--cycle-weeks', type=int, default=12, help='每个周期的周数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，相同参数和种子生成相同数据')
+    parser.add_argument('--force', action='store_true', help='覆盖已存在的数据库文件')
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f'{args.db} 已存在，使用 --force 覆盖')
+            return 1
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    started = time.perf_counter()
+    conn = database.connect(args.db)
+    try:
+        migrations.migrate(conn)
+        database.begin_write(conn)
+        counts = generate(
+            conn, args.cycles, args.exercises, args.tasks_per_cycle,
+            args.completions, args.cycle_weeks, args.seed
+        )
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        # 空库上的执行计划看不出数据量大时的问题，生成后在压测数据上再检查一次热点查询
+        failures = migrations.check_query_plans(conn)
+    finally:
+        conn.close()
+
+    for table, count in counts.items():
+        print(f'{table}: {count}')
+    print(f'耗时 {time.perf_counter() - started:.1f} 秒')
+
+    for name, scans in failures:
+        print(f'查询 {name} 出现全表扫描: {"; ".join(scans)}')
+    if failures:
+        return 1
+    print('所有热点查询均使用索引')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# 对运行中的服务做并发压测，统计吞吐量和延迟分位数，用于比较不同部署方式
+# 示例：python bench/http_load.py --url http://127.0.0.1:5000 --clients 16 --duration 20
+
+# 默认压测的接口，写接口每次完成一个任务后再删除该完成记录，保持数据量不变
+DEFAULT_PATHS = [
+    '/exercises',
+    '/cycles',
+    '/tasks?date={today}',
+    '/completions?limit=50',
+    '/completions/stats',
+]
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def request(method, url, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+# 单个客户端：在截止时间前循环请求，记录 (接口, 耗时秒, 状态码)
+def client(base_url, paths, write_task_id, deadline, results, offset):
+    index = offset
+    while time.perf_counter() < deadline:
+        if write_task_id is not None and index % (len(paths) + 1) == len(paths):
+            name = 'POST /completions + DELETE'
+            start = time.perf_counter()
+            status, body = request('POST', f'{base_url}/completions', {'task_id': write_task_id, 'actual_sets': 1})
+            if status == 201:
+                status, _ = request('DELETE', f'{base_url}/completions/{json.loads(body)["id"]}')
+        else:
+            path = paths[index % len(paths)]
+            name = f'GET {path}'
+            start = time.perf_counter()
+            status, _ = request('GET', base_url + path)
+        results.append((name, time.perf_counter() - start, status))
+        index += 1
+
+
+def run(base_url, paths, clients, duration, write_task_id=None):
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(base_url, paths, write_task_id, deadline, results, i))
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "url": base_url,
+        "clients": clients,
+        "duration_sec": round(elapsed, 2),
+        "requests": len(results),
+        "errors": sum(1 for _, _, status in results if status >= 400),
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "endpoints": {}
+    }
+    for name in sorted({name for name, _, _ in results}):
+        latencies = [latency * 1000 for n, latency, _ in results if n == name]
+        report["endpoints"][name] = {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus API 并发压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='服务地址')
+    parser.add_argument('--clients', type=int, default=16, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=20, help='压测时长（秒）')
+    parser.add_argument('--write-task-id', type=int, help='指定任务ID时混入完成/删除完成记录的写请求')
+    args = parser.parse_args(argv)
+
+    paths = [path.format(today=time.strftime('%Y-%m-%d')) for path in DEFAULT_PATHS]
+    report = run(args.url.rstrip('/'), paths, args.clients, args.duration, args.write_task_id)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
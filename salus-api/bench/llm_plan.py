@@ -0,0 +1,126 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm
+from http_load import percentile
+from llm_prefix import patient_table
+from llm_throughput import default_prompt
+from plan_import import PlanError, extract_plan, parse_table
+from run import git_revision
+
+# 训练计划提取测试：比较自由输出（保留或关闭思考过程）与按 PLAN_SCHEMA 约束输出时，
+# 每份计划生成的 token 数、耗时、重新生成次数和成功率，用于估算导入的生成开销。
+# 每种方式单独加载模型并预热，不使用结果缓存
+#   thinking    自由输出，保留 Qwen3 的思考过程（计划导入改为结构化输出之前的方式）
+#   free        自由输出，关闭思考过程
+#   structured  按 PLAN_SCHEMA 约束输出（PLAN_STRUCTURED_OUTPUT 的默认值）
+# 示例：python bench/llm_plan.py --repeat 3 --output plan.json
+
+MODES = {
+    'thinking': {"structured": False, "thinking": True},
+    'free': {"structured": False, "thinking": False},
+    'structured': {"structured": True, "thinking": False},
+}
+
+
+def measure(args, rows, mode):
+    service = llm.LLMService(
+        args.model_dir, device=args.device, max_new_tokens=args.max_new_tokens, kv_cache_gb=args.kv_cache_gb,
+    )
+    service.start()
+    service.ready.wait()
+    if service.warmup_seconds is None:
+        raise SystemExit(f'模型加载失败：{args.model_dir}')
+
+    plans = []
+    for i in range(args.repeat):
+        try:
+            tasks, generation = extract_plan(
+                service, [patient_table(rows, i)], max_attempts=args.max_attempts, **MODES[mode]
+            )
+            plans.append({"tasks": len(tasks), **generation})
+        except PlanError as e:
+            # 生成失败的计划同样计入 token 数
+            plans.append({"tasks": None, "error": str(e), **e.generation})
+
+    report = {
+        "plans": len(plans),
+        "succeeded": sum(plan['tasks'] is not None for plan in plans),
+        "tokens_p50": percentile([plan['tokens'] for plan in plans], 50),
+        "tokens_max": max(plan['tokens'] for plan in plans),
+        "seconds_p50": round(percentile([plan['seconds'] for plan in plans], 50), 3),
+        "attempts": sum(plan['attempts'] for plan in plans),
+        "results": plans,
+    }
+
+    service.pipe = None
+    del service
+    gc.collect()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus 训练计划提取测试')
+    parser.add_argument('--model-dir', default=llm.DEFAULT_MODEL_DIR, help='Qwen3 OpenVINO 模型目录')
+    parser.add_argument('--device', default=llm.DEFAULT_DEVICE, help='推理设备')
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式提取的计划数（表格行的顺序轮换）')
+    parser.add_argument('--max-new-tokens', type=int, default=llm.DEFAULT_MAX_NEW_TOKENS, help='每次最多生成的 token 数')
+    parser.add_argument('--max-attempts', type=int, default=3, help='输出无效时最多生成几次')
+    parser.add_argument('--kv-cache-gb', type=float, default=llm.DEFAULT_KV_CACHE_GB, help='KV 缓存大小（GB），0 为按需分配')
+    parser.add_argument('--modes', default='thinking,free,structured', help='比较的输出方式，逗号分隔')
+    parser.add_argument('--output', help='报告输出路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    if llm.ov_genai is None:
+        print('需要安装 openvino-genai', file=sys.stderr)
+        return 1
+    if not os.path.isdir(args.model_dir):
+        print(f'模型不存在：{args.model_dir}', file=sys.stderr)
+        return 1
+
+    rows = parse_table(default_prompt())
+
+    results = {}
+    for mode in args.modes.split(','):
+        results[mode] = measure(args, rows, mode)
+        result = results[mode]
+        print(f'{mode}: 成功 {result["succeeded"]}/{result["plans"]}, 每份计划 token p50 {result["tokens_p50"]}, '
+              f'耗时 p50 {result["seconds_p50"]} s', file=sys.stderr)
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_dir": args.model_dir,
+            "device": args.device,
+            "repeat": args.repeat,
+            "max_new_tokens": args.max_new_tokens,
+            "max_attempts": args.max_attempts,
+        },
+        "modes": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
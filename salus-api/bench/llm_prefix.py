@@ -0,0 +1,125 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm
+from http_load import percentile
+from llm_throughput import default_prompt
+from plan_import import PLAN_PROMPT, parse_table, to_markdown
+from run import git_revision
+
+# 前缀缓存测试：用计划导入的提示词（固定指令 + 医嘱表格）逐个生成，比较关闭和开启前缀缓存时的首 token 延迟。
+# 每种设置单独加载模型并预热，不使用结果缓存。两种场景：
+#   shared     每次的表格不同（表格行的顺序轮换），只有指令部分相同，相当于不同患者的导入
+#   identical  每次的表格相同，相当于同一张表格重新导入（结果缓存关闭或生成参数不同时）
+# 示例：python bench/llm_prefix.py --repeat 5 --output prefix.json
+
+
+# 第 index 个患者的表格：表头不变，其余行轮换顺序
+def patient_table(rows, index):
+    body = rows[1:]
+    shift = index % len(body)
+    return to_markdown([rows[0]] + body[shift:] + body[:shift])
+
+
+# 提示词经对话模板包装后的 token 数
+def count_tokens(service, system, prompt):
+    req = llm.Request(0, prompt, service.generation_config(1), None, system=system)
+    return int(service.tokenizer.encode(service._chat_prompt(req)).input_ids.get_shape()[1])
+
+
+def measure(args, rows, prefix_caching):
+    service = llm.LLMService(
+        args.model_dir, device=args.device, max_new_tokens=args.max_new_tokens,
+        kv_cache_gb=args.kv_cache_gb, prefix_caching=prefix_caching,
+    )
+    service.start()
+    service.ready.wait()
+    if service.warmup_seconds is None:
+        raise SystemExit(f'模型加载失败：{args.model_dir}')
+
+    report = {}
+    for scenario in ('shared', 'identical'):
+        ttft = []
+        for i in range(args.repeat):
+            # identical 场景使用 shared 场景没有用过的表格，第一次生成同样没有可复用的表格部分
+            index = i if scenario == 'shared' else args.repeat
+            system, prompt = PLAN_PROMPT.render(tables=patient_table(rows, index))
+            ttft.append(service.generate(prompt, system=system)['ttft_s'])
+        report[scenario] = {
+            "first_s": ttft[0],
+            "repeat_p50_s": round(percentile(ttft[1:], 50), 3) if len(ttft) > 1 else None,
+            "ttft_s": ttft,
+        }
+
+    system, prompt = PLAN_PROMPT.render(tables=patient_table(rows, 0))
+    report["prompt_tokens"] = count_tokens(service, system, prompt)
+    report["instruction_tokens"] = count_tokens(service, system, '')
+
+    service.pipe = None
+    del service
+    gc.collect()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus 大模型前缀缓存测试')
+    parser.add_argument('--model-dir', default=llm.DEFAULT_MODEL_DIR, help='Qwen3 OpenVINO 模型目录')
+    parser.add_argument('--device', default=llm.DEFAULT_DEVICE, help='推理设备')
+    parser.add_argument('--repeat', type=int, default=5, help='每种场景生成的次数')
+    parser.add_argument('--max-new-tokens', type=int, default=8, help='每次生成的 token 数（只测首 token，不需要很长）')
+    parser.add_argument('--kv-cache-gb', type=float, default=llm.DEFAULT_KV_CACHE_GB, help='KV 缓存大小（GB），0 为按需分配')
+    parser.add_argument('--output', help='报告输出路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    if llm.ov_genai is None:
+        print('需要安装 openvino-genai', file=sys.stderr)
+        return 1
+    if not os.path.isdir(args.model_dir):
+        print(f'模型不存在：{args.model_dir}', file=sys.stderr)
+        return 1
+
+    rows = parse_table(default_prompt())
+
+    results = {}
+    for name, prefix_caching in (('off', False), ('on', True)):
+        results[name] = measure(args, rows, prefix_caching)
+        result = results[name]
+        print(f'前缀缓存 {name}: 不同表格首 token p50 {result["shared"]["repeat_p50_s"]} s, '
+              f'相同表格 {result["identical"]["repeat_p50_s"]} s', file=sys.stderr)
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_dir": args.model_dir,
+            "device": args.device,
+            "repeat": args.repeat,
+            "max_new_tokens": args.max_new_tokens,
+        },
+        "prefix_caching": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm
+from http_load import percentile
+from run import git_revision
+
+# 大模型并发生成测试：同时提交一组提示词，比较逐个生成（LLMPipeline）与连续批处理（ContinuousBatchingPipeline）
+# 的总吞吐量和每个请求的延迟。每种调度方式单独加载模型并预热，不使用结果缓存
+# 示例：python bench/llm_throughput.py --prompts prompts/ --concurrency 4 --max-new-tokens 512 --output llm.json
+# 没有提供提示词时使用 mcp/qwen3_genai.py 中的医嘱表格，每个请求在末尾加上序号，避免相同提示词
+
+
+# 读取提示词文件（每个文件一个提示词）和目录中的 .txt 文件
+def load_prompts(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(os.path.join(item, name) for name in sorted(os.listdir(item)) if name.endswith('.txt'))
+        else:
+            paths.append(item)
+
+    prompts = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            prompts.append(f.read())
+    return prompts
+
+
+# 默认提示词：mcp/qwen3_genai.py 中的医嘱表格
+def default_prompt():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mcp', 'qwen3_genai.py')
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    return source.split("input_prompt = '''", 1)[1].split("'''", 1)[0]
+
+
+def summarize(samples):
+    return {
+        "p50": round(percentile(samples, 50), 3),
+        "p90": round(percentile(samples, 90), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+# 用指定的调度方式同时提交全部提示词，每个请求来自不同的客户端
+def measure(args, prompts, batching):
+    service = llm.LLMService(
+        args.model_dir, device=args.device, max_new_tokens=args.max_new_tokens, batching=batching,
+        batch_size=args.batch_size, max_queued=len(prompts), kv_cache_gb=args.kv_cache_gb,
+    )
+    service.start()
+    service.ready.wait()
+    if service.warmup_seconds is None:
+        raise SystemExit(f'模型加载失败：{args.model_dir}')
+
+    results = [None] * len(prompts)
+
+    def run(index):
+        results[index] = service.generate(prompts[index], client=index)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(prompts))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    tokens = sum(result['tokens'] for result in results)
+    report = {
+        "requests": len(prompts),
+        "seconds": round(elapsed, 3),
+        "tokens": tokens,
+        "tokens_per_sec": round(tokens / elapsed, 2),
+        "requests_per_minute": round(len(prompts) / elapsed * 60, 2),
+        "latency_s": summarize([result['seconds'] for result in results]),
+        "queue_s": summarize([result['queue_s'] for result in results]),
+        # 从提交到第一个 token，包含排队时间
+        "first_token_s": summarize([result['queue_s'] + (result['ttft_s'] or 0) for result in results]),
+        "decode_tokens_per_sec": summarize([result['tokens_per_sec'] or 0 for result in results]),
+        "peak_batch": service.peak_batch,
+        "load_seconds": round(service.load_seconds, 3),
+        "warmup_seconds": round(service.warmup_seconds, 3),
+    }
+
+    # 释放模型后再加载下一种调度方式，避免两份模型同时占用内存
+    service.pipe = None
+    del service
+    gc.collect()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus 大模型并发生成测试')
+    parser.add_argument('--prompts', nargs='*', default=[], help='提示词文件或目录（.txt），默认使用示例医嘱表格')
+    parser.add_argument('--model-dir', default=llm.DEFAULT_MODEL_DIR, help='Qwen3 OpenVINO 模型目录')
+    parser.add_argument('--device', default=llm.DEFAULT_DEVICE, help='推理设备')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时提交的请求数（提示词不足时循环使用）')
+    parser.add_argument('--max-new-tokens', type=int, default=512, help='每个请求最多生成的 token 数')
+    parser.add_argument('--batch-size', type=int, default=llm.DEFAULT_BATCH_SIZE, help='连续批处理同时生成的请求数')
+    parser.add_argument('--kv-cache-gb', type=float, default=llm.DEFAULT_KV_CACHE_GB, help='KV 缓存大小（GB），0 为按需分配')
+    parser.add_argument('--schedulers', default='sequential,batch', help='比较的调度方式，逗号分隔')
+    parser.add_argument('--output', help='报告输出路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    if llm.ov_genai is None:
+        print('需要安装 openvino-genai', file=sys.stderr)
+        return 1
+    if not os.path.isdir(args.model_dir):
+        print(f'模型不存在：{args.model_dir}', file=sys.stderr)
+        return 1
+
+    prompts = load_prompts(args.prompts) or [default_prompt()]
+    prompts = [f'{prompts[i % len(prompts)]}\n（请求 {i + 1}）' for i in range(args.concurrency)]
+
+    results = {}
+    for name in args.schedulers.split(','):
+        results[name] = measure(args, prompts, batching=name == 'batch')
+        result = results[name]
+        print(f'{name}: {result["tokens_per_sec"]} token/秒, 延迟 p50 {result["latency_s"]["p50"]} s, '
+              f'首 token p50 {result["first_token_s"]["p50"]} s', file=sys.stderr)
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_dir": args.model_dir,
+            "device": args.device,
+            "concurrency": args.concurrency,
+            "max_new_tokens": args.max_new_tokens,
+            "batch_size": args.batch_size,
+            "kv_cache_gb": args.kv_cache_gb,
+        },
+        "schedulers": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ocr
+from http_load import percentile
+from ocr_throughput import image_paths
+from run import git_revision
+
+# OCR 图片预处理测试：不加载模型，比较不预处理（按原始分辨率解码整张图片）与预处理（缩小解码、EXIF 旋转、
+# 裁剪表格区域、长图切分）时每张图片的准备耗时（含处理器把每页缩放到模型输入大小）、解码后的图片大小、
+# 送入模型的页数和像素数，
+# 以及整组图片在解码线程池中的总耗时和进程的峰值内存。每种设置在单独的子进程中执行，峰值内存互不影响
+# 示例：python bench/ocr_preprocess.py --images photos/ --output preprocess.json
+# 没有提供图片时生成一组模拟的手机照片：4032x3024 的 JPEG（EXIF 方向为旋转 90°），纸张上的表格四周有桌面背景，
+# 另有一张 1080x4800 的长截图
+
+SYNTHETIC_COUNT = 6
+
+
+# 模拟的康复计划表格照片
+def synthetic_photo(index, long_screenshot=False):
+    from PIL import Image, ImageDraw
+
+    if long_screenshot:
+        image = Image.new('RGB', (1080, 4800), 'white')
+        paper = (40, 40, 1040, 4760)
+    else:
+        # 按竖拍的方向绘制，保存时旋转为横向并写入 EXIF 方向，与手机相机的输出一致
+        image = Image.new('RGB', (3024, 4032), (120, 96, 72))
+        paper = (300 + index * 20, 420, 2700, 3700 - index * 30)
+        ImageDraw.Draw(image).rectangle(paper, fill=(236, 234, 228))
+
+    draw = ImageDraw.Draw(image)
+    left, top, right, bottom = paper
+    rows, cols = 24, 5
+    row_height = (bottom - top - 80) // rows
+    col_width = (right - left - 80) // cols
+    for row in range(rows + 1):
+        y = top + 40 + row * row_height
+        draw.line((left + 40, y, left + 40 + cols * col_width, y), fill='black', width=3)
+    for col in range(cols + 1):
+        x = left + 40 + col * col_width
+        draw.line((x, top + 40, x, top + 40 + rows * row_height), fill='black', width=3)
+    for row in range(rows):
+        for col in range(cols):
+            draw.text(
+                (left + 60 + col * col_width, top + 40 + row * row_height + row_height // 3),
+                f'Ex {row + 1}-{col + 1}: 3x10 {index}', fill='black',
+            )
+
+    data = io.BytesIO()
+    if long_screenshot:
+        image.save(data, 'PNG')
+    else:
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        image.transpose(Image.Transpose.ROTATE_90).save(data, 'JPEG', quality=90, exif=exif.tobytes())
+    return data.getvalue()
+
+
+def synthetic_photos(count):
+    return [synthetic_photo(i) for i in range(count - 1)] + [synthetic_photo(count - 1, long_screenshot=True)]
+
+
+def peak_rss_mb():
+    # Linux 上 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# 在子进程中执行：先用解码线程池解码整组图片（峰值内存只统计这一步），再逐张解码统计
+def measure(images, image_size, max_tiles, workers):
+    service = ocr.OCRService(ocr.DEFAULT_MODEL_DIR, image_size=image_size, max_tiles=max_tiles,
+                             decode_workers=workers)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    service.decode(images)
+    pool_seconds = time.perf_counter() - started
+    rss = peak_rss_mb() - baseline
+
+    per_image = []
+    for index, data in enumerate(images):
+        started = time.perf_counter()
+        pages = service.prepare(data, index)
+        prepared = time.perf_counter()
+        # GOT-OCR 2.0 的处理器把每页缩放为 1024x1024，不预处理时缩放的是原始分辨率的整张图片
+        for page in pages:
+            page.resize((1024, 1024), ocr.Image.BICUBIC)
+        finished = time.perf_counter()
+        # 解码后（缩小和旋转之后、裁剪之前）的图片，为预处理过程中最大的一份像素数据
+        decoded = ocr.open_image(data, index, image_size or None)
+        per_image.append({
+            "decoded": list(decoded.size),
+            "decoded_mb": round(decoded.width * decoded.height * 3 / 1024 / 1024, 2),
+            "pages": [list(page.size) for page in pages],
+            "megapixels": round(sum(page.width * page.height for page in pages) / 1e6, 2),
+            "prepare_s": round(prepared - started, 3),
+            "seconds": round(finished - started, 3),
+        })
+
+    return {
+        "images": per_image,
+        "prepare_p50_s": round(percentile([item['prepare_s'] for item in per_image], 50), 3),
+        "input_p50_s": round(percentile([item['seconds'] for item in per_image], 50), 3),
+        "decoded_mb_max": max(item['decoded_mb'] for item in per_image),
+        "megapixels": round(sum(item['megapixels'] for item in per_image), 2),
+        "tiles": sum(len(item['pages']) for item in per_image),
+        "pool_seconds": round(pool_seconds, 3),
+        "peak_rss_mb": round(rss, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus OCR 图片预处理测试')
+    parser.add_argument('--images', nargs='*', default=[], help='图片文件或目录，默认生成模拟的手机照片')
+    parser.add_argument('--image-size', type=int, default=ocr.DEFAULT_IMAGE_SIZE, help='预处理后图片的短边')
+    parser.add_argument('--max-tiles', type=int, default=ocr.DEFAULT_MAX_TILES, help='长图最多切分的页数')
+    parser.add_argument('--workers', type=int, default=ocr.DEFAULT_DECODE_WORKERS, help='解码线程数')
+    parser.add_argument('--output', help='报告输出路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    if ocr.Image is None:
+        print('OCR 需要安装 Pillow、transformers 和 optimum-intel', file=sys.stderr)
+        return 1
+
+    paths = image_paths(args.images)
+    if paths:
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                images.append(f.read())
+        names = [os.path.basename(path) for path in paths]
+    else:
+        images = synthetic_photos(SYNTHETIC_COUNT)
+        names = [f'synthetic-{i + 1}' for i in range(len(images))]
+
+    settings = {
+        'off': (0, args.max_tiles, args.workers),
+        'on': (args.image_size, args.max_tiles, args.workers),
+    }
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name, (image_size, max_tiles, workers) in settings.items():
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(measure, (images, image_size, max_tiles, workers))
+        result = results[name]
+        print(f'预处理 {name}: 单张准备 p50 {result["prepare_p50_s"]} s（含缩放到模型输入 {result["input_p50_s"]} s）, 解码后最大 {result["decoded_mb_max"]} MB, '
+              f'送入模型 {result["tiles"]} 页 {result["megapixels"]} 百万像素, 峰值内存 +{result["peak_rss_mb"]} MB',
+              file=sys.stderr)
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "images": names,
+            "image_size": args.image_size,
+            "max_tiles": args.max_tiles,
+            "workers": args.workers,
+        },
+        "preprocess": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ocr
+from http_load import percentile
+from run import git_revision
+
+# OCR 吞吐量测试：只加载一次模型，用不同的批大小识别同一组图片，
+# 输出模型加载耗时、每分钟识别的图片数和单张图片的延迟（从提交整组图片到该图片所在批次完成）
+# 示例：python bench/ocr_throughput.py --images photos/ --batch-sizes 1,2,4 --output ocr.json
+# 比较预处理的效果时用 --image-size 0（不预处理）再运行一次
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+# 展开命令行中的图片文件和目录
+def image_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(
+                os.path.join(item, name) for name in sorted(os.listdir(item))
+                if name.lower().endswith(IMAGE_SUFFIXES)
+            )
+        else:
+            paths.append(item)
+    return paths
+
+
+# 用指定批大小识别整组图片 repeat 次
+def measure(service, images, batch_size, output_format, repeat):
+    service.batch_size = batch_size
+    latencies = []
+    batch_seconds = []
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        # 批次按顺序执行，图片的延迟为其最后一页所在批次及之前各批次的耗时之和
+        results = service.recognize(images, output_format)
+        done = {}
+        for result in results:
+            done[result['batch']] = result['seconds']
+        finished = {}
+        total = 0.0
+        for batch in sorted(done):
+            total += done[batch]
+            finished[batch] = total
+            batch_seconds.append(done[batch])
+        latencies.extend(finished[result['batch']] for result in results)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "images": len(images) * repeat,
+        "seconds": round(elapsed, 3),
+        "images_per_minute": round(len(images) * repeat / elapsed * 60, 2),
+        "latency_p50_s": round(percentile(latencies, 50), 3),
+        "latency_p90_s": round(percentile(latencies, 90), 3),
+        "latency_max_s": round(max(latencies), 3),
+        "batch_p50_s": round(percentile(batch_seconds, 50), 3),
+        "per_image_s": round(elapsed / (len(images) * repeat), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus OCR 吞吐量测试')
+    parser.add_argument('--images', nargs='+', required=True, help='图片文件或目录')
+    parser.add_argument('--model-dir', default=ocr.DEFAULT_MODEL_DIR, help='GOT-OCR 2.0 OpenVINO 模型目录')
+    parser.add_argument('--device', default=ocr.DEFAULT_DEVICE, help='推理设备')
+    parser.add_argument('--batch-sizes', default='1,2,4', help='比较的批大小，逗号分隔')
+    parser.add_argument('--format', default='markdown', choices=ocr.FORMATS, help='输出格式')
+    parser.add_argument('--max-new-tokens', type=int, default=ocr.DEFAULT_MAX_NEW_TOKENS, help='每张图片最多生成的 token 数')
+    parser.add_argument('--repeat', type=int, default=1, help='每个批大小重复识别整组图片的次数')
+    parser.add_argument('--image-size', type=int, default=ocr.DEFAULT_IMAGE_SIZE, help='预处理后图片的短边，0 为不预处理')
+    parser.add_argument('--max-tiles', type=int, default=ocr.DEFAULT_MAX_TILES, help='长图最多切分的页数')
+    parser.add_argument('--output', help='报告输出路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    if ocr.Image is None:
+        print('OCR 需要安装 Pillow、transformers 和 optimum-intel', file=sys.stderr)
+        return 1
+
+    paths = image_paths(args.images)
+    if not paths:
+        print('没有找到图片', file=sys.stderr)
+        return 1
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    # 不使用结果缓存，每次都实际推理
+    service = ocr.OCRService(
+        args.model_dir, device=args.device, max_new_tokens=args.max_new_tokens,
+        image_size=args.image_size, max_tiles=args.max_tiles,
+    )
+    service.load()
+    print(f'模型加载 {service.load_seconds:.1f} 秒', file=sys.stderr)
+
+    # 第一次推理包含编译等一次性开销，不计入结果
+    started = time.perf_counter()
+    service.batch_size = 1
+    service.recognize(images[:1], args.format)
+    warmup = time.perf_counter() - started
+
+    results = {}
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        results[str(batch_size)] = measure(service, images, batch_size, args.format, args.repeat)
+        result = results[str(batch_size)]
+        print(f'batch {batch_size}: {result["images_per_minute"]} 张/分钟, '
+              f'p50 {result["latency_p50_s"]} s, p90 {result["latency_p90_s"]} s', file=sys.stderr)
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_dir": args.model_dir,
+            "device": args.device,
+            "format": args.format,
+            "max_new_tokens": args.max_new_tokens,
+            "images": [os.path.basename(path) for path in paths],
+            "repeat": args.repeat,
+            "image_size": args.image_size,
+            "max_tiles": args.max_tiles,
+            "tiles": sum(len(pages) for pages in service.decode(images)),
+            "load_seconds": round(service.load_seconds, 3),
+            "warmup_seconds": round(warmup, 3),
+        },
+        "batch_sizes": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
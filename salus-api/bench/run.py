@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from http_load import percentile
+
+# 接口基准测试：在进程内用 Flask 测试客户端依次压测各接口，输出可在提交之间对比的 JSON 报告
+# 示例：
+#   python bench/generate_data.py --db bench.db
+#   python bench/run.py --db bench.db --output before.json
+#   python bench/compare.py before.json after.json
+
+# 报告格式版本，字段变化时递增
+REPORT_VERSION = 1
+
+
+# 从数据库中选取压测参数：位于中间的周期、其中的日期和任务等
+def load_fixtures(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        cycle = conn.execute(
+            'SELECT id, start_date, end_date FROM recovery_cycles ORDER BY id LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM recovery_cycles)'
+        ).fetchone()
+        task = conn.execute(
+            'SELECT id, exercise_id FROM training_tasks WHERE cycle_id = ? ORDER BY id LIMIT 1', (cycle['id'],)
+        ).fetchone()
+        middle = conn.execute(
+            'SELECT completed_at, id FROM completions ORDER BY completed_at DESC, id DESC LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM completions)'
+        ).fetchone()
+        day = conn.execute(
+            'SELECT occurs_on FROM task_occurrences WHERE task_id = ? ORDER BY occurs_on LIMIT 1 OFFSET 7', (task['id'],)
+        ).fetchone() or conn.execute(
+            'SELECT occurs_on FROM task_occurrences WHERE task_id = ? ORDER BY occurs_on', (task['id'],)
+        ).fetchone()
+        week_end = conn.execute("SELECT date(?, '+6 days')", (day['occurs_on'],)).fetchone()[0]
+        month_end = conn.execute("SELECT date(?, '+1 month')", (day['occurs_on'],)).fetchone()[0]
+        dataset = {
+            table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('exercises', 'recovery_cycles', 'training_tasks', 'task_occurrences', 'completions')
+        }
+    finally:
+        conn.close()
+
+    return {
+        'cycle_id': cycle['id'],
+        'task_id': task['id'],
+        'exercise_id': task['exercise_id'],
+        'date': day['occurs_on'],
+        'week_end': week_end,
+        'month_end': month_end,
+        'middle_task_id': dataset['training_tasks'] // 2,
+        'after_completed_at': middle['completed_at'],
+        'after_id': middle['id'],
+    }, dataset
+
+
+# 读接口：(名称, 路径模板)
+READ_SCENARIOS = [
+    ('tasks_all', '/tasks'),
+    ('tasks_by_date', '/tasks?date={date}'),
+    ('tasks_by_date_and_cycle', '/tasks?date={date}&cycle_id={cycle_id}'),
+    ('tasks_page', '/tasks?limit=100&after_id={middle_task_id}'),
+    ('task_detail', '/tasks/{task_id}'),
+    ('completions_first_page', '/completions?limit=100'),
+    ('completions_deep_page', '/completions?limit=100&after_completed_at={after_completed_at}&after_id={after_id}'),
+    ('completions_week', '/completions?start_date={date}&end_date={week_end}'),
+    ('completions_stats_all', '/completions/stats'),
+    ('completions_stats_month', '/completions/stats?start_date={date}&end_date={month_end}'),
+    ('completions_stats_cycle', '/completions/stats?cycle_id={cycle_id}'),
+    ('cycle_detail', '/cycles/{cycle_id}'),
+    ('dashboard', '/dashboard?cycle_id={cycle_id}&date={date}'),
+    ('analytics_cycle', '/analytics?cycle_id={cycle_id}'),
+    ('analytics_month', '/analytics?start_date={date}&end_date={month_end}'),
+    ('analytics_all', '/analytics'),
+]
+
+
+# 写接口：(名称, 方法, 路径, 生成请求的函数)，函数参数为 (序号, 压测参数, 共享状态)，返回 (实际路径, JSON)
+# 同一状态在场景之间共享，例如删除场景删除的是创建场景生成的记录
+WRITE_SCENARIOS = [
+    ('create_completion', 'POST', '/completions', lambda i, fx, state: (
+        '/completions', {"task_id": fx['task_id'], "actual_sets": 1}
+    )),
+    ('delete_completion', 'DELETE', '/completions/<id>', lambda i, fx, state: (
+        f"/completions/{state['completion_ids'].pop()}", None
+    )),
+    ('complete_task', 'POST', '/tasks/<id>/complete', lambda i, fx, state: (
+        f"/tasks/{fx['task_id']}/complete", {"date": fx['date'], "actual_sets": 2}
+    )),
+    ('create_task', 'POST', '/tasks', lambda i, fx, state: (
+        '/tasks', {
+            "cycle_id": fx['cycle_id'], "exercise_id": fx['exercise_id'],
+            "scheduled_time": f"{6 + i % 14:02d}:{i % 60:02d}", "sets": 3, "day_of_week": i % 7
+        }
+    )),
+    ('update_task', 'PUT', '/tasks/<id>', lambda i, fx, state: (
+        f"/tasks/{fx['task_id']}", {"sets": 1 + i % 5}
+    )),
+    ('bulk_completions', 'POST', '/completions/bulk', lambda i, fx, state: (
+        '/completions/bulk', {"create": [
+            {"task_id": fx['task_id'], "actual_sets": 1, "completed_at": f"{fx['date']} 13:{n % 60:02d}:00"}
+            for n in range(100)
+        ]}
+    )),
+]
+
+
+# 把响应中新建的完成记录ID记入状态，供删除场景使用
+def remember_ids(name, response, state):
+    if name == 'create_completion' and response.status_code == 201:
+        state.setdefault('completion_ids', []).append(response.get_json()['id'])
+
+
+# 对一个场景执行预热和计时，concurrency 大于1时多个线程同时请求
+def measure(app, name, make_request, iterations, warmup, concurrency, state):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(warmup + iterations))
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, path, body = make_request(i)
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            elapsed = time.perf_counter() - start
+            with lock:
+                remember_ids(name, response, state)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+                if i >= warmup:
+                    latencies.append(elapsed * 1000)
+
+    # 预热请求在计时线程启动前按顺序执行
+    client = app.test_client()
+    for i in range(warmup):
+        method, path, body = make_request(next(counter))
+        response = client.open(path, method=method, json=body)
+        remember_ids(name, response, state)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run(db_path, iterations, warmup, concurrency, use_cache, only=None):
+    fixtures, dataset = load_fixtures(db_path)
+
+    # 写接口会修改数据，在临时副本上运行
+    workdir = tempfile.mkdtemp(prefix='salus-bench-')
+    copy = os.path.join(workdir, 'bench.db')
+    for suffix in ('', '-wal'):
+        if os.path.exists(db_path + suffix):
+            shutil.copy(db_path + suffix, copy + suffix)
+
+    app = create_app({'DATABASE': copy, 'RESPONSE_CACHE': use_cache})
+
+    scenarios = {}
+    state = {}
+    try:
+        for name, template in READ_SCENARIOS:
+            if only and name not in only:
+                continue
+            path = template.format(**fixtures)
+            result = measure(app, name, lambda i: ('GET', path, None), iterations, warmup, concurrency, state)
+            scenarios[name] = {"method": "GET", "path": template, **result}
+            print(f'{name}: p50 {result["p50_ms"]} ms, p99 {result["p99_ms"]} ms', file=sys.stderr)
+
+        for name, method, label, build in WRITE_SCENARIOS:
+            if only and name not in only:
+                continue
+            # 删除场景需要先有足够的已创建记录
+            if name == 'delete_completion' and len(state.get('completion_ids', [])) < warmup + iterations:
+                continue
+            make_request = lambda i: (method, *build(i, fixtures, state))
+            result = measure(app, name, make_request, iterations, warmup, concurrency, state)
+            scenarios[name] = {"method": method, "path": label, **result}
+            print(f'{name}: p50 {result["p50_ms"]} ms, p99 {result["p99_ms"]} ms', file=sys.stderr)
+    finally:
+        app.extensions['salus_db'].close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit, dirty = git_revision()
+    return {
+        "version": REPORT_VERSION,
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": iterations,
+            "warmup": warmup,
+            "concurrency": concurrency,
+            "response_cache": use_cache,
+            "dataset": dataset,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus 接口基准测试')
+    parser.add_argument('--db', required=True, help='压测数据库（由 bench/generate_data.py 生成），不会被修改')
+    parser.add_argument('--iterations', type=int, default=50, help='每个场景计时的请求数')
+    parser.add_argument('--warmup', type=int, default=5, help='每个场景预热的请求数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发线程数')
+    parser.add_argument('--cache', action='store_true', help='开启响应缓存（默认关闭，测量接口本身的耗时）')
+    parser.add_argument('--only', help='只运行指定场景，逗号分隔')
+    parser.add_argument('--output', help='报告输出路径，默认输出到标准输出')
+    args = parser.parse_args(argv)
+
+    only = set(args.only.split(',')) if args.only else None
+    report = run(args.db, args.iterations, args.warmup, args.concurrency, args.cache, only)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    return 1 if any(s['errors'] for s in report['scenarios'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import re
+import sqlite3
+
+from flask import jsonify
+
+# 单次批量请求允许的最大操作数
+MAX_BULK_ITEMS = 5000
+
+# IN 查询每批的参数数量，避免超出SQLite参数上限
+_ID_CHUNK_SIZE = 500
+
+
+class BulkItemError(Exception):
+    """单个批量操作项校验或执行失败"""
+
+
+# 查询给定ID中在 table.column 里出现过的ID集合
+def referenced_ids(cursor, table, column, ids):
+    ids = list({i for i in ids if isinstance(i, int) and not isinstance(i, bool)})
+    found = set()
+
+    for start in range(0, len(ids), _ID_CHUNK_SIZE):
+        chunk = ids[start:start + _ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(
+            f'SELECT DISTINCT {column} FROM {table} WHERE {column} IN ({placeholders})',
+            chunk
+        )
+        found.update(row[0] for row in cursor.fetchall())
+
+    return found
+
+
+# 查询给定ID中实际存在的ID集合
+def existing_ids(cursor, table, ids):
+    return referenced_ids(cursor, table, 'id', ids)
+
+
+# 收集 update/delete 操作项中的目标ID
+def target_ids(data):
+    ids = set()
+    for item in [*(data.get('update') or []), *(data.get('delete') or [])]:
+        value = item.get('id') if isinstance(item, dict) else item
+        if isinstance(value, int):
+            ids.add(value)
+    return ids
+
+
+# 取出批量操作项的ID，删除项既可以是ID也可以是 {"id": ID}
+def item_id(item):
+    value = item.get('id') if isinstance(item, dict) else item
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise BulkItemError("ID必须是整数")
+    return value
+
+
+# 解析请求中的整数值：JSON 整数或整数字符串（如 "1"，与 SQLite 对整数列的类型转换一致），
+# 其他值（包括布尔值、小数和 null）返回 None
+def parse_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and re.fullmatch(r'-?[0-9]+', value.strip()):
+        return int(value)
+    return None
+
+
+# 收集 create/update 操作项中引用的某个字段的值，按 parse_int 转换后用于一次性查询
+def referenced_values(data, key):
+    items = [*(data.get('create') or []), *(data.get('update') or [])]
+    values = {parse_int(item.get(key)) for item in items if isinstance(item, dict)}
+    values.discard(None)
+    return values
+
+
+# 在一个事务中依次执行 create、update、delete 操作并返回逐项结果
+# atomic 为 True（默认）时任一项失败则整体回滚，before_commit 在提交前以游标调用
+def run_bulk(conn, data, create=None, update=None, delete=None, before_commit=None):
+    if not isinstance(data, dict):
+        return jsonify({"error": "无效的请求数据"}), 400
+
+    handlers = {'create': create, 'update': update, 'delete': delete}
+    operations = {}
+
+    for action, handler in handlers.items():
+        items = data.get(action) or []
+        if not isinstance(items, list):
+            return jsonify({"error": f"{action} 必须是数组"}), 400
+        if items and handler is None:
+            return jsonify({"error": f"不支持的批量操作：{action}"}), 400
+        operations[action] = items
+
+    total = sum(len(items) for items in operations.values())
+    if total == 0:
+        return jsonify({"error": "请提供至少一个操作：create, update, delete"}), 400
+    if total > MAX_BULK_ITEMS:
+        return jsonify({"error": f"单次批量操作不能超过{MAX_BULK_ITEMS}项"}), 400
+
+    # 只接受 JSON 布尔值，"false" 之类的字符串按真值处理会意外地整体回滚
+    atomic = data.get('atomic', True)
+    if not isinstance(atomic, bool):
+        return jsonify({"error": "atomic 必须是布尔值"}), 400
+
+    cursor = conn.cursor()
+    results = {}
+    succeeded = 0
+    failed = 0
+
+    for action, items in operations.items():
+        results[action] = []
+        for index, item in enumerate(items):
+            try:
+                if action != 'delete' and not isinstance(item, dict):
+                    raise BulkItemError("操作项必须是对象")
+                outcome = handlers[action](cursor, item) or {}
+            except BulkItemError as e:
+                results[action].append({"index": index, "ok": False, "error": str(e)})
+                failed += 1
+            except sqlite3.Error as e:
+                results[action].append({"index": index, "ok": False, "error": f"数据库错误：{e}"})
+                failed += 1
+            else:
+                results[action].append({"index": index, "ok": True, **outcome})
+                succeeded += 1
+
+    committed = not (atomic and failed)
+    if committed:
+        if before_commit is not None:
+            before_commit(cursor)
+        conn.commit()
+    else:
+        conn.rollback()
+
+    body = {
+        "atomic": atomic,
+        "committed": committed,
+        "succeeded": succeeded,
+        "failed": failed,
+        "results": results
+    }
+
+    return jsonify(body), 200 if committed else 400
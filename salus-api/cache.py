@@ -0,0 +1,218 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+
+from config import get_bool
+from database import get_db
+
+# 需要跟踪版本号的表，任何写入都会通过触发器递增对应的版本号
+VERSIONED_TABLES = (
+    'exercises',
+    'recovery_cycles',
+    'training_tasks',
+    'task_occurrences',
+    'completions',
+    'completion_rollups',
+)
+
+
+# 创建版本表及各表的写入触发器（迁移中调用）
+def install_version_triggers(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    for table in VERSIONED_TABLES:
+        cursor.execute('INSERT OR IGNORE INTO table_versions (name) VALUES (?)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions
+                    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE name = '{table}';
+                END
+            ''')
+
+
+# 读取若干表的当前版本号和最后修改时间
+def current_versions(tables):
+    cursor = get_db().cursor()
+    cursor.execute(versions_query(tables), tables)
+    return parse_versions(cursor.fetchall())
+
+
+def versions_query(tables):
+    placeholders = ', '.join('?' * len(tables))
+    return f'SELECT name, version, updated_at FROM table_versions WHERE name IN ({placeholders})'
+
+
+# 把版本表的行转换为 (版本号元组, 最后修改时间)
+# 修改时间只精确到秒：最后一次写入发生在当前这一秒内时，同一秒内的后续写入不会改变它，
+# 按 If-Modified-Since 判断会返回过期的 304。此时不提供最后修改时间，只用包含版本号的 ETag 判断
+def parse_versions(rows):
+    versions = tuple(sorted((row['name'], row['version']) for row in rows))
+    updated = [row['updated_at'] for row in rows if row['updated_at']]
+    last_modified = None
+    if updated:
+        last_modified = datetime.strptime(max(updated), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        if last_modified >= datetime.now(timezone.utc).replace(microsecond=0):
+            last_modified = None
+
+    return versions, last_modified
+
+
+# 缓存键及其ETag：路由、查询参数和依赖表的版本号
+def cache_key(req, versions):
+    key = (req.path, tuple(sorted(req.args.items(multi=True))), versions)
+    return key, hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+# 客户端缓存是否仍然有效：优先比较 ETag，请求没有 If-None-Match 时才比较 If-Modified-Since
+def is_not_modified(req, etag, last_modified):
+    return req.if_none_match.contains(etag) or (
+        not req.if_none_match
+        and last_modified is not None
+        and req.if_modified_since is not None
+        and last_modified <= req.if_modified_since
+    )
+
+
+# 设置缓存相关的响应头
+def set_cache_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # 浏览器每次都需要向服务器确认，服务器用ETag快速返回304
+    response.cache_control.no_cache = True
+    return response
+
+
+class ResponseCache:
+    """进程内的 LRU 响应缓存，并按路由统计命中情况"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # 记录一次 hit / miss / not_modified
+    def record(self, endpoint, outcome):
+        with self._lock:
+            counters = self.metrics.setdefault(endpoint, {'hit': 0, 'miss': 0, 'not_modified': 0})
+            counters[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: dict(counters) for name, counters in self.metrics.items()}
+            size = len(self._entries)
+
+        hits = sum(c['hit'] + c['not_modified'] for c in endpoints.values())
+        total = hits + sum(c['miss'] for c in endpoints.values())
+
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hit_rate": round(hits / total, 4) if total else None,
+            "endpoints": endpoints
+        }
+
+
+class CachedRequest:
+    """一次使用响应缓存的GET请求，同步（cached）和异步（routes/async_reads.py）部署共用。
+    由调用方读取依赖表的版本号、执行视图，这里负责缓存键、条件请求、缓存查找和保存"""
+
+    def __init__(self, store, req, versions, last_modified):
+        self.store = store
+        self.req = req
+        self.key, self.etag = cache_key(req, versions)
+        self.last_modified = last_modified
+
+    # 无需执行视图即可返回的响应：命中缓存且客户端缓存仍然有效时为304，否则为缓存的响应；未命中时返回 None。
+    # 条件请求只由状态码为200的缓存条目应答，未命中时先执行视图，不存在的资源（如 /cycles/999）返回404而不是304
+    def cached_response(self, response_class):
+        entry = self.store.get(self.key)
+        if entry is None or entry[1] != 200:
+            self.store.record(self.req.endpoint, 'miss')
+            return None
+
+        if is_not_modified(self.req, self.etag, self.last_modified):
+            self.store.record(self.req.endpoint, 'not_modified')
+            response = response_class('', 304)
+        else:
+            self.store.record(self.req.endpoint, 'hit')
+            body, status, mimetype = entry
+            response = response_class(body, status, mimetype=mimetype)
+
+        return set_cache_headers(response, self.etag, self.last_modified)
+
+    # 保存视图生成的响应，body 为响应内容；只缓存状态码为200的响应。
+    # 视图确认资源存在后，客户端缓存仍然有效时同样返回304
+    def save(self, response_class, response, body):
+        if response.status_code != 200:
+            return response
+
+        self.store.set(self.key, (body, response.status_code, response.mimetype))
+        if is_not_modified(self.req, self.etag, self.last_modified):
+            response = response_class('', 304)
+        return set_cache_headers(response, self.etag, self.last_modified)
+
+
+# 缓存GET接口的响应，键为路由和查询参数，依赖表的版本号变化即失效
+# 同时设置 ETag / Last-Modified，条件请求命中时直接返回304
+def cached(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store = current_app.extensions.get('salus_cache')
+            if store is None:
+                return view(*args, **kwargs)
+
+            cached_request = CachedRequest(store, request, *current_versions(tables))
+            response = cached_request.cached_response(current_app.response_class)
+            if response is None:
+                response = make_response(view(*args, **kwargs))
+                response = cached_request.save(current_app.response_class, response, response.get_data())
+            return response
+
+        return wrapper
+    return decorator
+
+
+# 查看缓存命中统计
+def cache_stats():
+    return jsonify(current_app.extensions['salus_cache'].stats())
+
+
+# 在应用上注册响应缓存
+def init_app(app):
+    app.config.setdefault('RESPONSE_CACHE', True)
+    app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 512)
+
+    if get_bool(app.config, 'RESPONSE_CACHE'):
+        app.extensions['salus_cache'] = ResponseCache(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        app.add_url_rule('/cache/stats', 'cache_stats', cache_stats)
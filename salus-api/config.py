@@ -0,0 +1,26 @@
+# 配置项的解析，应用（app.config）和 gunicorn.conf.py（环境变量）共用
+
+# 布尔配置接受的写法，不区分大小写
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off', '')
+
+
+# 把配置值解析为布尔值。from_prefixed_env 只把 JSON 的 true/false 转换为布尔值，
+# "False"、"no" 等仍是非空字符串，直接 bool() 会得到 True；无法识别的值抛出 ValueError
+def parse_bool(value, name='配置项'):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    raise ValueError(f'{name} 必须是布尔值（true/false、yes/no、1/0、on/off），实际为 {value!r}')
+
+
+# 读取 app.config 中的布尔配置
+def get_bool(config, key):
+    return parse_bool(config[key], key)
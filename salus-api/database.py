@@ -0,0 +1,169 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, jsonify, request
+
+# 默认数据库路径，可通过环境变量 SALUS_DB_PATH 或 app.config['DATABASE'] 覆盖
+DEFAULT_DB_PATH = os.environ.get('SALUS_DB_PATH', 'salus.db')
+
+# 每个连接建立时执行的 PRAGMA
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,   # 256MB
+    'cache_size': -65536,     # 负数单位为KB，即64MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,     # 其他进程持有写锁时最多等待5秒
+    'foreign_keys': 'ON',     # 删除周期、任务时级联删除其任务实例和完成记录
+}
+
+# 写请求在开始时获取写锁（BEGIN IMMEDIATE），锁被占用时的重试次数和初始退避时间（秒）
+WRITE_LOCK_RETRIES = 3
+WRITE_LOCK_BACKOFF = 0.05
+
+# 不会写数据库的请求方法
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 每个连接缓存的预编译语句数量
+STATEMENT_CACHE_SIZE = 256
+
+
+# 创建并配置一个新的数据库连接，factory 为连接类（如带计时的连接）
+def connect(path=None, pragmas=None, factory=sqlite3.Connection):
+    conn = sqlite3.connect(
+        path or DEFAULT_DB_PATH,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=factory,
+    )
+    conn.row_factory = sqlite3.Row
+
+    for name, value in (pragmas or DEFAULT_PRAGMAS).items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+    return conn
+
+
+# 数据库被其他连接锁住（SQLITE_BUSY / SQLITE_LOCKED）
+def is_locked_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+# 开启写事务并立即获取写锁，锁被占用时按指数退避重试
+# 多进程部署下写请求因此串行执行，避免事务中途升级写锁时出现 SQLITE_BUSY
+def begin_write(conn, retries=WRITE_LOCK_RETRIES, backoff=WRITE_LOCK_BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if not is_locked_error(e) or attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+
+# 在一个读事务中执行多条查询：WAL 模式下事务内的查询读取同一个快照，不会看到其间提交的写入
+# 只读事务结束时直接回滚
+@contextmanager
+def read_transaction(conn):
+    conn.execute('BEGIN')
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+class ConnectionPool:
+    """按数据库路径复用连接的连接池，连接在请求期间独占于当前线程"""
+
+    def __init__(self, path, size=8, pragmas=None, factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.pragmas = pragmas
+        self.factory = factory
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+
+    # 取出一个空闲连接，没有则新建
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.path, self.pragmas, self.factory)
+
+    # 归还连接，未提交的事务会被回滚，池满时直接关闭
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    # 关闭所有空闲连接
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+# 获取当前请求使用的数据库连接，写请求的连接已处于持有写锁的事务中
+def get_db():
+    if '_database' not in g:
+        conn = current_app.extensions['salus_db'].acquire()
+        if has_request_context() and request.method not in READ_METHODS:
+            try:
+                begin_write(
+                    conn,
+                    retries=current_app.config['DATABASE_WRITE_RETRIES'],
+                    backoff=current_app.config['DATABASE_WRITE_BACKOFF'],
+                )
+            except Exception:
+                current_app.extensions['salus_db'].release(conn)
+                raise
+        g._database = conn
+    return g._database
+
+
+# 请求结束时把连接归还连接池
+def release_db(exception=None):
+    conn = g.pop('_database', None)
+    if conn is not None:
+        current_app.extensions['salus_db'].release(conn)
+
+
+# 重试后仍然拿不到锁时返回503，由客户端稍后重试
+def handle_locked(error):
+    if not is_locked_error(error):
+        raise error
+    response = jsonify({"error": "数据库繁忙，请稍后重试"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+# 在应用上注册数据库连接层
+def init_app(app):
+    app.config.setdefault('DATABASE', DEFAULT_DB_PATH)
+    app.config.setdefault('DATABASE_POOL_SIZE', 8)
+    app.config.setdefault('DATABASE_PRAGMAS', dict(DEFAULT_PRAGMAS))
+    app.config.setdefault('DATABASE_WRITE_RETRIES', WRITE_LOCK_RETRIES)
+    app.config.setdefault('DATABASE_WRITE_BACKOFF', WRITE_LOCK_BACKOFF)
+
+    app.extensions['salus_db'] = ConnectionPool(
+        app.config['DATABASE'],
+        size=app.config['DATABASE_POOL_SIZE'],
+        pragmas=app.config['DATABASE_PRAGMAS'],
+    )
+    app.teardown_appcontext(release_db)
+    app.register_error_handler(sqlite3.OperationalError, handle_locked)
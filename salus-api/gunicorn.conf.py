@@ -0,0 +1,70 @@
+# gunicorn 生产部署配置，启动方式：gunicorn -c gunicorn.conf.py
+# 各项均可通过 SALUS_ 前缀的环境变量覆盖
+import importlib.util
+import multiprocessing
+import os
+import sys
+
+# 配置文件在应用代码加载之前执行，与应用共用 config.py 中的解析函数
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import parse_bool
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('SALUS_BIND', '0.0.0.0:5000')
+
+# 大模型生成服务（llm.py）的连续批处理、排队上限和按来源的公平调度都在进程内，每个 worker 还会各自加载
+# 一份模型和 KV 缓存，因此启用大模型时只运行一个 worker，由更多线程处理并发请求（流式生成会一直占用线程）；
+# 需要多个 worker 时设置 SALUS_LLM_ENABLED=false 关闭大模型
+llm_enabled = (
+    parse_bool(os.environ.get('SALUS_LLM_ENABLED', 'true'), 'SALUS_LLM_ENABLED')
+    and importlib.util.find_spec('openvino_genai') is not None
+)
+
+# SQLite 在 WAL 模式下读可以多进程并发，写由 BEGIN IMMEDIATE + busy_timeout 串行化
+if llm_enabled:
+    workers = 1
+    threads = int(os.environ.get('SALUS_THREADS', 16))
+else:
+    workers = int(os.environ.get('SALUS_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+    threads = int(os.environ.get('SALUS_THREADS', 4))
+worker_class = 'gthread'
+
+# 在主进程中加载应用，数据库迁移只执行一次，worker 通过 fork 共享已导入的代码
+# 连接池在第一次请求时才建立连接，不会把连接带进子进程
+preload_app = True
+
+timeout = int(os.environ.get('SALUS_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# 处理一定数量的请求后重启 worker，防止内存缓慢增长
+max_requests = int(os.environ.get('SALUS_MAX_REQUESTS', 10000))
+max_requests_jitter = 500
+
+accesslog = os.environ.get('SALUS_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('SALUS_LOG_LEVEL', 'info')
+
+
+# 启用大模型时忽略 SALUS_WORKERS，启动时提示
+def on_starting(server):
+    if llm_enabled and int(os.environ.get('SALUS_WORKERS', 1)) > 1:
+        server.log.warning('已启用大模型生成，只启动 1 个 worker（SALUS_WORKERS 被忽略）；'
+                           '需要多个 worker 时设置 SALUS_LLM_ENABLED=false')
+
+
+# 后台任务线程在 worker 启动后立即启动，重启前排队的任务不必等到第一次请求才继续执行；
+# 大模型同时在后台加载和预热（模型不能在主进程中加载后 fork 给 worker）
+def post_worker_init(worker):
+    app = worker.wsgi
+    app.extensions['salus_jobs'].start()
+    if 'salus_llm' in app.extensions and app.extensions['salus_llm'].warmup:
+        app.extensions['salus_llm'].start()
+
+
+# worker 正常退出（如达到 max_requests 后重启）时把执行中的任务放回队列，由其他 worker 继续执行
+def worker_exit(server, worker):
+    app = getattr(worker, 'wsgi', None)
+    if app is not None:
+        app.extensions['salus_jobs'].release()
@@ -0,0 +1,406 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import database
+
+# 后台任务：OCR、大模型生成等耗时的工作不在请求中执行，而是写入 jobs 表排队（见迁移 13），
+# 由每个进程中数量有上限的后台线程领取执行。任务的状态、进度、结果和错误都保存在 salus.db 中，
+# 任意进程都可以查询和取消；执行任务的进程退出（重启、崩溃）后，心跳超时的任务重新排队。
+# 不依赖外部消息队列
+
+# 默认配置，可通过 app.config 或 SALUS_ 前缀的环境变量覆盖
+DEFAULT_WORKERS = 1          # 每个进程执行任务的线程数，为 0 时该进程只提交不执行
+DEFAULT_MAX_RUNNING = 1      # 所有进程合计同时执行的任务数（模型推理占满 CPU，并发执行只会更慢）
+DEFAULT_MAX_QUEUED = 100     # 排队任务数上限，超过时拒绝提交
+DEFAULT_MAX_ATTEMPTS = 3     # 执行进程退出导致任务中断时，最多执行的次数
+DEFAULT_RETENTION_DAYS = 7   # 已结束任务的保留天数
+
+POLL_INTERVAL = 1.0          # 秒，没有提交通知时检查队列的间隔（其他进程提交的任务）
+HEARTBEAT_INTERVAL = 5.0     # 秒，执行中任务的心跳间隔，同时检查取消请求和中断的任务
+STALE_AFTER = 30             # 秒，心跳超过该时间未更新的执行中任务视为已中断
+PRUNE_INTERVAL = 3600        # 秒，清理过期任务的间隔
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+# 任务类型 → 处理函数，处理函数接收 Job，返回可 JSON 序列化的结果
+HANDLERS = {}
+
+JOB_COLUMNS = '''
+    id, kind, status, params, stage, progress, detail, result, error, cancel_requested,
+    attempts, worker, heartbeat_at, created_at, started_at, finished_at
+'''
+
+# 领取最早排队的任务，所有进程执行中的任务已达上限时不领取
+_CLAIM = '''
+    UPDATE jobs
+    SET status = 'running', worker = :worker, attempts = attempts + 1,
+        started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+    WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+      AND (SELECT COUNT(*) FROM jobs WHERE status = 'running') < :max_running
+    RETURNING id, kind, params, detail, attempts
+'''
+
+# 心跳超时的执行中任务：已请求取消的直接取消，执行次数用完的失败，其余重新排队
+_RECOVER_STALE = '''
+    UPDATE jobs
+    SET status = CASE
+            WHEN cancel_requested THEN 'cancelled'
+            WHEN attempts >= :max_attempts THEN 'failed'
+            ELSE 'queued'
+        END,
+        error = CASE
+            WHEN NOT cancel_requested AND attempts >= :max_attempts THEN '执行任务的进程已退出，重试次数已用完'
+        END,
+        finished_at = CASE WHEN cancel_requested OR attempts >= :max_attempts THEN CURRENT_TIMESTAMP END,
+        worker = NULL, heartbeat_at = NULL
+    WHERE status = 'running' AND heartbeat_at < datetime('now', :stale)
+'''
+
+# 已结束任务的输入文件不再需要
+_DELETE_FINISHED_INPUTS = f'''
+    DELETE FROM job_inputs
+    WHERE job_id IN (SELECT id FROM jobs WHERE status IN {FINISHED})
+'''
+
+
+class JobCancelled(Exception):
+    """任务已被取消，处理函数抛出后任务状态为 cancelled"""
+
+
+class QueueFull(Exception):
+    """排队任务数已达上限"""
+
+
+# 注册任务类型的处理函数
+def handler(kind):
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+# 数据库中的任务行转换为接口返回的字典
+def job_dict(row):
+    job = dict(row)
+    for key in ('params', 'detail', 'result'):
+        if job[key] is not None:
+            job[key] = json.loads(job[key])
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+# 在调用方的事务中创建任务，inputs 为 [(文件名, 字节)]；调用方提交后应调用 JobQueue.wake
+def submit_job(cursor, kind, params=None, inputs=(), max_queued=DEFAULT_MAX_QUEUED):
+    if kind not in HANDLERS:
+        raise ValueError(f'未知的任务类型：{kind}')
+
+    cursor.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")
+    if cursor.fetchone()[0] >= max_queued:
+        raise QueueFull(max_queued)
+
+    cursor.execute(
+        'INSERT INTO jobs (kind, params) VALUES (?, ?)',
+        (kind, json.dumps(params or {}, ensure_ascii=False))
+    )
+    job_id = cursor.lastrowid
+    cursor.executemany(
+        'INSERT INTO job_inputs (job_id, position, name, data) VALUES (?, ?, ?, ?)',
+        [(job_id, position, name, data) for position, (name, data) in enumerate(inputs)]
+    )
+    return job_id
+
+
+# 查询任务，不存在时返回 None
+def get_job(cursor, job_id):
+    cursor.execute(f'SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,))
+    row = cursor.fetchone()
+    return job_dict(row) if row else None
+
+
+# 取消任务：排队中的直接取消，执行中的设置取消标记，由执行进程在下一次检查时停止
+# 返回取消后的任务，任务不存在时返回 None
+def cancel_job(cursor, job_id):
+    cursor.execute(
+        "UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'queued'",
+        (job_id,)
+    )
+    if cursor.rowcount:
+        cursor.execute('DELETE FROM job_inputs WHERE job_id = ?', (job_id,))
+    else:
+        cursor.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+    return get_job(cursor, job_id)
+
+
+class Job:
+    """传给处理函数的任务：参数、输入文件，以及上报进度和检查取消的方法"""
+
+    def __init__(self, queue, id, kind, params, detail, attempts, inputs):
+        self.queue = queue
+        self.id = id
+        self.kind = kind
+        self.params = params
+        self.detail = detail
+        self.attempts = attempts
+        self.input_names = [name for name, _ in inputs]
+        self.inputs = [data for _, data in inputs]
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    # 已请求取消时抛出 JobCancelled，处理函数在各阶段之间调用
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    # 更新进度（0-1）、当前阶段和进度详情，同时读取取消标记
+    def update(self, progress=None, stage=None, detail=None):
+        fields = {}
+        if progress is not None:
+            fields['progress'] = round(progress, 4)
+        if stage is not None:
+            fields['stage'] = stage
+        if detail is not None:
+            self.detail = detail
+            fields['detail'] = json.dumps(detail, ensure_ascii=False)
+
+        columns = ''.join(f'{key} = ?, ' for key in fields)
+        with self.queue.writing() as conn:
+            row = conn.execute(
+                f'UPDATE jobs SET {columns}heartbeat_at = CURRENT_TIMESTAMP '
+                'WHERE id = ? AND worker = ? RETURNING cancel_requested',
+                (*fields.values(), self.id, self.queue.worker_id)
+            ).fetchone()
+        if row is None or row[0]:
+            self._cancel.set()
+
+
+class JobQueue:
+    """每个进程中执行后台任务的线程池，线程在第一次请求（或 gunicorn worker 启动）时启动"""
+
+    def __init__(self, app, workers=DEFAULT_WORKERS, max_running=DEFAULT_MAX_RUNNING,
+                 max_queued=DEFAULT_MAX_QUEUED, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retention_days=DEFAULT_RETENTION_DAYS):
+        self.app = app
+        self.workers = workers
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retention_days = retention_days
+        self.worker_id = None
+        self._pid = None
+        self._running = {}
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    # 在连接池的连接上执行一个写事务
+    @contextmanager
+    def writing(self):
+        pool = self.app.extensions['salus_db']
+        conn = pool.acquire()
+        try:
+            database.begin_write(conn)
+            yield conn
+            conn.commit()
+        finally:
+            pool.release(conn)
+
+    # 启动本进程的执行线程和心跳线程；gunicorn 预加载应用时主进程中不启动，fork 出的 worker 各自启动
+    def start(self):
+        if self._pid == os.getpid() or self.workers <= 0:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+            self._running = {}
+            self._wakeup = threading.Event()
+
+            for number in range(self.workers):
+                threading.Thread(target=self._work, name=f'salus-job-{number}', daemon=True).start()
+            threading.Thread(target=self._monitor, name='salus-job-monitor', daemon=True).start()
+
+    # 通知本进程有新任务（其他进程在下一次检查队列时领取）
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    # 本进程正在执行的任务收到取消请求时立即标记，不必等到下一次心跳
+    def notify_cancel(self, job_id):
+        job = self._running.get(job_id)
+        if job is not None:
+            job._cancel.set()
+
+    # 进程正常退出前把本进程执行中的任务放回队列（不计入执行次数），由其他进程继续执行
+    def release(self):
+        if self.worker_id is None or self._pid != os.getpid():
+            return
+        with self.writing() as conn:
+            conn.execute('''
+                UPDATE jobs
+                SET status = 'queued', attempts = attempts - 1, worker = NULL, heartbeat_at = NULL
+                WHERE status = 'running' AND worker = ? AND NOT cancel_requested
+            ''', (self.worker_id,))
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                self.app.logger.exception('领取后台任务失败')
+                job = None
+
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            self._execute(job)
+
+    # 领取一个排队的任务，先用只读查询确认有任务，避免空闲时反复获取写锁
+    def _claim(self):
+        pool = self.app.extensions['salus_db']
+        conn = pool.acquire()
+        try:
+            if conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone() is None:
+                return None
+
+            database.begin_write(conn)
+            rows = conn.execute(_CLAIM, {"worker": self.worker_id, "max_running": self.max_running}).fetchall()
+            if not rows:
+                conn.rollback()
+                return None
+
+            row = rows[0]
+            inputs = conn.execute(
+                'SELECT name, data FROM job_inputs WHERE job_id = ? ORDER BY position', (row['id'],)
+            ).fetchall()
+            conn.commit()
+        finally:
+            pool.release(conn)
+
+        return Job(
+            self, row['id'], row['kind'], json.loads(row['params']),
+            json.loads(row['detail']) if row['detail'] else None, row['attempts'],
+            [(name, bytes(data)) for name, data in inputs],
+        )
+
+    def _execute(self, job):
+        self._running[job.id] = job
+        status, result, error = 'succeeded', None, None
+        try:
+            func = HANDLERS.get(job.kind)
+            if func is None:
+                raise ValueError(f'未知的任务类型：{job.kind}')
+            with self.app.app_context():
+                result = func(job)
+        except JobCancelled:
+            status = 'cancelled'
+        except ValueError as e:
+            # 输入或模型输出无效，不是程序错误
+            self.app.logger.warning('后台任务 %s 失败：%s', job.id, e)
+            status, error = 'failed', str(e)
+        except Exception as e:
+            self.app.logger.exception('后台任务 %s 执行失败', job.id)
+            status, error = 'failed', str(e) or type(e).__name__
+        finally:
+            self._running.pop(job.id, None)
+
+        # 任务已被其他进程判定为中断并重新排队时，不覆盖其状态
+        with self.writing() as conn:
+            conn.execute('''
+                UPDATE jobs
+                SET status = ?, progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END,
+                    result = ?, error = ?, finished_at = CURRENT_TIMESTAMP, heartbeat_at = NULL
+                WHERE id = ? AND status = 'running' AND worker = ?
+            ''', (
+                status, status,
+                json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                job.id, self.worker_id,
+            ))
+            conn.execute('DELETE FROM job_inputs WHERE job_id = ?', (job.id,))
+
+    def _monitor(self):
+        last_prune = 0.0
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self._heartbeat()
+                if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                    self._prune()
+                    last_prune = time.monotonic()
+            except Exception:
+                self.app.logger.exception('后台任务心跳失败')
+
+    # 更新本进程执行中任务的心跳并读取取消标记，回收其他进程中断的任务
+    def _heartbeat(self):
+        running = dict(self._running)
+        if running:
+            placeholders = ', '.join('?' * len(running))
+            with self.writing() as conn:
+                rows = conn.execute(
+                    f'UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP '
+                    f'WHERE id IN ({placeholders}) AND worker = ? RETURNING id, cancel_requested',
+                    (*running, self.worker_id)
+                ).fetchall()
+            owned = {row[0]: row[1] for row in rows}
+            for job_id, job in running.items():
+                if owned.get(job_id, True):
+                    job._cancel.set()
+
+        pool = self.app.extensions['salus_db']
+        conn = pool.acquire()
+        try:
+            stale = conn.execute(
+                "SELECT 1 FROM jobs WHERE status = 'running' AND heartbeat_at < datetime('now', ?) LIMIT 1",
+                (f'-{STALE_AFTER} seconds',)
+            ).fetchone()
+        finally:
+            pool.release(conn)
+
+        if stale:
+            with self.writing() as conn:
+                recovered = conn.execute(_RECOVER_STALE, {
+                    "max_attempts": self.max_attempts, "stale": f'-{STALE_AFTER} seconds',
+                }).rowcount
+                conn.execute(_DELETE_FINISHED_INPUTS)
+            if recovered:
+                self.app.logger.warning('%d 个中断的后台任务已重新排队或结束', recovered)
+                self._wakeup.set()
+
+    # 删除超过保留天数的已结束任务
+    def _prune(self):
+        with self.writing() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN {FINISHED} AND finished_at < datetime('now', ?)",
+                (f'-{int(self.retention_days)} days',)
+            )
+
+
+# 在应用上注册后台任务队列，需在 database.init_app 之后调用
+def init_app(app):
+    app.config.setdefault('JOBS_WORKERS', DEFAULT_WORKERS)
+    app.config.setdefault('JOBS_MAX_RUNNING', DEFAULT_MAX_RUNNING)
+    app.config.setdefault('JOBS_MAX_QUEUED', DEFAULT_MAX_QUEUED)
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    app.config.setdefault('JOBS_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+
+    queue = JobQueue(
+        app,
+        workers=int(app.config['JOBS_WORKERS']),
+        max_running=int(app.config['JOBS_MAX_RUNNING']),
+        max_queued=int(app.config['JOBS_MAX_QUEUED']),
+        max_attempts=int(app.config['JOBS_MAX_ATTEMPTS']),
+        retention_days=int(app.config['JOBS_RETENTION_DAYS']),
+    )
+    app.extensions['salus_jobs'] = queue
+
+    # 第一次请求时启动本进程的执行线程，重启前排队的任务随之继续执行
+    app.before_request(queue.start)
@@ -0,0 +1,580 @@
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+import result_cache
+from config import get_bool
+
+# 大模型推理（openvino-genai）为可选依赖，未安装或未启用时 /llm/generate 和 /plans/import 返回 501
+try:
+    import openvino_genai as ov_genai
+except ImportError:
+    ov_genai = None
+
+# 常驻的 Qwen3 生成服务：每个进程只加载一次模型（mcp/qwen3_genai.py 每次运行都要重新加载），
+# 进程启动后在后台加载模型并生成一个 token 预热，第一个请求不必等待模型编译。
+# 所有生成请求由每个进程一个的调度线程执行：
+#   batch       （默认）OpenVINO GenAI 的 ContinuousBatchingPipeline，最多 batch_size 个请求同时生成，
+#               每生成一步都可以加入新请求、移出已完成的请求，并发请求共享每一次模型推理
+#   sequential  LLMPipeline，请求逐个生成（对比基准，或设备不支持连续批处理时使用）
+# 等待中的请求按来源（客户端地址、后台任务）轮流加入，一个来源的大量请求不会让其他来源一直等待；
+# 等待的请求超过 max_queued 时拒绝新请求。生成的文字逐段回调（/llm/generate 以 Server-Sent Events 推送），
+# 回调方要求停止时在下一步停止；每个请求记录排队时间、首 token 延迟和生成速度。
+# 相同提示词和生成参数的结果从结果缓存返回。
+# 提示词可以分为固定的指令（system 消息，见 PromptTemplate）和按请求变化的内容（user 消息），
+# 连续批处理开启前缀缓存时，指令部分的 KV 缓存在请求之间复用，只有变化的内容需要重新计算。
+# 请求可以提供 JSON Schema，生成时按 schema 约束输出（结构化输出），也可以关闭 Qwen3 的思考过程以减少生成的 token
+
+# 默认配置，可通过 app.config 或 SALUS_ 前缀的环境变量覆盖
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mcp', 'Qwen3-1.7B-int4-ov')
+DEFAULT_DEVICE = 'CPU'
+DEFAULT_MAX_NEW_TOKENS = 4096
+DEFAULT_BATCH_SIZE = 4       # 同时生成的请求数上限
+DEFAULT_MAX_QUEUED = 32      # 等待中的请求数上限，超过时拒绝新请求
+DEFAULT_KV_CACHE_GB = 0      # KV 缓存大小（GB），为 0 时按需分配
+DEFAULT_PREFIX_CACHING = True
+
+WARMUP_PROMPT = '你好'
+
+# 请求可以覆盖的生成参数及其类型
+REQUEST_PARAMS = {
+    'do_sample': bool,
+    'temperature': float,
+    'top_p': float,
+    'top_k': int,
+    'repetition_penalty': float,
+}
+
+# 秒，流式输出等待下一段文字的最长时间，超时时发送保活注释（同时检查客户端是否已断开）
+STREAM_KEEPALIVE = 10.0
+
+
+class ModelNotFound(Exception):
+    """模型目录不存在"""
+
+    def __str__(self):
+        return f"模型不存在：{self.args[0]}"
+
+
+class QueueFull(Exception):
+    """等待中的生成请求已达上限"""
+
+
+class PromptTemplate:
+    """提示词模板：固定的指令作为 system 消息放在最前面，按请求变化的内容作为 user 消息放在后面。
+    指令在前、变化的内容在后，所有请求的提示词才有相同的前缀，前缀缓存才能复用"""
+
+    def __init__(self, instruction, content='{input}'):
+        self.instruction = instruction
+        self.content = content
+
+    # 返回 (system, prompt)
+    def render(self, **values):
+        return self.instruction, self.content.format(**values)
+
+
+class Request:
+    """一个生成请求，由调度线程执行，完成后设置 done"""
+
+    def __init__(self, request_id, prompt, config, client, on_text=None, should_stop=None, system=None,
+                 thinking=True):
+        self.id = request_id
+        self.prompt = prompt
+        self.system = system
+        self.thinking = thinking
+        self.config = config
+        self.client = client
+        self.on_text = on_text
+        self.should_stop = should_stop
+        self.key = None
+        self.handle = None
+        self.ids = []
+        self.sent = 0
+        self.text = None
+        self.tokens = 0
+        self.cached = False
+        self.stopped = False
+        self.error = None
+        self.requested = time.perf_counter()
+        self.started = None
+        self.first = None
+        self.finished = None
+        self.done = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.should_stop is not None and self.should_stop()
+
+    # 本次请求的结果和统计
+    # queue_s 为等待加入生成（及加载模型）的时间，ttft_s 为从加入生成到输出第一个 token 的时间，
+    # tokens_per_sec 为第一个 token 之后的生成速度
+    def result(self):
+        if self.cached:
+            return {
+                "text": self.text, "cached": True, "stopped": False, "tokens": None,
+                "queue_s": 0.0, "ttft_s": 0.0, "tokens_per_sec": None, "seconds": 0.0,
+            }
+
+        started = self.started or self.finished
+        decoding = self.finished - self.first if self.first is not None else 0
+        return {
+            "text": self.text,
+            "cached": False,
+            "stopped": self.stopped,
+            "tokens": self.tokens,
+            "queue_s": round(started - self.requested, 3),
+            "ttft_s": None if self.first is None else round(self.first - started, 3),
+            "tokens_per_sec": round((self.tokens - 1) / decoding, 2) if decoding > 0 and self.tokens > 1 else None,
+            "seconds": round(self.finished - self.requested, 3),
+        }
+
+
+class LLMService:
+    """进程内常驻的 Qwen3 流水线，生成请求由调度线程连续批处理或逐个执行"""
+
+    def __init__(self, model_dir, device=DEFAULT_DEVICE, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, cache=None,
+                 logger=None, batching=True, batch_size=DEFAULT_BATCH_SIZE, max_queued=DEFAULT_MAX_QUEUED,
+                 kv_cache_gb=DEFAULT_KV_CACHE_GB, prefix_caching=DEFAULT_PREFIX_CACHING, warmup=True):
+        self.model_dir = model_dir
+        # 缓存键中的模型标识
+        self.model_id = os.path.abspath(model_dir)
+        self.device = device
+        self.max_new_tokens = max_new_tokens
+        self.cache = cache
+        self.logger = logger
+        self.batching = batching
+        self.batch_size = batch_size if batching else 1
+        self.max_queued = max_queued
+        self.kv_cache_gb = kv_cache_gb
+        self.prefix_caching = prefix_caching
+        self.warmup = warmup
+        self.pipe = None
+        self.tokenizer = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.requests = 0
+        self.cache_hits = 0
+        self.stopped = 0
+        self.rejected = 0
+        self.tokens = 0
+        self.busy_seconds = 0.0
+        self.peak_batch = 0
+        # 调度线程预热完成（或预热失败）后设置
+        self.ready = threading.Event()
+        self._ids = itertools.count(1)
+        self._pid = None
+        self._cond = threading.Condition()
+        # 来源 → 等待中的请求，按来源轮流取出
+        self._waiting = OrderedDict()
+        self._queued = 0
+        self._running = {}
+
+    @property
+    def loaded(self):
+        return self.pipe is not None
+
+    # 生成参数：max_new_tokens 和 REQUEST_PARAMS 中的参数可按请求覆盖；
+    # json_schema 为 JSON Schema（dict），生成的每个 token 都受 schema 约束，输出一定是符合 schema 的 JSON
+    def generation_config(self, max_new_tokens=None, json_schema=None, **params):
+        config = ov_genai.GenerationConfig()
+        config.max_new_tokens = max_new_tokens or self.max_new_tokens
+        if json_schema is not None:
+            config.structured_output_config = ov_genai.StructuredOutputConfig(
+                json_schema=json.dumps(json_schema, ensure_ascii=False, sort_keys=True)
+            )
+        for name, value in params.items():
+            if name not in REQUEST_PARAMS:
+                raise ValueError(f'不支持的生成参数：{name}')
+            setattr(config, name, value)
+        return config
+
+    # 加载流水线，已加载时直接返回；只在调度线程中调用
+    def load(self):
+        if self.pipe is not None:
+            return
+        if not os.path.isdir(self.model_dir):
+            raise ModelNotFound(self.model_dir)
+
+        started = time.perf_counter()
+        if self.batching:
+            scheduler_config = ov_genai.SchedulerConfig()
+            scheduler_config.max_num_seqs = self.batch_size
+            # SchedulerConfig 只接受整数 GB，小数向上取整
+            scheduler_config.cache_size = math.ceil(self.kv_cache_gb)
+            scheduler_config.enable_prefix_caching = self.prefix_caching
+            self.pipe = ov_genai.ContinuousBatchingPipeline(self.model_dir, scheduler_config, self.device)
+        else:
+            self.pipe = ov_genai.LLMPipeline(self.model_dir, self.device)
+        self.tokenizer = self.pipe.get_tokenizer()
+        self.load_seconds = time.perf_counter() - started
+
+    # 启动本进程的调度线程（gunicorn 预加载应用后 fork 出的 worker 各自启动，模型在调度线程中加载）
+    def start(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._waiting = OrderedDict()
+            self._queued = 0
+            self._running = {}
+            threading.Thread(target=self._schedule, name='salus-llm', daemon=True).start()
+
+    # 没有 system、不限制输出格式、不关闭思考时与只有提示词的缓存键相同
+    def cache_key(self, prompt, config, system=None, thinking=True):
+        content = prompt if system is None else json.dumps([system, prompt], ensure_ascii=False)
+        params = result_cache.generation_params(config)
+        if config.structured_output_config is not None:
+            params['json_schema'] = config.structured_output_config.json_schema
+        if not thinking:
+            params['enable_thinking'] = False
+        return result_cache.make_key('llm', result_cache.digest(content), self.model_id, params)
+
+    # 提交生成请求，返回 Request，通过 wait 取得结果；等待中的请求已达上限时抛出 QueueFull
+    # client 为请求来源，同一来源的请求排在一起，不同来源轮流加入生成；
+    # system 为固定的指令（见 PromptTemplate），thinking 为 False 时关闭 Qwen3 的思考过程；
+    # on_text 接收逐段输出的文字，should_stop 返回 True 时停止生成，不完整的输出不写入缓存
+    def submit(self, prompt, max_new_tokens=None, client=None, on_text=None, should_stop=None, system=None,
+               thinking=True, json_schema=None, **params):
+        config = self.generation_config(max_new_tokens, json_schema, **params)
+        req = Request(next(self._ids), prompt, config, client, on_text, should_stop, system, thinking)
+
+        # 采样生成的结果每次不同，不缓存
+        if self.cache is not None and not config.do_sample:
+            req.key = self.cache_key(prompt, config, system, thinking)
+            text = self.cache.get(req.key)
+            if text is not None:
+                self.requests += 1
+                self.cache_hits += 1
+                req.text, req.cached = text, True
+                req.done.set()
+                return req
+
+        self.start()
+        with self._cond:
+            if self._queued >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull()
+            self._waiting.setdefault(client, deque()).append(req)
+            self._queued += 1
+            self._cond.notify()
+        return req
+
+    # 等待请求完成，返回 Request.result()
+    def wait(self, req):
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        if req.cached:
+            if req.on_text is not None:
+                req.on_text(req.text)
+        elif req.key is not None and not req.stopped:
+            self.cache.put(req.key, 'llm', req.text)
+        return req.result()
+
+    # 生成提示词的完整输出，返回 {"text", "cached", "stopped", "tokens", "queue_s", "ttft_s", "tokens_per_sec", "seconds"}
+    def generate(self, prompt, max_new_tokens=None, client=None, on_text=None, should_stop=None, system=None,
+                 thinking=True, json_schema=None, **params):
+        return self.wait(self.submit(
+            prompt, max_new_tokens, client, on_text, should_stop, system, thinking, json_schema, **params
+        ))
+
+    # 在后台线程中等待生成结果，逐个产出 (事件, 数据)：("text", 文字)、等待超时的 ("ping", None)，
+    # 最后为 ("done", generate 的返回值) 或 ("error", 异常)。请求在调用时提交（可能抛出 QueueFull），
+    # 调用方不再读取（如客户端断开连接后关闭生成器）时，生成在下一步停止
+    def stream(self, prompt, max_new_tokens=None, client=None, system=None, thinking=True, json_schema=None,
+               **params):
+        events = queue.Queue()
+        closed = threading.Event()
+        req = self.submit(
+            prompt, max_new_tokens, client, on_text=lambda text: events.put(('text', text)),
+            should_stop=closed.is_set, system=system, thinking=thinking, json_schema=json_schema, **params
+        )
+
+        def run():
+            try:
+                events.put(('done', self.wait(req)))
+            except Exception as e:
+                events.put(('error', e))
+
+        threading.Thread(target=run, name='salus-llm-stream', daemon=True).start()
+
+        def iterate():
+            try:
+                while True:
+                    try:
+                        event, value = events.get(timeout=STREAM_KEEPALIVE)
+                    except queue.Empty:
+                        event, value = 'ping', None
+                    yield event, value
+                    if event in ('done', 'error'):
+                        return
+            finally:
+                closed.set()
+
+        return iterate()
+
+    # 轮流从各来源取出下一个等待中的请求，需持有 _cond
+    def _next_request(self):
+        while self._waiting:
+            client, waiting = next(iter(self._waiting.items()))
+            req = waiting.popleft()
+            if waiting:
+                self._waiting.move_to_end(client)
+            else:
+                del self._waiting[client]
+            self._queued -= 1
+            return req
+        return None
+
+    def _finish(self, req, error=None):
+        req.finished = time.perf_counter()
+        req.error = error
+        if error is None:
+            self.requests += 1
+            self.stopped += req.stopped
+            self.tokens += req.tokens
+        req.done.set()
+
+    # 调度线程：预热后循环加入等待中的请求并推进生成
+    def _schedule(self):
+        if self.warmup:
+            self._warm_up()
+        self.ready.set()
+
+        while True:
+            with self._cond:
+                while not self._queued and not self._running:
+                    self._cond.wait()
+
+            try:
+                self.load()
+            except Exception as e:
+                with self._cond:
+                    waiting = [req for queue_ in self._waiting.values() for req in queue_]
+                    self._waiting.clear()
+                    self._queued = 0
+                for req in waiting:
+                    self._finish(req, e)
+                continue
+
+            started = time.perf_counter()
+            try:
+                if self.batching:
+                    self._step()
+                else:
+                    self._run_one()
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.exception('大模型生成失败')
+                for req in self._running.values():
+                    self._finish(req, e)
+                self._running = {}
+            self.busy_seconds += time.perf_counter() - started
+
+    # 加载模型并生成一个 token，模型编译等一次性开销不计入第一个请求；模型不存在时只记录警告
+    def _warm_up(self):
+        try:
+            self.load()
+            started = time.perf_counter()
+            config = self.generation_config(1)
+            if self.batching:
+                handle = self.pipe.add_request(0, WARMUP_PROMPT, config)
+                while self.pipe.has_non_finished_requests():
+                    self.pipe.step()
+                handle.read_all()
+            else:
+                self.pipe.generate(WARMUP_PROMPT, config)
+            self.warmup_seconds = time.perf_counter() - started
+        except ModelNotFound as e:
+            if self.logger is not None:
+                self.logger.warning('大模型未预热：%s', e)
+        except Exception:
+            if self.logger is not None:
+                self.logger.exception('大模型预热失败')
+
+    # 连续批处理的一步：补足同时生成的请求，推理一步，读取各请求新生成的 token
+    def _step(self):
+        admitted = []
+        with self._cond:
+            while len(self._running) + len(admitted) < self.batch_size:
+                req = self._next_request()
+                if req is None:
+                    break
+                admitted.append(req)
+
+        for req in admitted:
+            if req.cancelled:
+                req.stopped = True
+                req.text = ''
+                self._finish(req)
+                continue
+            req.started = time.perf_counter()
+            # 参数无效（如无法编译的 json_schema）时只有这个请求失败
+            try:
+                req.handle = self.pipe.add_request(req.id, self._chat_prompt(req), req.config)
+            except RuntimeError as e:
+                self._finish(req, ValueError(f'生成参数无效：{e}'))
+                continue
+            self._running[req.id] = req
+        self.peak_batch = max(self.peak_batch, len(self._running))
+
+        self.pipe.step()
+
+        for req in list(self._running.values()):
+            while req.handle.can_read():
+                for output in req.handle.read().values():
+                    if output.generated_ids and req.first is None:
+                        req.first = time.perf_counter()
+                    req.ids.extend(output.generated_ids)
+            self._emit(req)
+
+            status = req.handle.get_status()
+            if status == ov_genai.GenerationStatus.RUNNING and req.cancelled:
+                # 停止后 KV 缓存在下一步释放
+                req.handle.cancel()
+                req.stopped = True
+            elif status == ov_genai.GenerationStatus.IGNORED:
+                del self._running[req.id]
+                self._finish(req, ValueError('提示词超出 KV 缓存容量，请调大 LLM_KV_CACHE_GB'))
+                continue
+            elif status == ov_genai.GenerationStatus.RUNNING:
+                continue
+
+            del self._running[req.id]
+            req.text = self.tokenizer.decode(req.ids)
+            req.tokens = len(req.ids)
+            self._emit(req, final=True)
+            self._finish(req)
+
+    # 按对话模板包装提示词（add_request 不套用模板，LLMPipeline.generate 的模板只有 user 消息），
+    # system 消息在前；关闭思考时由 Qwen3 的模板在回答前放入空的思考过程。
+    # 模型没有对话模板时 system 直接放在提示词前面
+    def _chat_prompt(self, req):
+        if not req.config.apply_chat_template or not self.tokenizer.chat_template:
+            return req.prompt if req.system is None else f'{req.system}\n\n{req.prompt}'
+
+        messages = [{"role": "user", "content": req.prompt}]
+        if req.system is not None:
+            messages.insert(0, {"role": "system", "content": req.system})
+        req.config.apply_chat_template = False
+        extra_context = None if req.thinking else {"enable_thinking": False}
+        return self.tokenizer.apply_chat_template(messages, True, extra_context=extra_context)
+
+    # 把新生成的 token 解码后交给 on_text；末尾不完整的多字节字符留到下一步
+    def _emit(self, req, final=False):
+        if req.on_text is None or not req.ids:
+            return
+        text = req.text if final else self.tokenizer.decode(req.ids)
+        if len(text) > req.sent and (final or not text.endswith('\ufffd')):
+            req.on_text(text[req.sent:])
+            req.sent = len(text)
+
+    # 逐个生成：取出下一个请求，生成到结束
+    def _run_one(self):
+        with self._cond:
+            req = self._next_request()
+        if req is None:
+            return
+        if req.cancelled:
+            req.stopped = True
+            req.text = ''
+            self._finish(req)
+            return
+
+        chunks = 0
+
+        def streamer(subword):
+            nonlocal chunks
+            if req.first is None:
+                req.first = time.perf_counter()
+            chunks += 1
+            if req.on_text is not None:
+                req.on_text(subword)
+            req.stopped = req.cancelled
+            return req.stopped
+
+        req.started = time.perf_counter()
+        self._running[req.id] = req
+        self.peak_batch = max(self.peak_batch, 1)
+        output = self.pipe.generate(self._chat_prompt(req), req.config, streamer)
+        del self._running[req.id]
+
+        # DecodedResults 带有 token 数统计，没有时按 streamer 回调次数估计
+        perf_metrics = getattr(output, 'perf_metrics', None)
+        req.tokens = perf_metrics.get_num_generated_tokens() if perf_metrics is not None else chunks
+        req.text = str(output)
+        self._finish(req)
+
+    def stats(self):
+        stats = {
+            "model_dir": self.model_dir,
+            "device": self.device,
+            "scheduler": 'batch' if self.batching else 'sequential',
+            "prefix_caching": self.batching and self.prefix_caching,
+            "loaded": self.loaded,
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "warmup_seconds": None if self.warmup_seconds is None else round(self.warmup_seconds, 3),
+            "max_new_tokens": self.max_new_tokens,
+            "batch_size": self.batch_size,
+            "max_queued": self.max_queued,
+            "queued": self._queued,
+            "running": len(self._running),
+            "peak_batch": self.peak_batch,
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "stopped": self.stopped,
+            "rejected": self.rejected,
+            "tokens": self.tokens,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "tokens_per_sec": round(self.tokens / self.busy_seconds, 2) if self.busy_seconds else None,
+        }
+        if self.batching and self.pipe is not None:
+            stats["kv_cache_usage"] = round(self.pipe.get_metrics().cache_usage, 2)
+        return stats
+
+
+# 在应用上注册大模型生成服务，未安装 openvino-genai 或 LLM_ENABLED 为 False 时不注册
+# （批处理、排队和公平调度都在进程内，多进程部署时只能有一个进程启用，见 gunicorn.conf.py）
+# LLM_WARMUP 为 True（默认）时每个进程启动后在后台加载并预热模型，否则在第一次生成时加载
+# 需在 result_cache.init_app 之后调用
+def init_app(app):
+    app.config.setdefault('LLM_ENABLED', True)
+    app.config.setdefault('LLM_MODEL_DIR', DEFAULT_MODEL_DIR)
+    app.config.setdefault('LLM_DEVICE', DEFAULT_DEVICE)
+    app.config.setdefault('LLM_MAX_NEW_TOKENS', DEFAULT_MAX_NEW_TOKENS)
+    app.config.setdefault('LLM_WARMUP', True)
+    app.config.setdefault('LLM_BATCHING', True)
+    app.config.setdefault('LLM_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    app.config.setdefault('LLM_MAX_QUEUED', DEFAULT_MAX_QUEUED)
+    app.config.setdefault('LLM_KV_CACHE_GB', DEFAULT_KV_CACHE_GB)
+    app.config.setdefault('LLM_PREFIX_CACHING', DEFAULT_PREFIX_CACHING)
+
+    if ov_genai is None or not get_bool(app.config, 'LLM_ENABLED'):
+        return
+
+    service = LLMService(
+        app.config['LLM_MODEL_DIR'],
+        device=app.config['LLM_DEVICE'],
+        max_new_tokens=int(app.config['LLM_MAX_NEW_TOKENS']),
+        cache=app.extensions.get('salus_result_cache'),
+        logger=app.logger,
+        batching=get_bool(app.config, 'LLM_BATCHING'),
+        batch_size=int(app.config['LLM_BATCH_SIZE']),
+        max_queued=int(app.config['LLM_MAX_QUEUED']),
+        kv_cache_gb=float(app.config['LLM_KV_CACHE_GB']),
+        prefix_caching=get_bool(app.config, 'LLM_PREFIX_CACHING'),
+        warmup=get_bool(app.config, 'LLM_WARMUP'),
+    )
+    app.extensions['salus_llm'] = service
+
+    # gunicorn 部署时由 post_worker_init 在 worker 启动后立即预热，其他情况在第一次请求时开始
+    if service.warmup:
+        app.before_request(service.start)
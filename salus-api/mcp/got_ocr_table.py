@@ -5,9 +5,21 @@ import argparse
 from pathlib import Path
 import requests
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
 import numpy as np
 
+# 图片预处理的默认参数：GOT-OCR 2.0 的输入为 1024x1024，处理器会把整张图片缩放到这个大小，
+# 长图先按高度切分为接近正方形的多页（最多 MAX_TILES 页），每页单独识别
+IMAGE_SIZE = 1024
+MAX_TILES = 4
+
+# 远程图片的最大字节数和下载超时（秒）
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+DOWNLOAD_TIMEOUT = 10
+
+# 识别结果中的 LaTeX 表格（含嵌套表格），用于合并多页的识别结果
+TABULAR_PATTERN = re.compile(r'\\begin\{tabular\}\{([^{}]*)\}(.*)\\end\{tabular\}', re.S)
+
 # 检查并下载必要的工具函数
 def download_helper_files():
     if not Path("cmd_helper.py").exists():
@@ -33,15 +45,114 @@ def install_dependencies():
     if platform.system() == "Darwin":
         pip_install("numpy<2.0")
 
-# 加载图像函数
-def load_image(image_file):
-    if isinstance(image_file, str) and image_file.startswith("https://"):
-        response = requests.get(image_file)
-        image = Image.open(BytesIO(response.content))
-    else:
-        image = Image.open(image_file)
+# 下载远程图片，超过 max_bytes 或 timeout 秒没有响应时抛出 OSError（requests 的异常也是 OSError）
+def download_image(url, max_bytes=MAX_DOWNLOAD_BYTES, timeout=DOWNLOAD_TIMEOUT):
+    data = BytesIO()
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(64 * 1024):
+            data.write(chunk)
+            if data.tell() > max_bytes:
+                raise OSError(f"图片超过{max_bytes}字节：{url}")
+    data.seek(0)
+    return data
+
+# 加载图像函数；指定 size 时 JPEG 按 draft 模式直接以 1/2、1/4 或 1/8 的分辨率解码（短边不小于 size），
+# 并按 EXIF 方向旋转手机拍摄的照片
+def load_image(image_file, size=None):
+    if isinstance(image_file, str) and image_file.startswith(("https://", "http://")):
+        image_file = download_image(image_file)
+    image = Image.open(image_file)
+    if size is None:
+        return image.convert("RGB")
+    
+    image.draft("RGB", (size, size))
+    image = ImageOps.exif_transpose(image)
     return image.convert("RGB")
 
+# 裁掉表格四周的背景和空白：先找出纸张（亮度超过一半的行和列），再在纸张内找出深色内容（文字、表格线）
+# 超过 0.2% 的行和列，四周保留 margin 像素。在缩小到短边约 256 像素的灰度图上计算，
+# 缩小时每块取最暗的像素，细的表格线不会被平均掉；找不到时返回原图
+def crop_table(image, margin=16):
+    scale = max(min(image.size) // 256, 1)
+    gray = np.asarray(image.convert("L"))
+    rows, cols = gray.shape[0] // scale, gray.shape[1] // scale
+    gray = gray[:rows * scale, :cols * scale].reshape(rows, scale, cols, scale).min(axis=(1, 3))
+    gray = np.asarray(ImageOps.autocontrast(Image.fromarray(gray), cutoff=1))
+    bright = gray >= 128
+    rows = np.flatnonzero(bright.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(bright.mean(axis=0) > 0.5)
+    if len(rows) == 0 or len(cols) == 0:
+        return image
+    
+    paper = gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] < 128
+    ink_rows = np.flatnonzero(paper.mean(axis=1) > 0.002)
+    ink_cols = np.flatnonzero(paper.mean(axis=0) > 0.002)
+    if len(ink_rows) == 0 or len(ink_cols) == 0:
+        return image
+    
+    width, height = image.size
+    box = (
+        max(int(cols[0] + ink_cols[0]) * scale - margin, 0),
+        max(int(rows[0] + ink_rows[0]) * scale - margin, 0),
+        min(int(cols[0] + ink_cols[-1] + 1) * scale + margin, width),
+        min(int(rows[0] + ink_rows[-1] + 1) * scale + margin, height),
+    )
+    return image.crop(box) if box != (0, 0, width, height) else image
+
+# 把长图按高度切分为接近正方形的多页（高度不超过 size 的小图不切分），
+# 切分位置取目标位置附近最亮的行（行间空白）中离目标最近的一行，避免切断文字
+def split_tiles(image, size=IMAGE_SIZE, max_tiles=MAX_TILES):
+    width, height = image.size
+    count = min(max_tiles, round(height / width), -(-height // size))
+    if count <= 1:
+        return [image]
+    
+    brightness = np.asarray(image.convert("L"), dtype=np.float32).mean(axis=1)
+    window = max(height // (count * 4), 1)
+    cuts = [0]
+    for i in range(1, count):
+        target = height * i // count
+        segment = brightness[target - window:target + window]
+        candidates = np.flatnonzero(segment >= segment.max() - 1)
+        cuts.append(target - window + int(candidates[np.argmin(np.abs(candidates - window))]))
+    cuts.append(height)
+    return [image.crop((0, top, width, bottom)) for top, bottom in zip(cuts, cuts[1:])]
+
+# 预处理已解码的图片：裁剪表格区域，缩小到短边为 size（长边不超过 size * max_tiles），长图切分为多页
+def preprocess_image(image, size=IMAGE_SIZE, max_tiles=MAX_TILES, crop=True):
+    if crop:
+        image = crop_table(image)
+    
+    width, height = image.size
+    scale = min(size / min(width, height), size * max_tiles / max(width, height))
+    if scale < 1:
+        target = (max(round(width * scale), 1), max(round(height * scale), 1))
+        image = image.resize(target, Image.LANCZOS, reducing_gap=3.0)
+    return split_tiles(image, size, max_tiles)
+
+# 合并同一张图片各页的识别结果：各页都是 LaTeX 表格时合并为一个表格（列格式取第一页），否则按页换行拼接
+def merge_tile_results(texts):
+    if len(texts) == 1:
+        return texts[0]
+    
+    matches = [TABULAR_PATTERN.search(text) for text in texts]
+    if not all(matches):
+        return "\n".join(text.strip() for text in texts)
+    
+    rows = []
+    for match in matches:
+        body = match.group(2).strip()
+        if body and not body.endswith(("\\\\", "\\hline")):
+            body += " \\\\"
+        rows.append(body)
+    body = "\n".join(rows)
+    return (
+        texts[0][:matches[0].start()]
+        + f"\\begin{{tabular}}{{{matches[0].group(1)}}}\n{body}\n\\end{{tabular}}"
+        + texts[-1][matches[-1].end():]
+    )
+
 # 将OCR结果转换为Markdown表格
 def convert_to_markdown_table(text):
     # 检测表格结构
@@ -136,14 +247,24 @@ def convert_to_markdown_table(text):
         return "\n".join(md_table)
 
 # 使用提示词引导模型输出表格格式
-def process_image_with_prompt(image, processor, model, output_format="markdown"):
+def process_image_with_prompt(image, processor, model, output_format="markdown", max_new_tokens=4096):
+    result = process_images_with_prompt([image], processor, model, output_format, max_new_tokens)[0]
+    
+    # 如果是LaTeX格式的表格，进行特殊处理
+    # if "\\begin{tabular}" in result:
+    #     result = convert_latex_to_markdown(result)
+    
+    return result
+
+# 批量识别多张图像，结果与输入顺序一致
+def process_images_with_prompt(images, processor, model, output_format="markdown", max_new_tokens=4096):
     # 根据输出格式选择不同的提示词
-    if output_format == "markdown":
-        # 使用format=True参数告诉模型输出格式化文本
-        inputs = processor(image, return_tensors="pt", format=True)
+    if output_format in ("markdown", "latex"):
+        # 使用format=True参数告诉模型输出格式化文本（表格为LaTeX）
+        inputs = processor(images, return_tensors="pt", format=True)
     else:
         # 普通文本识别
-        inputs = processor(image, return_tensors="pt")
+        inputs = processor(images, return_tensors="pt")
     
     # 生成文本
     generate_ids = model.generate(
@@ -151,20 +272,14 @@ def process_image_with_prompt(image, processor, model, output_format="markdown")
         do_sample=False,
         tokenizer=processor.tokenizer,
         stop_strings="<|im_end|>",
-        max_new_tokens=4096,
+        max_new_tokens=max_new_tokens,
     )
     
-    # 解码生成的文本
-    result = processor.decode(
-        generate_ids[0, inputs["input_ids"].shape[1]:],
+    # 解码生成的文本；批量输入已填充到相同长度，生成部分从同一位置开始
+    return processor.batch_decode(
+        generate_ids[:, inputs["input_ids"].shape[1]:],
         skip_special_tokens=True,
     )
-    
-    # 如果是LaTeX格式的表格，进行特殊处理
-    # if "\\begin{tabular}" in result:
-    #     result = convert_latex_to_markdown(result)
-    
-    return result
 
 def convert_latex_to_markdown(latex_text):
     """将LaTeX表格转换为Markdown格式"""
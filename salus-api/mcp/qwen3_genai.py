@@ -1,22 +1,18 @@
-import openvino_genai as ov_genai
+import os
 import sys
 
-model_dir = r'C:\Users\zangq\Repo\model\OpenVINO\Qwen3-1.7B-int4-ov'
-print(f"Loading model from {model_dir}\n")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import llm
+import result_cache
 
-pipe = ov_genai.LLMPipeline(str(model_dir), 'CPU')
-
-generation_config = ov_genai.GenerationConfig()
-generation_config.max_new_tokens = 32768
+# 用法：python mcp/qwen3_genai.py [模型目录]，模型目录默认为 SALUS_LLM_MODEL_DIR 或 llm.DEFAULT_MODEL_DIR
+model_dir = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('SALUS_LLM_MODEL_DIR', llm.DEFAULT_MODEL_DIR)
 
 
 def streamer(subword):
     print(subword, end="", flush=True)
     sys.stdout.flush()
-    # Return flag corresponds whether generation should be stopped.
-    # False means continue generation.
-    return False
 
 
 input_prompt = '''请从今天开始，根据医嘱整理一下未来3个月我需要完成的康复训练。
@@ -108,4 +104,9 @@ input_prompt = '''请从今天开始，根据医嘱整理一下未来3个月我
 \end{tabular}
 '''
 print(f"Input text: {input_prompt}")
-result = pipe.generate(input_prompt, generation_config, streamer)
\ No newline at end of file
+
+# 相同的模型、提示词和生成参数直接使用缓存的结果，不加载模型
+service = llm.LLMService(model_dir, max_new_tokens=32768, cache=result_cache.ResultCache(), warmup=False)
+result = service.generate(input_prompt, on_text=streamer)
+print(f"\n\n首 token {result['ttft_s']} 秒，{result['tokens']} 个 token，{result['tokens_per_sec']} token/秒"
+      if not result['cached'] else '\n\n（来自结果缓存）')
\ No newline at end of file
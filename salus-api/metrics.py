@@ -0,0 +1,338 @@
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+
+from config import get_bool
+
+# 请求与SQL语句的性能指标，通过 GET /metrics 以 Prometheus 文本格式导出：
+# - 每个路由的请求数和延迟直方图
+# - 每个路由中每条SQL语句的执行次数、耗时、行数，以及执行计划中的全表扫描/临时排序
+# - 每个请求执行的语句数（包括隐式事务语句和触发器内的语句，来自 sqlite3 的 trace 回调）
+# - 超过阈值（SLOW_QUERY_MS）的语句写入应用日志
+
+# 请求延迟直方图的桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 每个请求语句数直方图的桶
+STATEMENT_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# 需要检查执行计划的语句
+_PLANNED = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b', re.IGNORECASE)
+
+# 执行计划中值得关注的行：全表扫描、为排序或分组建立临时B树
+_PLAN_WARNING = re.compile(r'^(SCAN \w+(?: AS \w+)?|USE TEMP B-TREE FOR .*)$')
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?){2,}')
+
+
+# 规范化SQL作为指标标签：合并空白，IN 列表中连续的多个占位符合并
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    return _PLACEHOLDER_LIST.sub('?, ...', _WHITESPACE.sub(' ', sql).strip())
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StatementStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.max_seconds = 0.0
+
+
+class Metrics:
+    """进程内的指标存储，各 worker 进程分别统计"""
+
+    def __init__(self, slow_query_seconds=None, check_plans=True):
+        self.slow_query_seconds = slow_query_seconds
+        self.check_plans = check_plans
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.statements = {}
+        self.statements_per_request = Histogram(STATEMENT_COUNT_BUCKETS)
+        self.slow_queries = {}
+        # 规范化SQL -> 执行计划中的警告行
+        self.plan_warnings = {}
+
+    def observe_request(self, method, endpoint, status, seconds, statements):
+        with self._lock:
+            key = (method, endpoint, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get((method, endpoint))
+            if histogram is None:
+                histogram = self.latency[(method, endpoint)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            self.statements_per_request.observe(statements)
+
+    # 记录语句的一次执行（calls=1）或一次读取结果（calls=0）
+    def observe_statement(self, endpoint, sql, seconds, rows, calls):
+        with self._lock:
+            stats = self.statements.get((endpoint, sql))
+            if stats is None:
+                stats = self.statements[(endpoint, sql)] = StatementStats()
+            stats.calls += calls
+            stats.seconds += seconds
+            stats.rows += rows
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def observe_slow_query(self, endpoint):
+        with self._lock:
+            self.slow_queries[endpoint] = self.slow_queries.get(endpoint, 0) + 1
+
+    # 首次执行某条语句时检查其执行计划
+    def inspect_plan(self, conn, sql, normalized, parameters):
+        if not self.check_plans or normalized in self.plan_warnings or not _PLANNED.match(sql):
+            return
+        try:
+            plan = sqlite3.Cursor(conn).execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+        except sqlite3.Error:
+            plan = []
+        with self._lock:
+            self.plan_warnings[normalized] = [row[3] for row in plan if _PLAN_WARNING.match(row[3])]
+
+    def render(self, cache=None):
+        lines = []
+        with self._lock:
+            lines += _header('salus_http_requests_total', 'counter', '按路由和状态码统计的请求数')
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(_sample('salus_http_requests_total', {'method': method, 'endpoint': endpoint, 'status': status}, count))
+
+            lines += _header('salus_http_request_duration_seconds', 'histogram', '按路由统计的请求延迟')
+            for (method, endpoint), histogram in sorted(self.latency.items()):
+                lines += _histogram('salus_http_request_duration_seconds', {'method': method, 'endpoint': endpoint}, histogram)
+
+            lines += _header('salus_http_request_statements', 'histogram', '每个请求执行的SQL语句数（含触发器）')
+            lines += _histogram('salus_http_request_statements', {}, self.statements_per_request)
+
+            for name, kind, help_text, value in (
+                ('salus_db_statement_calls_total', 'counter', '语句执行次数', lambda s: s.calls),
+                ('salus_db_statement_seconds_total', 'counter', '语句执行和读取结果的总耗时', lambda s: s.seconds),
+                ('salus_db_statement_rows_total', 'counter', '语句读取或修改的行数', lambda s: s.rows),
+                ('salus_db_statement_max_seconds', 'gauge', '语句单次执行或读取的最长耗时', lambda s: s.max_seconds),
+            ):
+                lines += _header(name, kind, help_text)
+                for (endpoint, sql), stats in sorted(self.statements.items()):
+                    lines.append(_sample(name, {'endpoint': endpoint, 'statement': sql}, value(stats)))
+
+            lines += _header('salus_db_plan_warning', 'gauge', '执行计划中包含全表扫描或临时排序的语句')
+            for sql, warnings in sorted(self.plan_warnings.items()):
+                for detail in warnings:
+                    lines.append(_sample('salus_db_plan_warning', {'statement': sql, 'detail': detail}, 1))
+
+            lines += _header('salus_db_slow_queries_total', 'counter', '超过慢查询阈值的语句数')
+            for endpoint, count in sorted(self.slow_queries.items()):
+                lines.append(_sample('salus_db_slow_queries_total', {'endpoint': endpoint}, count))
+
+        if cache is not None:
+            stats = cache.stats()
+            lines += _header('salus_response_cache_total', 'counter', '响应缓存命中情况')
+            for endpoint, counters in sorted(stats['endpoints'].items()):
+                for outcome, count in sorted(counters.items()):
+                    lines.append(_sample('salus_response_cache_total', {'endpoint': endpoint, 'outcome': outcome}, count))
+            lines += _header('salus_response_cache_entries', 'gauge', '响应缓存条目数')
+            lines.append(_sample('salus_response_cache_entries', {}, stats['entries']))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+
+def _sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f'{name}{{{label_text}}} {value}'
+    return f'{name} {value}'
+
+
+def _histogram(name, labels, histogram):
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(_sample(f'{name}_bucket', {**labels, 'le': bound}, count))
+    lines.append(_sample(f'{name}_bucket', {**labels, 'le': '+Inf'}, histogram.count))
+    lines.append(_sample(f'{name}_sum', labels, round(histogram.sum, 6)))
+    lines.append(_sample(f'{name}_count', labels, histogram.count))
+    return lines
+
+
+# 当前语句所属的路由，请求之外（如流式响应结束后）为 none
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+def current_metrics():
+    if has_app_context():
+        return current_app.extensions.get('salus_metrics')
+    return None
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """记录每条语句执行和读取结果耗时的游标"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._executed(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._executed(sql, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(1 if row is not None else 0, time.perf_counter() - start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), time.perf_counter() - start)
+        return rows
+
+    def _executed(self, sql, parameters, seconds):
+        metrics = current_metrics()
+        if metrics is None:
+            self._statement = None
+            return
+
+        self._metrics = metrics
+        self._endpoint = current_endpoint()
+        self._statement = normalize_sql(sql)
+        self._seconds = seconds
+        self._rows = max(self.rowcount, 0)
+        self._slow_logged = False
+
+        metrics.observe_statement(self._endpoint, self._statement, seconds, self._rows, 1)
+        if parameters is not None:
+            metrics.inspect_plan(self.connection, sql, self._statement, parameters)
+        self._check_slow()
+
+    def _fetched(self, rows, seconds):
+        if getattr(self, '_statement', None) is None:
+            return
+        self._seconds += seconds
+        self._rows += rows
+        self._metrics.observe_statement(self._endpoint, self._statement, seconds, rows, 0)
+        self._check_slow()
+
+    # 语句（执行加上已读取的结果）累计耗时超过阈值时记录一次日志
+    def _check_slow(self):
+        threshold = self._metrics.slow_query_seconds
+        if self._slow_logged or not threshold or self._seconds < threshold:
+            return
+        self._slow_logged = True
+        self._metrics.observe_slow_query(self._endpoint)
+        warnings = self._metrics.plan_warnings.get(self._statement)
+        if has_app_context():
+            current_app.logger.warning(
+                '慢查询 %.1fms rows=%d endpoint=%s plan=%s sql=%s',
+                self._seconds * 1000, self._rows, self._endpoint,
+                '; '.join(warnings) if warnings else '-', self._statement
+            )
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """游标带计时，并通过 trace 回调统计执行的语句数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = 0
+        self.set_trace_callback(self._count_statement)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # trace 回调：每执行一条语句（含触发器内的语句）计数一次
+    # 写请求的触发器每行都会回调，这里只做自增，不访问请求上下文
+    def _count_statement(self, statement):
+        self.statements += 1
+
+
+def start_timer():
+    g._salus_request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.pop('_salus_request_started', None)
+    if started is not None:
+        conn = g.get('_database')
+        current_app.extensions['salus_metrics'].observe_request(
+            request.method, current_endpoint(), response.status_code,
+            time.perf_counter() - started, getattr(conn, 'statements', 0)
+        )
+    return response
+
+
+# 连接归还连接池前清零语句计数，流式响应在请求结束后执行的语句不计入下一个请求
+def reset_statements(exception=None):
+    conn = g.get('_database')
+    if conn is not None and hasattr(conn, 'statements'):
+        conn.statements = 0
+
+
+# 导出 Prometheus 文本格式的指标
+def metrics_view():
+    text = current_app.extensions['salus_metrics'].render(current_app.extensions.get('salus_cache'))
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+
+# 在应用上注册指标采集，需在 database.init_app 之后调用
+def init_app(app):
+    app.config.setdefault('METRICS', True)
+    app.config.setdefault('SLOW_QUERY_MS', 100)
+    app.config.setdefault('QUERY_PLAN_CHECK', True)
+
+    if not get_bool(app.config, 'METRICS'):
+        return
+
+    slow_query_ms = app.config['SLOW_QUERY_MS']
+    app.extensions['salus_metrics'] = Metrics(
+        slow_query_seconds=slow_query_ms / 1000 if slow_query_ms else None,
+        check_plans=get_bool(app.config, 'QUERY_PLAN_CHECK'),
+    )
+    app.extensions['salus_db'].factory = InstrumentedConnection
+
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    # 在 database.release_db 之前执行（teardown 按注册的相反顺序调用）
+    app.teardown_appcontext(reset_statements)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
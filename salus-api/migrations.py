@@ -0,0 +1,678 @@
+import argparse
+import re
+import sqlite3
+import sys
+
+import cache
+import config
+import database
+import occurrences
+import rollups
+
+# 版本化的数据库迁移，当前版本记录在 PRAGMA user_version 中
+# 每个迁移为 (版本号, 说明, SQL脚本或接收游标的函数)，只能追加，不能修改已发布的迁移
+MIGRATIONS = [
+    (1, '初始表结构', '''
+        CREATE TABLE IF NOT EXISTS exercises (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            duration_sec INTEGER NOT NULL,
+            rest_sec INTEGER NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS recovery_cycles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS training_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cycle_id INTEGER NOT NULL,
+            exercise_id INTEGER NOT NULL,
+            scheduled_time TIME NOT NULL,
+            sets INTEGER NOT NULL,
+            day_of_week INTEGER, -- 0-6表示周日到周六
+            specific_date DATE, -- 特定日期的任务
+            is_completed BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cycle_id) REFERENCES recovery_cycles(id),
+            FOREIGN KEY (exercise_id) REFERENCES exercises(id)
+        );
+        CREATE TABLE IF NOT EXISTS completions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            completed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            actual_sets INTEGER,
+            notes TEXT,
+            FOREIGN KEY (task_id) REFERENCES training_tasks(id)
+        );
+    '''),
+    (2, '热点查询索引', '''
+        -- GET /tasks、GET /cycles/<id> 按周期、星期、日期筛选
+        CREATE INDEX IF NOT EXISTS idx_tasks_cycle_day_date
+            ON training_tasks (cycle_id, day_of_week, specific_date);
+        -- GET /tasks 不带周期时按日期、星期筛选
+        CREATE INDEX IF NOT EXISTS idx_tasks_date_day
+            ON training_tasks (specific_date, day_of_week);
+        -- 删除运动类型前检查引用
+        CREATE INDEX IF NOT EXISTS idx_tasks_exercise
+            ON training_tasks (exercise_id);
+        -- get_task、delete_task、delete_completion 按任务查找完成记录
+        CREATE INDEX IF NOT EXISTS idx_completions_task
+            ON completions (task_id, completed_at);
+        -- 统计与列表按 date(completed_at) 范围筛选，表达式索引使其成为范围扫描
+        CREATE INDEX IF NOT EXISTS idx_completions_day
+            ON completions (date(completed_at), task_id, actual_sets);
+    '''),
+    (3, '任务实例表', '''
+        CREATE TABLE IF NOT EXISTS task_occurrences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            cycle_id INTEGER NOT NULL,
+            occurs_on DATE NOT NULL,
+            is_completed BOOLEAN DEFAULT 0,
+            UNIQUE (task_id, occurs_on),
+            FOREIGN KEY (task_id) REFERENCES training_tasks(id),
+            FOREIGN KEY (cycle_id) REFERENCES recovery_cycles(id)
+        );
+        -- 今日任务：按日期（及周期）查找实例
+        CREATE INDEX IF NOT EXISTS idx_occurrences_date_cycle
+            ON task_occurrences (occurs_on, cycle_id);
+        ALTER TABLE completions ADD COLUMN occurrence_id INTEGER REFERENCES task_occurrences(id);
+        CREATE INDEX IF NOT EXISTS idx_completions_occurrence
+            ON completions (occurrence_id);
+    '''),
+    (4, '生成任务实例并关联完成记录', occurrences.rebuild_occurrences),
+    (5, '完成记录汇总表及维护触发器', '''
+        CREATE TABLE IF NOT EXISTS completion_rollups (
+            cycle_id INTEGER NOT NULL,
+            exercise_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            completions INTEGER NOT NULL DEFAULT 0,
+            total_sets INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (cycle_id, exercise_id, day)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_rollups_day ON completion_rollups (day);
+
+        -- 新增完成记录：累加到所属任务的 (周期, 运动, 日期)
+        CREATE TRIGGER IF NOT EXISTS trg_rollups_completion_insert
+        AFTER INSERT ON completions
+        BEGIN
+            INSERT INTO completion_rollups (cycle_id, exercise_id, day, completions, total_sets)
+            SELECT t.cycle_id, t.exercise_id, date(NEW.completed_at), 1, COALESCE(NEW.actual_sets, 0)
+            FROM training_tasks t
+            WHERE t.id = NEW.task_id
+            ON CONFLICT (cycle_id, exercise_id, day) DO UPDATE SET
+                completions = completions + excluded.completions,
+                total_sets = total_sets + excluded.total_sets;
+        END;
+
+        -- 删除完成记录：从汇总中扣减
+        CREATE TRIGGER IF NOT EXISTS trg_rollups_completion_delete
+        AFTER DELETE ON completions
+        BEGIN
+            UPDATE completion_rollups
+            SET completions = completions - 1,
+                total_sets = total_sets - COALESCE(OLD.actual_sets, 0)
+            WHERE (cycle_id, exercise_id) = (SELECT t.cycle_id, t.exercise_id FROM training_tasks t WHERE t.id = OLD.task_id)
+              AND day = date(OLD.completed_at);
+            DELETE FROM completion_rollups
+            WHERE (cycle_id, exercise_id) = (SELECT t.cycle_id, t.exercise_id FROM training_tasks t WHERE t.id = OLD.task_id)
+              AND day = date(OLD.completed_at)
+              AND completions <= 0;
+        END;
+
+        -- 修改完成记录：先扣减旧值再累加新值
+        CREATE TRIGGER IF NOT EXISTS trg_rollups_completion_update
+        AFTER UPDATE OF task_id, completed_at, actual_sets ON completions
+        BEGIN
+            UPDATE completion_rollups
+            SET completions = completions - 1,
+                total_sets = total_sets - COALESCE(OLD.actual_sets, 0)
+            WHERE (cycle_id, exercise_id) = (SELECT t.cycle_id, t.exercise_id FROM training_tasks t WHERE t.id = OLD.task_id)
+              AND day = date(OLD.completed_at);
+            DELETE FROM completion_rollups
+            WHERE (cycle_id, exercise_id) = (SELECT t.cycle_id, t.exercise_id FROM training_tasks t WHERE t.id = OLD.task_id)
+              AND day = date(OLD.completed_at)
+              AND completions <= 0;
+            INSERT INTO completion_rollups (cycle_id, exercise_id, day, completions, total_sets)
+            SELECT t.cycle_id, t.exercise_id, date(NEW.completed_at), 1, COALESCE(NEW.actual_sets, 0)
+            FROM training_tasks t
+            WHERE t.id = NEW.task_id
+            ON CONFLICT (cycle_id, exercise_id, day) DO UPDATE SET
+                completions = completions + excluded.completions,
+                total_sets = total_sets + excluded.total_sets;
+        END;
+
+        -- 任务改了周期或运动：把该任务的完成记录整体移到新的键下
+        CREATE TRIGGER IF NOT EXISTS trg_rollups_task_update
+        AFTER UPDATE OF cycle_id, exercise_id ON training_tasks
+        WHEN OLD.cycle_id IS NOT NEW.cycle_id OR OLD.exercise_id IS NOT NEW.exercise_id
+        BEGIN
+            UPDATE completion_rollups
+            SET completions = completions - (
+                    SELECT COUNT(*) FROM completions c
+                    WHERE c.task_id = OLD.id AND date(c.completed_at) = completion_rollups.day),
+                total_sets = total_sets - (
+                    SELECT COALESCE(SUM(c.actual_sets), 0) FROM completions c
+                    WHERE c.task_id = OLD.id AND date(c.completed_at) = completion_rollups.day)
+            WHERE cycle_id = OLD.cycle_id AND exercise_id = OLD.exercise_id
+              AND day IN (SELECT date(c.completed_at) FROM completions c WHERE c.task_id = OLD.id);
+            DELETE FROM completion_rollups
+            WHERE cycle_id = OLD.cycle_id AND exercise_id = OLD.exercise_id AND completions <= 0;
+            INSERT INTO completion_rollups (cycle_id, exercise_id, day, completions, total_sets)
+            SELECT NEW.cycle_id, NEW.exercise_id, date(c.completed_at), COUNT(*), COALESCE(SUM(c.actual_sets), 0)
+            FROM completions c
+            WHERE c.task_id = NEW.id
+            GROUP BY date(c.completed_at)
+            ON CONFLICT (cycle_id, exercise_id, day) DO UPDATE SET
+                completions = completions + excluded.completions,
+                total_sets = total_sets + excluded.total_sets;
+        END;
+
+        -- 删除任务：其残留的完成记录不再计入统计
+        CREATE TRIGGER IF NOT EXISTS trg_rollups_task_delete
+        AFTER DELETE ON training_tasks
+        BEGIN
+            UPDATE completion_rollups
+            SET completions = completions - (
+                    SELECT COUNT(*) FROM completions c
+                    WHERE c.task_id = OLD.id AND date(c.completed_at) = completion_rollups.day),
+                total_sets = total_sets - (
+                    SELECT COALESCE(SUM(c.actual_sets), 0) FROM completions c
+                    WHERE c.task_id = OLD.id AND date(c.completed_at) = completion_rollups.day)
+            WHERE cycle_id = OLD.cycle_id AND exercise_id = OLD.exercise_id
+              AND day IN (SELECT date(c.completed_at) FROM completions c WHERE c.task_id = OLD.id);
+            DELETE FROM completion_rollups
+            WHERE cycle_id = OLD.cycle_id AND exercise_id = OLD.exercise_id AND completions <= 0;
+        END;
+    '''),
+    (6, '计算完成记录汇总', rollups.rebuild_rollups),
+    (7, '完成记录分页索引', '''
+        -- GET /completions 按 (completed_at, id) 倒序游标分页
+        CREATE INDEX IF NOT EXISTS idx_completions_completed_at
+            ON completions (completed_at);
+    '''),
+    (8, '表版本号及写入触发器', cache.install_version_triggers),
+    (9, '数据分析变更日志及触发器', '''
+        -- 完成汇总或任务实例发生变化的 (周期, 日期)，analytics.py 据此增量刷新内存中的列式数据
+        -- seq 不使用 AUTOINCREMENT（省去每次写 sqlite_sequence）；清理时总保留最新的行，新行的 seq 仍然递增
+        CREATE TABLE IF NOT EXISTS analytics_changes (
+            seq INTEGER PRIMARY KEY,
+            cycle_id INTEGER NOT NULL,
+            day DATE NOT NULL
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_rollups_insert
+        AFTER INSERT ON completion_rollups
+        BEGIN
+            INSERT INTO analytics_changes (cycle_id, day) VALUES (NEW.cycle_id, NEW.day);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_rollups_update
+        AFTER UPDATE ON completion_rollups
+        BEGIN
+            INSERT INTO analytics_changes (cycle_id, day) VALUES (NEW.cycle_id, NEW.day);
+            INSERT INTO analytics_changes (cycle_id, day)
+            SELECT OLD.cycle_id, OLD.day WHERE OLD.cycle_id IS NOT NEW.cycle_id OR OLD.day IS NOT NEW.day;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_rollups_delete
+        AFTER DELETE ON completion_rollups
+        BEGIN
+            INSERT INTO analytics_changes (cycle_id, day) VALUES (OLD.cycle_id, OLD.day);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_occurrences_insert
+        AFTER INSERT ON task_occurrences
+        BEGIN
+            INSERT INTO analytics_changes (cycle_id, day) VALUES (NEW.cycle_id, NEW.occurs_on);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_occurrences_update
+        AFTER UPDATE OF cycle_id, occurs_on, is_completed ON task_occurrences
+        BEGIN
+            INSERT INTO analytics_changes (cycle_id, day) VALUES (NEW.cycle_id, NEW.occurs_on);
+            INSERT INTO analytics_changes (cycle_id, day)
+            SELECT OLD.cycle_id, OLD.occurs_on WHERE OLD.cycle_id IS NOT NEW.cycle_id OR OLD.occurs_on IS NOT NEW.occurs_on;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_occurrences_delete
+        AFTER DELETE ON task_occurrences
+        BEGIN
+            INSERT INTO analytics_changes (cycle_id, day) VALUES (OLD.cycle_id, OLD.occurs_on);
+        END;
+
+        -- 只保留最近的变更，每1000条清理一次；落后太多的进程会改为全量重新加载
+        CREATE TRIGGER IF NOT EXISTS trg_analytics_changes_prune
+        AFTER INSERT ON analytics_changes
+        WHEN NEW.seq % 1000 = 0
+        BEGIN
+            DELETE FROM analytics_changes WHERE seq <= NEW.seq - 100000;
+        END;
+    '''),
+    (10, '清理孤立数据', '''
+        -- 周期或运动类型已不存在的训练任务（其完成记录由汇总触发器从汇总中扣减）
+        DELETE FROM training_tasks
+        WHERE cycle_id NOT IN (SELECT id FROM recovery_cycles)
+           OR exercise_id NOT IN (SELECT id FROM exercises);
+        -- 任务或周期已不存在的任务实例
+        DELETE FROM task_occurrences
+        WHERE task_id NOT IN (SELECT id FROM training_tasks)
+           OR cycle_id NOT IN (SELECT id FROM recovery_cycles);
+        -- 任务已被删除的完成记录（如删除周期时遗留的）
+        DELETE FROM completions WHERE task_id NOT IN (SELECT id FROM training_tasks);
+        UPDATE completions SET occurrence_id = NULL
+        WHERE occurrence_id IS NOT NULL AND occurrence_id NOT IN (SELECT id FROM task_occurrences);
+    '''),
+    (11, '外键级联删除', lambda cursor: add_cascades(cursor)),
+    (12, '完成状态维护触发器', '''
+        -- 完成记录的增删改同步任务实例和训练任务的 is_completed：
+        -- 实例有完成记录即为已完成；任务有完成记录时置为已完成，最后一条完成记录删除后恢复为未完成
+        CREATE TRIGGER IF NOT EXISTS trg_completed_insert
+        AFTER INSERT ON completions
+        BEGIN
+            UPDATE task_occurrences SET is_completed = 1
+            WHERE id = NEW.occurrence_id AND is_completed IS NOT 1;
+            UPDATE training_tasks SET is_completed = 1
+            WHERE id = NEW.task_id AND is_completed IS NOT 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_completed_update
+        AFTER UPDATE OF task_id, occurrence_id ON completions
+        BEGIN
+            UPDATE task_occurrences SET is_completed = 1
+            WHERE id = NEW.occurrence_id AND is_completed IS NOT 1;
+            UPDATE task_occurrences SET is_completed = 0
+            WHERE id = OLD.occurrence_id AND is_completed
+              AND NOT EXISTS (SELECT 1 FROM completions c WHERE c.occurrence_id = OLD.occurrence_id);
+            UPDATE training_tasks SET is_completed = 1
+            WHERE id = NEW.task_id AND is_completed IS NOT 1;
+            UPDATE training_tasks SET is_completed = 0
+            WHERE id = OLD.task_id AND is_completed
+              AND NOT EXISTS (SELECT 1 FROM completions c WHERE c.task_id = OLD.task_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_completed_delete
+        AFTER DELETE ON completions
+        BEGIN
+            UPDATE task_occurrences SET is_completed = 0
+            WHERE id = OLD.occurrence_id AND is_completed
+              AND NOT EXISTS (SELECT 1 FROM completions c WHERE c.occurrence_id = OLD.occurrence_id);
+            UPDATE training_tasks SET is_completed = 0
+            WHERE id = OLD.task_id AND is_completed
+              AND NOT EXISTS (SELECT 1 FROM completions c WHERE c.task_id = OLD.task_id);
+        END;
+
+        -- 级联删除完成记录时任务行已被删除，完成记录的删除触发器找不到所属的周期和运动，
+        -- 因此改为在删除任务之前从汇总中扣减该任务的全部完成记录（按日期分组一次扣减）
+        DROP TRIGGER IF EXISTS trg_rollups_task_delete;
+        CREATE TRIGGER trg_rollups_task_delete
+        BEFORE DELETE ON training_tasks
+        BEGIN
+            INSERT INTO completion_rollups (cycle_id, exercise_id, day, completions, total_sets)
+            SELECT OLD.cycle_id, OLD.exercise_id, date(c.completed_at), -COUNT(*), -COALESCE(SUM(c.actual_sets), 0)
+            FROM completions c
+            WHERE c.task_id = OLD.id
+            GROUP BY date(c.completed_at)
+            ON CONFLICT (cycle_id, exercise_id, day) DO UPDATE SET
+                completions = completions + excluded.completions,
+                total_sets = total_sets + excluded.total_sets;
+            DELETE FROM completion_rollups
+            WHERE cycle_id = OLD.cycle_id AND exercise_id = OLD.exercise_id AND completions <= 0;
+        END;
+    '''),
+    (13, '后台任务', '''
+        -- 耗时的模型任务（OCR、计划导入）排队后由后台线程执行（见 jobs.py），进程重启后继续执行
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued', -- queued / running / succeeded / failed / cancelled
+            params TEXT NOT NULL DEFAULT '{}',     -- JSON
+            stage TEXT,
+            progress REAL NOT NULL DEFAULT 0,      -- 0-1
+            detail TEXT,                           -- JSON，处理函数记录的进度详情
+            result TEXT,                           -- JSON
+            error TEXT,
+            cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,                           -- 执行任务的进程
+            heartbeat_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+        -- 领取最早排队的任务、统计和检查执行中的任务
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+        -- 任务的输入文件（如上传的图片），任务结束后删除
+        CREATE TABLE IF NOT EXISTS job_inputs (
+            job_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            name TEXT,
+            data BLOB NOT NULL,
+            PRIMARY KEY (job_id, position),
+            FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE
+        );
+    '''),
+]
+
+# 迁移 11 重建后的表定义：删除周期级联删除其训练任务和任务实例，删除任务级联删除其实例和完成记录；
+# 仍有完成记录的实例和被训练任务引用的运动类型不能删除（级联删除时二者在同一条语句中删除，不受影响）
+CASCADE_TABLES = [
+    ('training_tasks', '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cycle_id INTEGER NOT NULL,
+            exercise_id INTEGER NOT NULL,
+            scheduled_time TIME NOT NULL,
+            sets INTEGER NOT NULL,
+            day_of_week INTEGER, -- 0-6表示周日到周六
+            specific_date DATE, -- 特定日期的任务
+            is_completed BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cycle_id) REFERENCES recovery_cycles(id) ON DELETE CASCADE,
+            FOREIGN KEY (exercise_id) REFERENCES exercises(id)
+        )
+    '''),
+    ('task_occurrences', '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            cycle_id INTEGER NOT NULL,
+            occurs_on DATE NOT NULL,
+            is_completed BOOLEAN DEFAULT 0,
+            UNIQUE (task_id, occurs_on),
+            FOREIGN KEY (task_id) REFERENCES training_tasks(id) ON DELETE CASCADE,
+            FOREIGN KEY (cycle_id) REFERENCES recovery_cycles(id) ON DELETE CASCADE
+        )
+    '''),
+    ('completions', '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            completed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            actual_sets INTEGER,
+            notes TEXT,
+            occurrence_id INTEGER,
+            FOREIGN KEY (task_id) REFERENCES training_tasks(id) ON DELETE CASCADE,
+            FOREIGN KEY (occurrence_id) REFERENCES task_occurrences(id)
+        )
+    '''),
+]
+
+# 需要走索引的热点查询：(名称, SQL, 参数)
+HOT_QUERIES = [
+    ('tasks_by_exercise', '''
+        SELECT id FROM training_tasks WHERE exercise_id = ?
+    ''', (1,)),
+    ('completions_by_task', '''
+        SELECT * FROM completions
+        WHERE task_id = ?
+        ORDER BY completed_at DESC
+    ''', (1,)),
+    ('completions_by_date_range', '''
+        SELECT c.*, t.scheduled_time, e.name as exercise_name
+        FROM completions c
+        JOIN training_tasks t ON c.task_id = t.id
+        JOIN exercises e ON t.exercise_id = e.id
+        WHERE date(c.completed_at) >= ? AND date(c.completed_at) <= ?
+    ''', ('2025-01-01', '2025-12-31')),
+    ('completions_page', '''
+        SELECT c.id, c.completed_at, t.scheduled_time, e.name as exercise_name
+        FROM completions c
+        JOIN training_tasks t ON c.task_id = t.id
+        JOIN exercises e ON t.exercise_id = e.id
+        WHERE (c.completed_at, c.id) < (?, ?)
+        ORDER BY c.completed_at DESC, c.id DESC
+        LIMIT ?
+    ''', ('2025-06-01 00:00:00', 100, 50)),
+    ('occurrences_by_date', '''
+        SELECT o.id, o.occurs_on, o.is_completed, t.scheduled_time, e.name as exercise_name
+        FROM task_occurrences o
+        JOIN training_tasks t ON o.task_id = t.id
+        JOIN exercises e ON t.exercise_id = e.id
+        WHERE o.occurs_on = ? AND o.cycle_id = ?
+    ''', ('2025-01-01', 1)),
+    ('rollups_by_cycle', '''
+        SELECT r.day, e.name, SUM(r.completions) as count, SUM(r.total_sets) as total_sets
+        FROM completion_rollups r
+        JOIN exercises e ON r.exercise_id = e.id
+        WHERE r.day >= ? AND r.day <= ? AND r.cycle_id = ?
+        GROUP BY r.day, e.name
+    ''', ('2025-01-01', '2025-12-31', 1)),
+    ('rollups_by_date_range', '''
+        SELECT r.day, e.name, SUM(r.completions) as count, SUM(r.total_sets) as total_sets
+        FROM completion_rollups r
+        JOIN exercises e ON r.exercise_id = e.id
+        WHERE r.day >= ? AND r.day <= ?
+        GROUP BY r.day, e.name
+    ''', ('2025-01-01', '2025-12-31')),
+    ('stats_by_date_range', '''
+        SELECT date(c.completed_at) as date, COUNT(*) as count
+        FROM completions c
+        JOIN training_tasks t ON c.task_id = t.id
+        WHERE date(c.completed_at) >= ? AND date(c.completed_at) <= ?
+        GROUP BY date(c.completed_at)
+    ''', ('2025-01-01', '2025-12-31')),
+]
+
+# GET /tasks 的 SQL 由 routes/tasks.py 的 build_tasks_query 按查询参数生成，检查时直接使用它生成的语句：
+# (名称, 查询参数)
+TASKS_QUERIES = [
+    ('tasks_by_date', {'date': '2025-01-01'}),
+    ('tasks_by_cycle_and_date', {'date': '2025-01-01', 'cycle_id': '1'}),
+    ('tasks_by_cycle', {'cycle_id': '1'}),
+]
+
+
+# 所有热点查询：HOT_QUERIES 加上 GET /tasks 实际执行的查询
+def hot_queries():
+    # routes 依赖 Flask，只在检查时导入
+    from routes.tasks import build_tasks_query
+
+    queries = list(HOT_QUERIES)
+    for name, args in TASKS_QUERIES:
+        query, params, _, _ = build_tasks_query(args)
+        queries.append((name, query, tuple(params)))
+    return queries
+
+
+# 全表扫描的计划行，例如 "SCAN t" 或 "SCAN training_tasks"
+_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+# 查询中的表名和别名，例如 "JOIN exercises e" 得到 ("exercises", "e")
+_TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# 小型字典表：行数只随运动类型增长，不随周期和完成记录增长。数据量大时 SQLite 会以它作为连接的外层
+# 全表扫描，再按索引查找其他表（如 "SCAN e" 加 "SEARCH t USING INDEX idx_tasks_exercise"），这是合理的计划
+LOOKUP_TABLES = {'exercises'}
+
+
+# 按新的定义重建表（SQLite 不能修改已有的外键约束）：建新表、复制数据、删除旧表后改名，
+# 再恢复旧表上的索引、触发器、自增序号和 ANALYZE 统计信息（删除表时会一并删除，缺少统计信息查询计划会变差）。
+# 需在关闭外键约束的连接上执行
+def rebuild_table(cursor, table, definition):
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    )
+    objects = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+    sequence = cursor.fetchone()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    statistics = []
+    if cursor.fetchone():
+        cursor.execute('SELECT tbl, idx, stat FROM sqlite_stat1 WHERE tbl = ?', (table,))
+        statistics = cursor.fetchall()
+    cursor.execute(f'PRAGMA table_info({table})')
+    columns = ', '.join(row[1] for row in cursor.fetchall())
+
+    cursor.execute(definition.format(name=f'{table}_new'))
+    cursor.execute(f'INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}')
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+
+    for sql in objects:
+        cursor.execute(sql)
+    if sequence is not None:
+        cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+    if statistics:
+        cursor.executemany('INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)', statistics)
+        # 让当前连接重新读取统计信息
+        cursor.execute('ANALYZE sqlite_master')
+
+
+# 迁移 11：以级联删除的外键重建子表，重建后检查外键
+# 改名时使用旧版语义，其他表的触发器中对这些表的引用保持原样
+def add_cascades(cursor):
+    cursor.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        for table, definition in CASCADE_TABLES:
+            rebuild_table(cursor, table, definition)
+    finally:
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+
+    cursor.execute('PRAGMA foreign_key_check')
+    violations = cursor.fetchall()
+    if violations:
+        raise sqlite3.IntegrityError(f'外键检查失败：{[tuple(row) for row in violations[:10]]}')
+
+
+# 当前数据库版本
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+# 把SQL脚本拆分为单条语句（触发器体内的分号不会被拆开）
+def split_statements(script):
+    statements = []
+    pending = ''
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ''
+    if pending.strip() and not pending.strip().startswith('--'):
+        statements.append(pending.strip())
+    return statements
+
+
+# 执行所有未应用的迁移，返回应用的版本号列表
+# 每个迁移在持有写锁（BEGIN IMMEDIATE）的事务中执行，并在锁内重新读取版本号，
+# 多个 worker 进程同时启动时只有一个会真正执行迁移
+def migrate(conn):
+    applied = []
+
+    # 重建表的迁移要求关闭外键约束（PRAGMA foreign_keys 在事务内设置无效），迁移结束后恢复
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for target, description, script in MIGRATIONS:
+            if target <= current_version(conn):
+                continue
+
+            try:
+                database.begin_write(conn)
+                if target <= current_version(conn):
+                    conn.rollback()
+                    continue
+
+                if callable(script):
+                    script(conn.cursor())
+                else:
+                    for statement in split_statements(script):
+                        conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {int(target)}')
+                conn.commit()
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            applied.append((target, description))
+    finally:
+        conn.execute(f'PRAGMA foreign_keys = {int(foreign_keys)}')
+
+    return applied
+
+
+# 执行计划中需要报告的全表扫描，忽略对字典表的扫描
+def full_scans(plan, query):
+    tables = {}
+    for table, alias in _TABLE_ALIAS.findall(query):
+        tables[alias or table] = table
+
+    scans = []
+    for row in plan:
+        match = _FULL_SCAN.match(row[3])
+        if match and tables.get(match.group(1), match.group(1)) not in LOOKUP_TABLES:
+            scans.append(row[3])
+    return scans
+
+
+# 检查热点查询的执行计划，返回出现全表扫描的查询
+def check_query_plans(conn, queries=None):
+    failures = []
+
+    for name, query, params in queries or hot_queries():
+        plan = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        scans = full_scans(plan, query)
+        if scans:
+            failures.append((name, scans))
+
+    return failures
+
+
+# 应用启动时自动迁移
+def init_app(app):
+    app.config.setdefault('AUTO_MIGRATE', True)
+
+    if config.get_bool(app.config, 'AUTO_MIGRATE'):
+        conn = database.connect(app.config['DATABASE'])
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """执行数据库迁移"""
+        sys.exit(main(['--db', app.config['DATABASE']]))
+
+    @app.cli.command('check-plans')
+    def check_plans_command():
+        """检查热点查询是否走索引"""
+        sys.exit(main(['--db', app.config['DATABASE'], '--check']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus 数据库迁移工具')
+    parser.add_argument('--db', type=str, default=database.DEFAULT_DB_PATH, help='数据库文件路径')
+    parser.add_argument('--check', action='store_true', help='迁移后检查热点查询的执行计划')
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        applied = migrate(conn)
+        for version, description in applied:
+            print(f'已应用迁移 {version}: {description}')
+        print(f'当前数据库版本: {current_version(conn)}')
+
+        if args.check:
+            failures = check_query_plans(conn)
+            for name, scans in failures:
+                print(f'查询 {name} 出现全表扫描: {"; ".join(scans)}')
+            if failures:
+                return 1
+            print('所有热点查询均使用索引')
+    finally:
+        conn.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
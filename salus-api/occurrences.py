@@ -0,0 +1,151 @@
+from datetime import timedelta
+
+# 任务实例（task_occurrences）：把周期内的重复任务展开为按日期的实例
+# 没有 specific_date 的任务在所属周期的每个匹配星期的日期上各有一个实例（day_of_week 为空则每天），
+# 有 specific_date 的任务只在该日期有一个实例；完成记录通过 completions.occurrence_id 关联到实例
+
+# IN 查询每批的参数数量
+_CHUNK_SIZE = 500
+
+# 实例日期与任务计划不再匹配（且没有完成记录）时删除
+_DELETE_STALE = '''
+    DELETE FROM task_occurrences
+    WHERE task_id IN (SELECT t.id FROM training_tasks t WHERE {scope})
+      AND NOT EXISTS (SELECT 1 FROM completions c WHERE c.occurrence_id = task_occurrences.id)
+      AND NOT EXISTS (
+          SELECT 1
+          FROM training_tasks t
+          JOIN recovery_cycles r ON r.id = t.cycle_id
+          WHERE t.id = task_occurrences.task_id
+            AND (
+                t.specific_date = task_occurrences.occurs_on
+                OR (
+                    t.specific_date IS NULL
+                    AND task_occurrences.occurs_on BETWEEN r.start_date AND r.end_date
+                    AND (t.day_of_week IS NULL
+                         OR t.day_of_week = CAST(strftime('%w', task_occurrences.occurs_on) AS INTEGER))
+                )
+            )
+      )
+'''
+
+# 任务被移到其他周期时同步实例的周期ID
+_UPDATE_CYCLE = '''
+    UPDATE task_occurrences
+    SET cycle_id = (SELECT t.cycle_id FROM training_tasks t WHERE t.id = task_occurrences.task_id)
+    WHERE task_id IN (SELECT t.id FROM training_tasks t WHERE {scope})
+'''
+
+# 按周期日期展开生成缺失的实例
+_INSERT_MISSING = '''
+    INSERT OR IGNORE INTO task_occurrences (task_id, cycle_id, occurs_on)
+    WITH RECURSIVE days(cycle_id, day, end_date) AS (
+        SELECT r.id, r.start_date, r.end_date
+        FROM recovery_cycles r
+        WHERE r.id IN (SELECT t.cycle_id FROM training_tasks t WHERE {scope})
+        UNION ALL
+        SELECT cycle_id, date(day, '+1 day'), end_date FROM days WHERE day < end_date
+    )
+    SELECT t.id, t.cycle_id, d.day
+    FROM training_tasks t
+    JOIN days d ON d.cycle_id = t.cycle_id
+    WHERE ({scope})
+      AND t.specific_date IS NULL
+      AND (t.day_of_week IS NULL OR t.day_of_week = CAST(strftime('%w', d.day) AS INTEGER))
+    UNION ALL
+    SELECT t.id, t.cycle_id, t.specific_date
+    FROM training_tasks t
+    WHERE ({scope}) AND t.specific_date IS NOT NULL
+'''
+
+
+# 生成 (范围条件, 参数) 列表，ID较多时分批
+def _scopes(task_ids=None, cycle_ids=None):
+    if task_ids is None and cycle_ids is None:
+        return [('1 = 1', [])]
+
+    scopes = []
+    for column, ids in (('t.id', task_ids), ('t.cycle_id', cycle_ids)):
+        ids = sorted(set(ids or []))
+        for start in range(0, len(ids), _CHUNK_SIZE):
+            chunk = ids[start:start + _CHUNK_SIZE]
+            scopes.append((f'{column} IN ({", ".join("?" * len(chunk))})', chunk))
+    return scopes
+
+
+# 按任务当前计划增量同步实例：删除过期实例（保留已有完成记录的），补齐缺失实例
+# 不传参数时同步全部任务
+def sync_occurrences(cursor, task_ids=None, cycle_ids=None):
+    for scope, params in _scopes(task_ids, cycle_ids):
+        cursor.execute(_DELETE_STALE.format(scope=scope), params)
+        cursor.execute(_UPDATE_CYCLE.format(scope=scope), params)
+        # 范围条件在语句中出现三次
+        cursor.execute(_INSERT_MISSING.format(scope=scope), params * 3)
+
+
+# 把第 start_week 到 end_week 周中星期在 days 里的日期展开为 [(日期, 星期)]，不超过周期结束日期
+# 第N周为从周期开始日期起的第N个7天，day_of_week 0-6 表示周日到周六
+def week_dates(cycle_start, cycle_end, start_week, end_week, days):
+    dates = []
+    for week in range(start_week, end_week + 1):
+        week_start = cycle_start + timedelta(days=(week - 1) * 7)
+        for offset in range(7):
+            current = week_start + timedelta(days=offset)
+            if current > cycle_end:
+                return dates
+            day = (current.weekday() + 1) % 7
+            if day in days:
+                dates.append((current.isoformat(), day))
+    return dates
+
+
+# 查找任务在某天的实例ID
+def find_occurrence(cursor, task_id, on_date):
+    cursor.execute(
+        'SELECT id FROM task_occurrences WHERE task_id = ? AND occurs_on = ?',
+        (task_id, on_date)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# 把完成记录关联到实例（实例的完成状态由 completions 上的触发器维护，见迁移 12）
+# 未指定实例时按完成记录的日期查找
+def attach_completion(cursor, completion_id, occurrence_id=None):
+    if occurrence_id is None:
+        cursor.execute('''
+            UPDATE completions
+            SET occurrence_id = (
+                SELECT o.id FROM task_occurrences o
+                WHERE o.task_id = completions.task_id
+                  AND o.occurs_on = date(completions.completed_at)
+            )
+            WHERE id = ?
+        ''', (completion_id,))
+    else:
+        cursor.execute(
+            'UPDATE completions SET occurrence_id = ? WHERE id = ?',
+            (occurrence_id, completion_id)
+        )
+
+
+# 全量重建：生成所有实例，并把尚未关联的完成记录按日期关联到实例
+def rebuild_occurrences(cursor):
+    sync_occurrences(cursor)
+
+    cursor.execute('''
+        UPDATE completions
+        SET occurrence_id = (
+            SELECT o.id FROM task_occurrences o
+            WHERE o.task_id = completions.task_id
+              AND o.occurs_on = date(completions.completed_at)
+        )
+        WHERE occurrence_id IS NULL
+    ''')
+
+    cursor.execute('''
+        UPDATE task_occurrences
+        SET is_completed = EXISTS (
+            SELECT 1 FROM completions c WHERE c.occurrence_id = task_occurrences.id
+        )
+    ''')
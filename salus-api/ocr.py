@@ -0,0 +1,278 @@
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import jobs
+import result_cache
+from config import get_bool
+
+# OCR 依赖（transformers、optimum-intel、Pillow 等）为可选依赖，未安装时 /ocr 返回 501
+try:
+    from PIL import Image
+    from mcp.got_ocr_table import (
+        convert_latex_to_markdown, convert_to_markdown_table, load_image, merge_tile_results, preprocess_image,
+        process_images_with_prompt,
+    )
+except ImportError:
+    Image = None
+
+# 常驻的表格识别服务：每个进程只加载一次 GOT-OCR 2.0 处理器和模型（mcp/got_ocr_table.py 每次运行都要重新加载），
+# 上传的多张图片按批次送入模型；识别结果按图片内容缓存（见 result_cache.py），重复上传的图片不再推理。
+# 图片在有界的线程池中解码和预处理：按模型输入大小缩小解码、按 EXIF 方向旋转、裁剪表格区域，长图切分为多页
+
+# 输出格式：markdown 为 Markdown 表格（由模型输出的 LaTeX 表格转换），latex 为模型输出的 LaTeX，text 为纯文本
+FORMATS = ('markdown', 'latex', 'text')
+
+# 默认配置，可通过 app.config 或 SALUS_ 前缀的环境变量覆盖
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mcp', 'GOT-OCR-2.0-hf', 'INT4')
+DEFAULT_DEVICE = 'CPU'
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_MAX_NEW_TOKENS = 4096
+DEFAULT_MAX_IMAGES = 16
+# 预处理后图片的短边（GOT-OCR 2.0 的输入大小），0 为不预处理（按原始分辨率解码，整张图片送入模型）；
+# 长图最多切分的页数
+DEFAULT_IMAGE_SIZE = 1024
+DEFAULT_MAX_TILES = 4
+DEFAULT_CROP_TABLE = True
+DEFAULT_DECODE_WORKERS = 2
+
+
+class ModelNotFound(Exception):
+    """模型目录不存在"""
+
+
+class InvalidImage(ValueError):
+    """无法解码的图片，index 为其在输入中的位置"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+# 解码图片的原始字节，size 不为空时解码时缩小并按 EXIF 方向旋转（见 mcp/got_ocr_table.py 的 load_image）
+def open_image(data, index=0, size=None):
+    try:
+        return load_image(io.BytesIO(data), size)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(index, str(e)) from e
+
+
+# 把模型输出整理为请求的格式
+def format_result(text, output_format):
+    if output_format != 'markdown':
+        return text
+    if '\\begin{tabular}' in text:
+        return convert_latex_to_markdown(text)
+    if not text.strip().startswith('|'):
+        return convert_to_markdown_table(text)
+    return text
+
+
+class OCRService:
+    """进程内常驻的 OCR 模型，第一次使用时加载；推理串行执行，每次最多 batch_size 页（长图切分后的每一页）"""
+
+    def __init__(self, model_dir, device=DEFAULT_DEVICE, batch_size=DEFAULT_BATCH_SIZE,
+                 max_new_tokens=DEFAULT_MAX_NEW_TOKENS, cache=None, image_size=DEFAULT_IMAGE_SIZE,
+                 max_tiles=DEFAULT_MAX_TILES, crop_table=DEFAULT_CROP_TABLE, decode_workers=DEFAULT_DECODE_WORKERS):
+        self.model_dir = model_dir
+        # 缓存键中的模型标识
+        self.model_id = os.path.abspath(model_dir)
+        self.cache = cache
+        self.device = device
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.image_size = image_size
+        self.max_tiles = max_tiles
+        self.crop_table = crop_table
+        self.processor = None
+        self.model = None
+        self.load_seconds = None
+        self.images = 0
+        self.tiles = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.decode_seconds = 0.0
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()
+        # 所有请求共用的解码线程池，同时解码的图片数不超过 decode_workers，限制解码占用的内存
+        # （线程在第一次解码时才创建，gunicorn 在主进程中创建应用后 fork 不受影响）
+        self._decoder = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='salus-ocr-decode')
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    # 加载处理器和模型，已加载时直接返回
+    def load(self):
+        with self._load_lock:
+            if self.model is not None:
+                return
+            if not os.path.isdir(self.model_dir):
+                raise ModelNotFound(self.model_dir)
+
+            from transformers import AutoProcessor
+            from optimum.intel.openvino import OVModelForVisualCausalLM
+
+            started = time.perf_counter()
+            self.processor = AutoProcessor.from_pretrained(self.model_dir)
+            self.model = OVModelForVisualCausalLM.from_pretrained(self.model_dir, device=self.device, use_fast=False)
+            self.load_seconds = time.perf_counter() - started
+
+    # 图片识别结果的缓存键；markdown 和 latex 的模型输出相同（只是整理方式不同），共用一份缓存。
+    # 预处理参数不同时送入模型的图片不同，不共用缓存
+    def cache_key(self, data, output_format):
+        params = {"formatted": output_format != 'text', "max_new_tokens": self.max_new_tokens}
+        if self.image_size:
+            params["preprocess"] = {"size": self.image_size, "max_tiles": self.max_tiles, "crop": self.crop_table}
+        return result_cache.make_key('ocr', result_cache.digest(data), self.model_id, params)
+
+    # 解码并预处理一张图片，返回送入模型的各页；不预处理时为原始分辨率的整张图片
+    def prepare(self, data, index=0):
+        if not self.image_size:
+            return [open_image(data, index)]
+        image = open_image(data, index, self.image_size)
+        return preprocess_image(image, self.image_size, self.max_tiles, self.crop_table)
+
+    # 在解码线程池中并行准备多张图片，返回与输入顺序一致的各页列表；无法解码时抛出 InvalidImage
+    def decode(self, images, indexes=None):
+        indexes = range(len(images)) if indexes is None else indexes
+        started = time.perf_counter()
+        pages = list(self._decoder.map(self.prepare, images, indexes))
+        self.decode_seconds += time.perf_counter() - started
+        return pages
+
+    # 识别多张图片（原始字节），返回与输入顺序一致的结果列表
+    # 每项为 {"text": 模型原始输出, "table": 按格式整理后的结果, "cached": 是否来自缓存, "tiles": 切分的页数,
+    #        "batch": 最后一页所在的批次序号, "seconds": 该批次的推理耗时}；缓存命中的图片不解码也不推理，批次为 None
+    # 一张图片的多页按顺序识别后合并为一个结果（见 merge_tile_results）
+    # on_batch(已完成张数, 总张数) 在每批完成后调用，抛出异常时停止识别
+    def recognize(self, images, output_format='markdown', on_batch=None):
+        texts = [None] * len(images)
+        keys = [None] * len(images)
+        if self.cache is not None:
+            for i, data in enumerate(images):
+                keys[i] = self.cache_key(data, output_format)
+                texts[i] = self.cache.get(keys[i])
+
+        results = [
+            {"text": text, "table": format_result(text, output_format), "cached": True, "tiles": None,
+             "batch": None, "seconds": 0.0}
+            if text is not None else None
+            for text in texts
+        ]
+        pending = [i for i, text in enumerate(texts) if text is None]
+        if not pending:
+            return results
+
+        pages = self.decode([images[i] for i in pending], pending)
+        self.load()
+
+        tiles = [(i, page) for i, image_pages in zip(pending, pages) for page in image_pages]
+        remaining = {i: len(image_pages) for i, image_pages in zip(pending, pages)}
+        outputs = {i: [] for i in pending}
+        done = len(images) - len(pending)
+        for number, start in enumerate(range(0, len(tiles), self.batch_size)):
+            batch = tiles[start:start + self.batch_size]
+            with self._infer_lock:
+                started = time.perf_counter()
+                batch_outputs = process_images_with_prompt(
+                    [page for _, page in batch], self.processor, self.model, output_format, self.max_new_tokens
+                )
+                elapsed = time.perf_counter() - started
+                self.tiles += len(batch)
+                self.batches += 1
+                self.busy_seconds += elapsed
+
+            for (i, _), text in zip(batch, batch_outputs):
+                outputs[i].append(text)
+                remaining[i] -= 1
+                if remaining[i]:
+                    continue
+                text = merge_tile_results(outputs[i])
+                if self.cache is not None:
+                    self.cache.put(keys[i], 'ocr', text)
+                results[i] = {
+                    "text": text,
+                    "table": format_result(text, output_format),
+                    "cached": False,
+                    "tiles": len(outputs[i]),
+                    "batch": number,
+                    "seconds": round(elapsed, 3),
+                }
+                self.images += 1
+                done += 1
+
+            if on_batch is not None:
+                on_batch(done, len(images))
+
+        return results
+
+    def stats(self):
+        return {
+            "model_dir": self.model_dir,
+            "device": self.device,
+            "loaded": self.loaded,
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "batch_size": self.batch_size,
+            "image_size": self.image_size or None,
+            "max_tiles": self.max_tiles,
+            "images": self.images,
+            "tiles": self.tiles,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "decode_seconds": round(self.decode_seconds, 3),
+            "images_per_minute": round(self.images / self.busy_seconds * 60, 2) if self.busy_seconds else None,
+        }
+
+
+# 后台识别任务的处理函数（任务类型 ocr，见 jobs.py），参数为 format，输入文件为上传的图片
+@jobs.handler('ocr')
+def run_recognize(job):
+    output_format = job.params.get('format', 'markdown')
+
+    def on_batch(done, total):
+        job.update(progress=done / total)
+        job.check_cancelled()
+
+    try:
+        results = current_app.extensions['salus_ocr'].recognize(job.inputs, output_format, on_batch=on_batch)
+    except InvalidImage as e:
+        raise ValueError(f"无法识别的图片：{job.input_names[e.index]}") from e
+    except ModelNotFound as e:
+        raise ValueError(f"OCR 模型不存在：{e}") from e
+
+    return {
+        "format": output_format,
+        "results": [{"filename": name, **result} for name, result in zip(job.input_names, results)],
+    }
+
+
+# 在应用上注册 OCR 服务（模型在第一次请求时加载），未安装依赖时不注册
+# 需在 result_cache.init_app 之后调用
+def init_app(app):
+    app.config.setdefault('OCR_MODEL_DIR', DEFAULT_MODEL_DIR)
+    app.config.setdefault('OCR_DEVICE', DEFAULT_DEVICE)
+    app.config.setdefault('OCR_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    app.config.setdefault('OCR_MAX_NEW_TOKENS', DEFAULT_MAX_NEW_TOKENS)
+    app.config.setdefault('OCR_MAX_IMAGES', DEFAULT_MAX_IMAGES)
+    app.config.setdefault('OCR_IMAGE_SIZE', DEFAULT_IMAGE_SIZE)
+    app.config.setdefault('OCR_MAX_TILES', DEFAULT_MAX_TILES)
+    app.config.setdefault('OCR_CROP_TABLE', DEFAULT_CROP_TABLE)
+    app.config.setdefault('OCR_DECODE_WORKERS', DEFAULT_DECODE_WORKERS)
+
+    if Image is not None:
+        app.extensions['salus_ocr'] = OCRService(
+            app.config['OCR_MODEL_DIR'],
+            device=app.config['OCR_DEVICE'],
+            batch_size=int(app.config['OCR_BATCH_SIZE']),
+            max_new_tokens=int(app.config['OCR_MAX_NEW_TOKENS']),
+            cache=app.extensions.get('salus_result_cache'),
+            image_size=int(app.config['OCR_IMAGE_SIZE']),
+            max_tiles=int(app.config['OCR_MAX_TILES']),
+            crop_table=get_bool(app.config, 'OCR_CROP_TABLE'),
+            decode_workers=int(app.config['OCR_DECODE_WORKERS']),
+        )
@@ -0,0 +1,43 @@
+# 列表接口的分页（limit + 游标）与字段投影（fields）参数解析
+
+# 单页最大条数
+MAX_PAGE_SIZE = 500
+
+
+# 解析 limit 参数，返回 (条数, 错误信息)，未提供时条数为 None
+def parse_limit(value):
+    if value is None or value == '':
+        return None, None
+
+    try:
+        limit = int(value)
+    except ValueError:
+        return None, "limit必须是整数"
+
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        return None, f"limit必须在1-{MAX_PAGE_SIZE}之间"
+
+    return limit, None
+
+
+# 解析 fields 参数并生成 SELECT 列表，返回 (SELECT 列表, 错误信息)
+# columns 为 {输出字段名: SQL表达式}，required 中的字段（如分页游标所需）总会被选出
+def parse_fields(value, columns, required=()):
+    if not value:
+        names = list(columns)
+    else:
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            return None, f"不支持的字段：{', '.join(unknown)}"
+
+        names += [name for name in required if name not in names]
+
+    return ', '.join(f'{columns[name]} as {name}' for name in names), None
+
+
+# 截取一页数据，返回 (本页数据, 是否还有下一页)；查询时应多取一条
+def split_page(rows, limit):
+    if limit is None or len(rows) <= limit:
+        return rows, False
+    return rows[:limit], True
@@ -0,0 +1,436 @@
+import json
+import re
+import time
+from datetime import date
+
+from flask import current_app
+
+import database
+import jobs
+import llm
+import ocr
+from config import get_bool
+from database import get_db
+from occurrences import sync_occurrences, week_dates
+from routes.tasks import normalize_time
+
+# 医嘱表格导入：把 mcp/got_ocr_table.py（图片 → LaTeX 表格）、mcp/qwen3_genai.py（表格 → 训练计划）
+# 和 POST /tasks/batch（计划 → 训练任务）串成一条流水线。导入作为后台任务（见 jobs.py）按阶段依次执行：
+#   ocr     识别上传的表格图片（直接提交表格文本时跳过）
+#   parse   把 LaTeX / Markdown 表格解析为行列，整理为 Markdown 表格
+#   extract 由 Qwen3（常驻的生成服务，见 llm.py）从表格中提取 JSON 格式的训练计划，
+#           默认按 PLAN_SCHEMA 约束输出并关闭思考过程；输出无效时带上错误重新生成
+#   insert  在一个事务中创建运动类型和训练任务（dry_run 时跳过）
+# 每个阶段的状态和耗时记录在任务的进度详情中，通过 GET /jobs/<id> 查询
+
+STAGES = ('ocr', 'parse', 'extract', 'insert')
+
+# 默认配置，可通过 app.config 或 SALUS_ 前缀的环境变量覆盖
+DEFAULT_STRUCTURED_OUTPUT = True
+DEFAULT_THINKING = False
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 提取训练计划的提示词：固定的指令在前（所有导入共享，开启前缀缓存时只计算一次），患者的表格在后
+PLAN_PROMPT = llm.PromptTemplate('''请根据用户提供的康复训练医嘱表格，整理出需要按时完成的训练计划。
+表格第一行为各个阶段（如“术后 0-1 周”），其余每行为一项训练在各阶段的安排。
+
+只输出一个 JSON 对象，不要输出其他内容，格式为：
+{"tasks": [{"name": "运动名称", "duration_sec": 每组时长（秒）, "rest_sec": 组间休息（秒）, "start_week": 开始周, "end_week": 结束周, "days": [星期几], "scheduled_time": "HH:MM", "sets": 组数}]}
+要求：
+- 周数从 1 开始，第 1 周为康复周期开始后的第一个 7 天，术后当天属于第 1 周；
+- days 中 0-6 表示周日到周六，每天都做的训练为 [0, 1, 2, 3, 4, 5, 6]；
+- 同一运动在不同阶段的组数不同时，按阶段分为多项；
+- 冰敷、佩戴支具、拄拐、禁止下蹲等注意事项不是训练任务，不要输出。
+''', content='{tables}')
+
+# 训练计划的 JSON Schema，字段对应 exercises（name、duration_sec、rest_sec）和
+# training_tasks（sets、scheduled_time，start_week 到 end_week 每周的 days 展开为 day_of_week 和日期）。
+# 结构化输出时每个 token 都受 schema 约束，不会输出思考过程；数值之间的关系（开始周不大于结束周等）仍由 validate_plan 校验
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tasks": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "minLength": 1},
+                    "duration_sec": {"type": "integer", "minimum": 1},
+                    "rest_sec": {"type": "integer", "minimum": 0},
+                    "start_week": {"type": "integer", "minimum": 1},
+                    "end_week": {"type": "integer", "minimum": 1},
+                    "days": {
+                        "type": "array",
+                        "minItems": 1,
+                        "maxItems": 7,
+                        "items": {"type": "integer", "minimum": 0, "maximum": 6},
+                    },
+                    "scheduled_time": {"type": "string", "pattern": "^([01][0-9]|2[0-3]):[0-5][0-9]$"},
+                    "sets": {"type": "integer", "minimum": 1},
+                },
+                "required": [
+                    "name", "duration_sec", "rest_sec", "start_week", "end_week", "days", "scheduled_time", "sets",
+                ],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["tasks"],
+    "additionalProperties": False,
+}
+
+# 输出无效时追加在提示词后面，让模型改正后重新输出（提示词不同，不会命中上一次的结果缓存）
+RETRY_PROMPT = '{prompt}\n\n上一次输出的训练计划有误：{error}。请改正后重新输出完整的 JSON 对象。'
+
+
+class PlanError(ValueError):
+    """表格无法解析、模型输出不是有效的训练计划，或计划无法写入"""
+
+
+# 不包含嵌套表格的 tabular 环境
+_INNER_TABULAR = re.compile(r'\\begin\{tabular\}\{[^{}]*\}((?:(?!\\begin\{tabular\}).)*?)\\end\{tabular\}', re.S)
+_OUTER_TABULAR = re.compile(r'\\begin\{tabular\}\{[^{}]*\}(.*)\\end\{tabular\}', re.S)
+_MULTI_CELL = re.compile(r'\\multi(?:column|row)\{[^{}]*\}\{[^{}]*\}\{([^{}]*)\}')
+_MATH = re.compile(r'\\[()\[\]]|\$')
+_CJK = re.compile(r'[\u3000-\u9fff\uff00-\uffef]')
+
+
+# 去掉单元格中的 LaTeX 标记和多余空白
+def _clean_cell(text):
+    text = _MULTI_CELL.sub(r'\1', text.replace('\\hline', ''))
+    return ' '.join(_MATH.sub('', text).split())
+
+
+# 把单元格中换行显示的多行文字合并为一行：中文之间直接相连，其余以空格分隔
+def _join_lines(lines):
+    text = ''
+    for line in filter(None, (_clean_cell(line) for line in lines)):
+        if text and not (_CJK.match(text[-1]) and _CJK.match(line[0])):
+            text += ' '
+        text += line
+    return text
+
+
+# 解析 LaTeX 表格为行列表，嵌套的 tabular（单元格内换行）合并为单元格文字
+def parse_latex_table(text):
+    match = _OUTER_TABULAR.search(text)
+    if match is None:
+        return []
+
+    body = match.group(1)
+    while True:
+        body, count = _INNER_TABULAR.subn(
+            lambda m: _join_lines(m.group(1).replace('&', '，').split('\\\\')), body
+        )
+        if count == 0:
+            break
+
+    rows = []
+    for line in body.split('\\\\'):
+        cells = [_clean_cell(cell) for cell in line.split('&')]
+        if any(cells):
+            rows.append(cells)
+    return rows
+
+
+# 解析 Markdown 表格为行列表，忽略分隔行
+def parse_markdown_table(text):
+    rows = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line.startswith('|'):
+            continue
+        cells = [cell.strip() for cell in line.strip('|').split('|')]
+        if all(set(cell) <= set('-: ') for cell in cells):
+            continue
+        rows.append(cells)
+    return rows
+
+
+# 解析 OCR 输出或用户提交的表格文本
+def parse_table(text):
+    rows = parse_latex_table(text) if '\\begin{tabular}' in text else parse_markdown_table(text)
+    if len(rows) < 2:
+        raise PlanError("没有识别到表格")
+    return rows
+
+
+# 行列表整理为 Markdown 表格
+def to_markdown(rows):
+    width = max(len(row) for row in rows)
+    lines = [
+        '| ' + ' | '.join(row + [''] * (width - len(row))) + ' |'
+        for row in rows
+    ]
+    lines.insert(1, '| ' + ' | '.join(['---'] * width) + ' |')
+    return '\n'.join(lines)
+
+
+# 从模型输出中取出 JSON 对象：去掉思考过程和代码块标记
+def extract_json(text):
+    if '</think>' in text:
+        text = text.rsplit('</think>', 1)[1]
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise PlanError("模型输出中没有 JSON 对象")
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise PlanError(f"模型输出的 JSON 无效：{e}") from e
+
+
+# 整数字段校验，不接受布尔值
+def _integer(task, key, minimum):
+    value = task.get(key)
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise PlanError(f"{key}必须是不小于{minimum}的整数")
+    return value
+
+
+# 校验并规范化训练计划，返回任务列表
+def validate_plan(plan):
+    tasks = plan.get('tasks') if isinstance(plan, dict) else None
+    if not isinstance(tasks, list) or not tasks:
+        raise PlanError("训练计划中没有任务：tasks")
+
+    normalized = []
+    for index, task in enumerate(tasks, 1):
+        try:
+            if not isinstance(task, dict):
+                raise PlanError("任务必须是对象")
+            name = task.get('name')
+            if not isinstance(name, str) or not name.strip():
+                raise PlanError("name不能为空")
+            scheduled_time = normalize_time(task.get('scheduled_time'))
+            if scheduled_time is None:
+                raise PlanError("时间格式无效，请使用HH:MM:SS或HH:MM格式")
+            days = task.get('days')
+            if (not isinstance(days, list) or not days
+                    or not all(isinstance(d, int) and not isinstance(d, bool) and 0 <= d <= 6 for d in days)):
+                raise PlanError("星期几必须是0-6之间的整数")
+
+            item = {
+                "name": name.strip(),
+                "duration_sec": _integer(task, 'duration_sec', 1),
+                "rest_sec": _integer(task, 'rest_sec', 0),
+                "start_week": _integer(task, 'start_week', 1),
+                "end_week": _integer(task, 'end_week', 1),
+                "days": sorted(set(days)),
+                "scheduled_time": scheduled_time,
+                "sets": _integer(task, 'sets', 1),
+            }
+            if item['start_week'] > item['end_week']:
+                raise PlanError("开始周不能大于结束周")
+        except PlanError as e:
+            raise PlanError(f"第{index}项任务：{e}") from e
+        normalized.append(item)
+
+    return normalized
+
+
+# 在一个事务中按计划创建运动类型（按名称复用已有的）和训练任务（跳过已存在的相同任务），返回写入统计
+def insert_plan(conn, cycle_id, tasks):
+    cursor = conn.cursor()
+    database.begin_write(conn)
+    try:
+        cursor.execute('SELECT start_date, end_date FROM recovery_cycles WHERE id = ?', (cycle_id,))
+        cycle = cursor.fetchone()
+        if cycle is None:
+            raise PlanError("指定的康复周期不存在")
+
+        names = sorted({task['name'] for task in tasks})
+        placeholders = ', '.join('?' * len(names))
+        cursor.execute(
+            f'SELECT name, MIN(id) AS id FROM exercises WHERE name IN ({placeholders}) GROUP BY name', names
+        )
+        exercise_ids = {row['name']: row['id'] for row in cursor.fetchall()}
+
+        exercises = []
+        listed = set()
+        for task in tasks:
+            if task['name'] in listed:
+                continue
+            listed.add(task['name'])
+            created = task['name'] not in exercise_ids
+            if created:
+                cursor.execute(
+                    'INSERT INTO exercises (name, duration_sec, rest_sec, description) VALUES (?, ?, ?, ?)',
+                    (task['name'], task['duration_sec'], task['rest_sec'], '由医嘱表格导入')
+                )
+                exercise_ids[task['name']] = cursor.lastrowid
+            exercises.append({"id": exercise_ids[task['name']], "name": task['name'], "created": created})
+
+        # 已存在的相同任务（同周期、运动、日期和时间）不重复创建
+        cursor.execute(
+            'SELECT exercise_id, specific_date, scheduled_time FROM training_tasks WHERE cycle_id = ?',
+            (cycle_id,)
+        )
+        seen = {tuple(row) for row in cursor.fetchall()}
+
+        cycle_start = date.fromisoformat(cycle['start_date'])
+        cycle_end = date.fromisoformat(cycle['end_date'])
+        rows = []
+        skipped = 0
+        for task in tasks:
+            exercise_id = exercise_ids[task['name']]
+            for specific_date, day in week_dates(
+                    cycle_start, cycle_end, task['start_week'], task['end_week'], task['days']):
+                key = (exercise_id, specific_date, task['scheduled_time'])
+                if key in seen:
+                    skipped += 1
+                    continue
+                seen.add(key)
+                rows.append((cycle_id, exercise_id, task['scheduled_time'], task['sets'], day, specific_date))
+
+        cursor.executemany(
+            '''
+            INSERT INTO training_tasks
+            (cycle_id, exercise_id, scheduled_time, sets, day_of_week, specific_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            rows
+        )
+        sync_occurrences(cursor, cycle_ids=[cycle_id])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return {"cycle_id": cycle_id, "exercises": exercises, "created": len(rows), "skipped": skipped}
+
+
+# 识别上传的表格图片，每批完成后检查是否已取消
+def _stage_ocr(job, context):
+    service = current_app.extensions.get('salus_ocr')
+    if service is None:
+        raise PlanError("识别图片需要安装 Pillow、transformers 和 optimum-intel")
+    try:
+        results = service.recognize(job.inputs, 'latex', on_batch=lambda done, total: job.check_cancelled())
+    except ocr.InvalidImage as e:
+        raise PlanError(f"无法识别的图片：{job.input_names[e.index]}") from e
+    except ocr.ModelNotFound as e:
+        raise PlanError(f"OCR 模型不存在：{e}") from e
+    context['texts'] = [result['text'] for result in results]
+
+
+# 由 Qwen3 从 Markdown 表格中提取训练计划，返回 (任务列表, 生成统计)
+# structured 为 True 时按 PLAN_SCHEMA 约束输出；输出不是有效的训练计划时最多重新生成到 max_attempts 次，
+# 仍然无效时抛出 PlanError（最后一次的错误，generation 属性为生成统计）。生成统计为尝试次数、各次生成的 token 数之和（缓存命中的不计）和耗时
+def extract_plan(service, tables, structured=DEFAULT_STRUCTURED_OUTPUT, thinking=DEFAULT_THINKING,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, client='plan_import', should_stop=None):
+    system, prompt = PLAN_PROMPT.render(tables='\n\n'.join(tables))
+    generation = {
+        "structured": structured,
+        "thinking": thinking and not structured,
+        "attempts": 0,
+        "tokens": 0,
+        "cached": True,
+        "seconds": 0.0,
+        "errors": [],
+    }
+
+    attempt_prompt = prompt
+    while True:
+        output = service.generate(
+            attempt_prompt, client=client, should_stop=should_stop, system=system,
+            thinking=generation['thinking'], json_schema=PLAN_SCHEMA if structured else None,
+        )
+        generation['attempts'] += 1
+        generation['tokens'] += output['tokens'] or 0
+        generation['cached'] = generation['cached'] and output['cached']
+        generation['seconds'] = round(generation['seconds'] + output['seconds'], 3)
+        if output['stopped']:
+            return None, generation
+        try:
+            return validate_plan(extract_json(output['text'])), generation
+        except PlanError as e:
+            generation['errors'].append(str(e))
+            if generation['attempts'] >= max_attempts:
+                error = PlanError(f"{e}（共生成{generation['attempts']}次）")
+                error.generation = generation
+                raise error from e
+            attempt_prompt = RETRY_PROMPT.format(prompt=prompt, error=e)
+
+
+def _stage_parse(job, context):
+    context['tables'] = [to_markdown(parse_table(text)) for text in context['texts']]
+
+
+# 生成过程中任务被取消时停止生成；导入任务作为同一来源与在线请求轮流生成
+def _stage_extract(job, context):
+    config = current_app.config
+    try:
+        context['tasks'], context['generation'] = extract_plan(
+            current_app.extensions['salus_llm'], context['tables'],
+            structured=get_bool(config, 'PLAN_STRUCTURED_OUTPUT'), thinking=get_bool(config, 'PLAN_THINKING'),
+            max_attempts=int(config['PLAN_MAX_ATTEMPTS']), should_stop=lambda: job.cancelled,
+        )
+    except llm.QueueFull as e:
+        raise PlanError("排队的生成请求过多，请稍后重新导入") from e
+    except llm.ModelNotFound as e:
+        raise PlanError(str(e)) from e
+    job.check_cancelled()
+
+
+def _stage_insert(job, context):
+    context['inserted'] = insert_plan(get_db(), job.params['cycle_id'], context['tasks'])
+
+
+_STAGE_FUNCTIONS = {
+    'ocr': _stage_ocr,
+    'parse': _stage_parse,
+    'extract': _stage_extract,
+    'insert': _stage_insert,
+}
+
+
+# 导入任务的处理函数（后台任务类型 plan_import，见 jobs.py）
+# 参数为 cycle_id、table（提交表格文本时）和 dry_run，输入文件为上传的表格图片；
+# 各阶段的状态和耗时记录在任务的进度详情中。进程重启后任务从头执行，已完成的识别和生成直接命中结果缓存
+@jobs.handler('plan_import')
+def run_import(job):
+    params = job.params
+    stages = {
+        name: {
+            "status": "skipped" if (name == 'ocr' and not job.inputs) or (name == 'insert' and params.get('dry_run'))
+            else "pending",
+            "seconds": None,
+        }
+        for name in STAGES
+    }
+    active = [name for name in STAGES if stages[name]['status'] == 'pending']
+    context = {"texts": [params['table']] if params.get('table') else None}
+
+    for done, name in enumerate(active):
+        job.check_cancelled()
+        stages[name]['status'] = 'running'
+        job.update(stage=name, detail={"stages": stages})
+        started = time.perf_counter()
+        try:
+            _STAGE_FUNCTIONS[name](job, context)
+        except BaseException as e:
+            stages[name].update(
+                status='cancelled' if isinstance(e, jobs.JobCancelled) else 'failed',
+                seconds=round(time.perf_counter() - started, 3),
+            )
+            job.update(detail={"stages": stages})
+            raise
+        stages[name].update(status='done', seconds=round(time.perf_counter() - started, 3))
+        job.update(progress=(done + 1) / len(active), detail={"stages": stages})
+
+    return {
+        "tables": context['tables'],
+        "plan": {"tasks": context['tasks']},
+        "cached": context['generation']['cached'],
+        "generation": context['generation'],
+        "inserted": context.get('inserted'),
+    }
+
+
+# 注册计划导入的配置：是否按 PLAN_SCHEMA 约束输出、不约束输出时是否保留思考过程、最多生成几次
+def init_app(app):
+    app.config.setdefault('PLAN_STRUCTURED_OUTPUT', DEFAULT_STRUCTURED_OUTPUT)
+    app.config.setdefault('PLAN_THINKING', DEFAULT_THINKING)
+    app.config.setdefault('PLAN_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
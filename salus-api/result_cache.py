@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app, jsonify
+
+import database
+from config import get_bool
+
+# 模型结果缓存：OCR 识别和大模型生成的结果按 (输入内容的哈希, 模型, 输出格式和生成参数) 持久化到独立的 SQLite 文件，
+# 同一张图片或同一个提示词再次提交时直接返回，不再推理；总大小超过上限时淘汰最久未使用的结果。
+# 结果只取决于输入和参数（贪心解码），因此不需要失效，只需要淘汰
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_cache.db')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 与主数据库分开存放，命中时更新使用时间的写入不会占用主数据库的写锁
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS results (
+        key TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,       -- ocr / llm
+        size INTEGER NOT NULL,    -- value 的字节数
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        value TEXT NOT NULL       -- JSON，放在最后，读取其他列时不必经过大值的溢出页
+    );
+    -- 淘汰时按使用时间累计大小，覆盖索引不需要回表
+    CREATE INDEX IF NOT EXISTS idx_results_lru ON results (last_used, size, key);
+'''
+
+# 按使用时间从新到旧累计大小，超出上限的部分即为要淘汰的最久未使用的结果
+_EVICT = '''
+    DELETE FROM results WHERE key IN (
+        SELECT key FROM (
+            SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM results
+        )
+        WHERE total > ?
+    )
+'''
+
+# GenerationConfig 中影响生成结果的参数
+GENERATION_PARAMS = (
+    'max_new_tokens', 'max_length', 'min_new_tokens', 'ignore_eos', 'stop_strings', 'stop_token_ids',
+    'include_stop_str_in_output', 'apply_chat_template', 'do_sample', 'temperature', 'top_p', 'top_k', 'min_p',
+    'rng_seed', 'num_beams', 'num_beam_groups', 'diversity_penalty', 'length_penalty', 'no_repeat_ngram_size',
+    'num_return_sequences', 'repetition_penalty', 'presence_penalty', 'frequency_penalty',
+)
+
+
+# 输入内容（图片的原始字节或提示词）的 SHA-256
+def digest(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+# 缓存键：种类、输入哈希、模型和参数共同决定
+def make_key(kind, content_digest, model, params):
+    payload = json.dumps([kind, content_digest, model, params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# 提取 OpenVINO GenAI GenerationConfig 中影响输出的参数，用作缓存键的一部分
+def generation_params(config):
+    params = {}
+    for name in GENERATION_PARAMS:
+        value = getattr(config, name, None)
+        if isinstance(value, (set, frozenset)):
+            value = sorted(value)
+        params[name] = value
+    return params
+
+
+class ResultCache:
+    """持久化的模型结果缓存，总大小不超过 max_bytes，超出时按最久未使用淘汰"""
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # 连接在第一次使用时建立；gunicorn 预加载应用后 fork 出的 worker 各自重新连接
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = database.connect(self.path, pragmas=PRAGMAS)
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    # 返回缓存的结果，未命中时返回 None
+    def get(self, key):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            conn.execute('UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    # 保存结果并淘汰超出上限的部分；单个结果超过上限时不缓存
+    def put(self, key, kind, value):
+        text = json.dumps(value, ensure_ascii=False)
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO results (key, kind, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, kind, text, size, now, now)
+            )
+            self.evictions += conn.execute(_EVICT, (self.max_bytes,)).rowcount
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM results GROUP BY kind'
+            ).fetchall()
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+
+        return {
+            "path": self.path,
+            "entries": sum(row[1] for row in rows),
+            "bytes": sum(row[2] for row in rows),
+            "max_bytes": self.max_bytes,
+            "kinds": {row[0]: {"entries": row[1], "bytes": row[2]} for row in rows},
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 查看模型结果缓存的大小和命中统计
+def result_cache_stats():
+    return jsonify(current_app.extensions['salus_result_cache'].stats())
+
+
+# 在应用上注册模型结果缓存，RESULT_CACHE 为 False 时不缓存
+def init_app(app):
+    app.config.setdefault('RESULT_CACHE', True)
+    app.config.setdefault('RESULT_CACHE_PATH', DEFAULT_PATH)
+    app.config.setdefault('RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+    if get_bool(app.config, 'RESULT_CACHE'):
+        app.extensions['salus_result_cache'] = ResultCache(
+            app.config['RESULT_CACHE_PATH'], int(app.config['RESULT_CACHE_MAX_BYTES'])
+        )
+        app.add_url_rule('/cache/results/stats', 'result_cache_stats', result_cache_stats)
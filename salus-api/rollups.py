@@ -0,0 +1,137 @@
+import argparse
+import sys
+
+import database
+
+# 完成记录汇总表 completion_rollups 按 (周期, 运动, 日期) 汇总完成次数和组数，
+# 由 completions / training_tasks 上的触发器在同一事务内增量维护（见迁移 5）
+
+# 从完成记录全量计算汇总
+_AGGREGATE = '''
+    SELECT t.cycle_id, t.exercise_id, date(c.completed_at) as day,
+           COUNT(*) as completions, COALESCE(SUM(c.actual_sets), 0) as total_sets
+    FROM completions c
+    JOIN training_tasks t ON c.task_id = t.id
+    GROUP BY t.cycle_id, t.exercise_id, date(c.completed_at)
+'''
+
+_ROLLUP_COLUMNS = 'cycle_id, exercise_id, day, completions, total_sets'
+
+
+# 清空并从完成记录重新计算汇总表
+def rebuild_rollups(cursor):
+    cursor.execute('DELETE FROM completion_rollups')
+    cursor.execute(f'INSERT INTO completion_rollups ({_ROLLUP_COLUMNS}) {_AGGREGATE}')
+
+
+# 对比汇总表与完成记录，返回不一致的行 (来源, 行)
+def check_rollups(cursor):
+    cursor.execute(f'''
+        SELECT 'completions', * FROM ({_AGGREGATE} EXCEPT SELECT {_ROLLUP_COLUMNS} FROM completion_rollups)
+        UNION ALL
+        SELECT 'rollups', * FROM (SELECT {_ROLLUP_COLUMNS} FROM completion_rollups EXCEPT {_AGGREGATE})
+    ''')
+    return [(row[0], tuple(row[1:])) for row in cursor.fetchall()]
+
+
+# 构建统计查询，返回 (SQL, 参数)
+def stats_query(start_date=None, end_date=None, cycle_id=None):
+    params = []
+    where_clauses = []
+
+    if start_date:
+        where_clauses.append('r.day >= ?')
+        params.append(start_date)
+
+    if end_date:
+        where_clauses.append('r.day <= ?')
+        params.append(end_date)
+
+    if cycle_id is not None:
+        where_clauses.append('r.cycle_id = ?')
+        params.append(cycle_id)
+
+    where_clause = ' WHERE ' + ' AND '.join(where_clauses) if where_clauses else ''
+
+    return f'''
+        SELECT r.day, e.name, SUM(r.completions) as count, SUM(r.total_sets) as total_sets
+        FROM completion_rollups r
+        JOIN exercises e ON r.exercise_id = e.id
+        {where_clause}
+        GROUP BY r.day, e.name
+    ''', params
+
+
+# 把按 (日期, 运动) 分组的统计行汇总为接口返回的结构
+def summarize_stats(rows):
+    exercises = {}
+    dates = {}
+    total_completions = 0
+    total_sets = 0
+
+    for row in rows:
+        total_completions += row['count']
+        total_sets += row['total_sets']
+
+        stat = exercises.setdefault(row['name'], {"name": row['name'], "count": 0, "total_sets": 0})
+        stat['count'] += row['count']
+        stat['total_sets'] += row['total_sets']
+
+        dates[row['day']] = dates.get(row['day'], 0) + row['count']
+
+    return {
+        "total_completions": total_completions,
+        "total_sets": total_sets,
+        "exercise_stats": sorted(exercises.values(), key=lambda s: s['count'], reverse=True),
+        "date_stats": [{"date": day, "count": count} for day, count in sorted(dates.items())]
+    }
+
+
+# 按筛选条件从汇总表计算统计数据，只执行一次查询
+def query_stats(cursor, start_date=None, end_date=None, cycle_id=None):
+    cursor.execute(*stats_query(start_date, end_date, cycle_id))
+    return summarize_stats(cursor.fetchall())
+
+
+# 注册汇总表维护命令
+def init_app(app):
+    @app.cli.command('rebuild-rollups')
+    def rebuild_command():
+        """重新计算完成记录汇总表"""
+        sys.exit(main(['--db', app.config['DATABASE'], '--rebuild']))
+
+    @app.cli.command('check-rollups')
+    def check_command():
+        """检查完成记录汇总表是否一致"""
+        sys.exit(main(['--db', app.config['DATABASE']]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Salus 完成记录汇总表维护工具')
+    parser.add_argument('--db', type=str, default=database.DEFAULT_DB_PATH, help='数据库文件路径')
+    parser.add_argument('--rebuild', action='store_true', help='检查前先全量重建汇总表')
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.db)
+    try:
+        cursor = conn.cursor()
+
+        if args.rebuild:
+            rebuild_rollups(cursor)
+            conn.commit()
+            print('汇总表已重建')
+
+        mismatches = check_rollups(cursor)
+        for source, row in mismatches:
+            print(f'不一致（仅存在于 {source}）: {row}')
+        if mismatches:
+            return 1
+        print('汇总表与完成记录一致')
+    finally:
+        conn.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+from flask import Blueprint, request, jsonify, current_app
+from database import get_db
+from cache import cached
+from routes.completions import stats_filters
+import analytics
+
+analytics_bp = Blueprint('analytics', __name__)
+
+# 获取长周期的康复分析：每日完成情况及滚动平均、每周完成率（已完成实例/计划实例）、每周各运动组数、连续完成天数
+# 支持 cycle_id、start_date、end_date 筛选，window 为滚动平均的天数（默认7）
+# 日期范围最多 MAX_DAYS 天，超过时返回 400；未指定日期时取数据覆盖的日期，最多 MAX_DAYS 天
+@analytics_bp.route('/analytics', methods=['GET'])
+@cached('completion_rollups', 'task_occurrences', 'exercises')
+def get_analytics():
+    store = current_app.extensions.get('salus_analytics')
+    if store is None:
+        return jsonify({"error": "数据分析需要安装 numpy"}), 501
+    
+    filters, error = stats_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    if filters['start_date'] and filters['end_date']:
+        span = analytics.to_days(filters['end_date']) - analytics.to_days(filters['start_date']) + 1
+        if span > analytics.MAX_DAYS:
+            return jsonify({"error": f"日期范围不能超过{analytics.MAX_DAYS}天"}), 400
+    
+    window = request.args.get('window', analytics.DEFAULT_WINDOW)
+    try:
+        window = int(window)
+        if not (1 <= window <= analytics.MAX_WINDOW):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": f"window必须是1-{analytics.MAX_WINDOW}之间的整数"}), 400
+    
+    conn = get_db()
+    rollups, occurrences = store.refresh(conn)
+    
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, name FROM exercises')
+    exercises = {row['id']: row['name'] for row in cursor.fetchall()}
+    
+    return jsonify(analytics.compute(rollups, occurrences, exercises, window=window, **filters))
+
+# 查看列式数据缓存的状态：行数、已处理到的变更序号、全量和增量加载次数
+@analytics_bp.route('/analytics/stats', methods=['GET'])
+def get_analytics_stats():
+    store = current_app.extensions.get('salus_analytics')
+    if store is None:
+        return jsonify({"error": "数据分析需要安装 numpy"}), 501
+    
+    return jsonify(store.stats())
\ No newline at end of file
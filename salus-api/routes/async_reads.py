@@ -0,0 +1,154 @@
+from quart import Blueprint, Response, current_app, request, jsonify, make_response
+from functools import wraps
+from aio_database import fetchall, fetchone
+from cache import CachedRequest, parse_versions, versions_query
+from rollups import stats_query, summarize_stats
+from routes.cycles import CYCLE_TASKS_SQL
+from routes.tasks import TASK_COMPLETIONS_SQL, TASK_DETAIL_SQL, build_tasks_query, tasks_page
+from routes.completions import (
+    COMPLETION_DETAIL_SQL, EXPORT_BATCH_SIZE, EXPORT_MIMETYPES, ExportEncoder,
+    build_completions_query, build_export_query, completions_page, stats_filters,
+)
+
+# 异步部署（asgi.py）下的读接口，URL、参数和响应与 routes/ 下对应的同步接口一致，
+# 查询构建和结果整理复用同步接口的函数，只有数据库访问改为 await
+async_reads_bp = Blueprint('async_reads', __name__)
+
+# 与 cache.cached 相同的响应缓存，读取版本号和执行视图时不阻塞事件循环
+def cached(*tables):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            store = current_app.extensions.get('salus_cache')
+            if store is None:
+                return await view(*args, **kwargs)
+    
+            versions = parse_versions(await fetchall(versions_query(tables), tables))
+            cached_request = CachedRequest(store, request, *versions)
+            response = cached_request.cached_response(current_app.response_class)
+            if response is None:
+                response = await make_response(await view(*args, **kwargs))
+                response = cached_request.save(current_app.response_class, response, await response.get_data())
+            return response
+    
+        return wrapper
+    return decorator
+
+# 获取所有运动类型
+@async_reads_bp.route('/exercises', methods=['GET'])
+@cached('exercises')
+async def get_exercises():
+    return jsonify(await fetchall('SELECT * FROM exercises ORDER BY name'))
+
+# 获取单个运动类型
+@async_reads_bp.route('/exercises/<int:id>', methods=['GET'])
+@cached('exercises')
+async def get_exercise(id):
+    exercise = await fetchone('SELECT * FROM exercises WHERE id = ?', (id,))
+    
+    if exercise is None:
+        return jsonify({"error": "运动类型不存在"}), 404
+    
+    return jsonify(exercise)
+
+# 获取所有康复周期
+@async_reads_bp.route('/cycles', methods=['GET'])
+@cached('recovery_cycles')
+async def get_cycles():
+    return jsonify(await fetchall('SELECT * FROM recovery_cycles ORDER BY start_date DESC'))
+
+# 获取单个康复周期
+@async_reads_bp.route('/cycles/<int:id>', methods=['GET'])
+@cached('recovery_cycles', 'training_tasks', 'exercises')
+async def get_cycle(id):
+    cycle = await fetchone('SELECT * FROM recovery_cycles WHERE id = ?', (id,))
+    
+    if cycle is None:
+        return jsonify({"error": "康复周期不存在"}), 404
+    
+    cycle['tasks'] = await fetchall(CYCLE_TASKS_SQL, (id,))
+    
+    return jsonify(cycle)
+
+# 获取所有训练任务
+@async_reads_bp.route('/tasks', methods=['GET'])
+@cached('training_tasks', 'task_occurrences', 'exercises')
+async def get_tasks():
+    query, params, limit, error = build_tasks_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    return jsonify(tasks_page(await fetchall(query, params), limit))
+
+# 获取单个训练任务
+@async_reads_bp.route('/tasks/<int:id>', methods=['GET'])
+async def get_task(id):
+    task = await fetchone(TASK_DETAIL_SQL, (id,))
+    
+    if task is None:
+        return jsonify({"error": "训练任务不存在"}), 404
+    
+    task['completions'] = await fetchall(TASK_COMPLETIONS_SQL, (id,))
+    
+    return jsonify(task)
+
+# 获取所有完成记录
+@async_reads_bp.route('/completions', methods=['GET'])
+async def get_completions():
+    query, params, limit, error = build_completions_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    return jsonify(completions_page(await fetchall(query, params), limit))
+
+# 流式导出完成记录
+@async_reads_bp.route('/completions/export', methods=['GET'])
+async def export_completions():
+    query, params, error = build_export_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    export_format = request.args.get('format', 'ndjson')
+    pool = current_app.extensions['salus_aio_db']
+    
+    # 响应体在请求处理结束后才开始发送，因此单独占用一个连接直到导出完成
+    async def generate():
+        conn = await pool.acquire()
+        try:
+            async with conn.execute(query, params) as cursor:
+                encoder = ExportEncoder(export_format, [column[0] for column in cursor.description])
+                yield encoder.start()
+                while True:
+                    batch = await cursor.fetchmany(EXPORT_BATCH_SIZE)
+                    if not batch:
+                        break
+                    yield encoder.encode(batch)
+                yield encoder.end()
+        finally:
+            await pool.release(conn)
+    
+    return Response(
+        generate(),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename=completions.{export_format}'}
+    )
+
+# 获取单个完成记录
+@async_reads_bp.route('/completions/<int:id>', methods=['GET'])
+async def get_completion(id):
+    completion = await fetchone(COMPLETION_DETAIL_SQL, (id,))
+    
+    if completion is None:
+        return jsonify({"error": "完成记录不存在"}), 404
+    
+    return jsonify(completion)
+
+# 获取统计数据（由完成记录汇总表计算）
+@async_reads_bp.route('/completions/stats', methods=['GET'])
+@cached('completion_rollups', 'exercises')
+async def get_completion_stats():
+    filters, error = stats_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    return jsonify(summarize_stats(await fetchall(*stats_query(**filters))))
\ No newline at end of file
@@ -1,27 +1,41 @@
-from flask import Blueprint, request, jsonify
-import sqlite3
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from database import get_db
+from cache import cached
+from occurrences import attach_completion
+from rollups import query_stats
+from pagination import parse_fields, parse_limit, split_page
+from bulk import BulkItemError, existing_ids, item_id, parse_int, referenced_values, run_bulk, target_ids
 from datetime import datetime
+import csv
+import io
+import json
 
 completions_bp = Blueprint('completions', __name__)
 
-# 获取所有完成记录
-@completions_bp.route('/completions', methods=['GET'])
-def get_completions():
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # 支持按日期范围筛选
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    task_id = request.args.get('task_id')
-    
-    query = '''
-        SELECT c.*, t.scheduled_time, e.name as exercise_name
-        FROM completions c
-        JOIN training_tasks t ON c.task_id = t.id
-        JOIN exercises e ON t.exercise_id = e.id
-    '''
+# 导出格式对应的响应类型
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
+
+# GET /completions 可选字段及其SQL表达式
+COMPLETION_COLUMNS = {
+    'id': 'c.id',
+    'task_id': 'c.task_id',
+    'occurrence_id': 'c.occurrence_id',
+    'completed_at': 'c.completed_at',
+    'actual_sets': 'c.actual_sets',
+    'notes': 'c.notes',
+    'scheduled_time': 't.scheduled_time',
+    'exercise_name': 'e.name',
+}
+
+# 解析完成记录的筛选参数（日期范围、任务），返回 (筛选条件, 参数, 错误信息)
+def completion_filters(args):
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    task_id = args.get('task_id')
     
     params = []
     where_clauses = []
@@ -32,8 +46,7 @@ def get_completions():
             where_clauses.append('date(c.completed_at) >= ?')
             params.append(start_date)
         except ValueError:
-            conn.close()
-            return jsonify({"error": "开始日期格式无效，请使用YYYY-MM-DD格式"}), 400
+            return None, None, "开始日期格式无效，请使用YYYY-MM-DD格式"
     
     if end_date:
         try:
@@ -41,51 +54,213 @@ def get_completions():
             where_clauses.append('date(c.completed_at) <= ?')
             params.append(end_date)
         except ValueError:
-            conn.close()
-            return jsonify({"error": "结束日期格式无效，请使用YYYY-MM-DD格式"}), 400
+            return None, None, "结束日期格式无效，请使用YYYY-MM-DD格式"
     
     if task_id:
         try:
-            task = int(task_id)
             where_clauses.append('c.task_id = ?')
-            params.append(task)
+            params.append(int(task_id))
         except ValueError:
-            conn.close()
-            return jsonify({"error": "任务ID必须是整数"}), 400
+            return None, None, "任务ID必须是整数"
+    
+    return where_clauses, params, None
+
+# 根据查询参数构建 GET /completions 的查询，返回 (SQL, 参数, 分页条数, 错误信息)
+def build_completions_query(args):
+    after_completed_at = args.get('after_completed_at')
+    after_id = args.get('after_id')
+    
+    limit, error = parse_limit(args.get('limit'))
+    if error:
+        return None, None, None, error
+    
+    select, error = parse_fields(
+        args.get('fields'), COMPLETION_COLUMNS,
+        required=('id', 'completed_at') if limit else ()
+    )
+    if error:
+        return None, None, None, error
+    
+    query = f'''
+        SELECT {select}
+        FROM completions c
+        JOIN training_tasks t ON c.task_id = t.id
+        JOIN exercises e ON t.exercise_id = e.id
+    '''
+    
+    where_clauses, params, error = completion_filters(args)
+    if error:
+        return None, None, None, error
+    
+    # 游标：上一页最后一条的完成时间和ID
+    if after_completed_at:
+        if after_id:
+            try:
+                where_clauses.append('(c.completed_at, c.id) < (?, ?)')
+                params.extend([after_completed_at, int(after_id)])
+            except ValueError:
+                return None, None, None, "after_id必须是整数"
+        else:
+            where_clauses.append('c.completed_at < ?')
+            params.append(after_completed_at)
     
     if where_clauses:
         query += ' WHERE ' + ' AND '.join(where_clauses)
     
-    query += ' ORDER BY c.completed_at DESC'
+    query += ' ORDER BY c.completed_at DESC, c.id DESC'
+    
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit + 1)
     
+    return query, params, limit, None
+
+# 不分页时直接返回列表，否则返回一页数据和下一页游标
+def completions_page(completions, limit):
+    if limit is None:
+        return completions
+    
+    completions, has_more = split_page(completions, limit)
+    next_cursor = None
+    if has_more:
+        last = completions[-1]
+        next_cursor = {"after_completed_at": last['completed_at'], "after_id": last['id']}
+    
+    return {"items": completions, "next_cursor": next_cursor}
+
+# 获取所有完成记录
+# 提供 limit 时按 (completed_at, id) 倒序分页，
+# 返回 {"items": [...], "next_cursor": {"after_completed_at": ..., "after_id": ...}}
+@completions_bp.route('/completions', methods=['GET'])
+def get_completions():
+    query, params, limit, error = build_completions_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    cursor = get_db().cursor()
     cursor.execute(query, params)
     completions = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
-    return jsonify(completions)
+    return jsonify(completions_page(completions, limit))
+
+# 导出时每次从游标读取的行数
+EXPORT_BATCH_SIZE = 500
+
+# 根据查询参数构建导出查询，返回 (SQL, 参数, 错误信息)
+def build_export_query(args):
+    if args.get('format', 'ndjson') not in EXPORT_MIMETYPES:
+        return None, None, f"导出格式必须是：{', '.join(EXPORT_MIMETYPES)}"
+    
+    select, error = parse_fields(args.get('fields'), COMPLETION_COLUMNS)
+    if error:
+        return None, None, error
+    
+    where_clauses, params, error = completion_filters(args)
+    if error:
+        return None, None, error
+    
+    query = f'''
+        SELECT {select}
+        FROM completions c
+        JOIN training_tasks t ON c.task_id = t.id
+        JOIN exercises e ON t.exercise_id = e.id
+    '''
+    
+    if where_clauses:
+        query += ' WHERE ' + ' AND '.join(where_clauses)
+    
+    query += ' ORDER BY c.completed_at DESC, c.id DESC'
+    
+    return query, params, None
+
+class ExportEncoder:
+    """把分批读取的完成记录编码为导出格式的文本片段"""
+    
+    def __init__(self, export_format, columns):
+        self.export_format = export_format
+        self.columns = columns
+        self._separator = ''
+    
+    # 文件开头
+    def start(self):
+        if self.export_format == 'json':
+            return '['
+        if self.export_format == 'csv':
+            buffer = io.StringIO()
+            # BOM 便于 Excel 正确识别中文
+            buffer.write('\ufeff')
+            csv.writer(buffer).writerow(self.columns)
+            return buffer.getvalue()
+        return ''
+    
+    # 一批数据行
+    def encode(self, batch):
+        if self.export_format == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            return buffer.getvalue()
+        
+        lines = []
+        for row in batch:
+            line = json.dumps(dict(zip(self.columns, row)), ensure_ascii=False)
+            if self.export_format == 'json':
+                lines.append(self._separator + line)
+                self._separator = ','
+            else:
+                lines.append(line + '\n')
+        return ''.join(lines)
+    
+    # 文件结尾
+    def end(self):
+        return ']' if self.export_format == 'json' else ''
+
+# 流式导出完成记录，支持 ndjson（默认）、json、csv 格式，筛选参数与 GET /completions 相同
+@completions_bp.route('/completions/export', methods=['GET'])
+def export_completions():
+    query, params, error = build_export_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    export_format = request.args.get('format', 'ndjson')
+    cursor = get_db().cursor()
+    cursor.execute(query, params)
+    encoder = ExportEncoder(export_format, [column[0] for column in cursor.description])
+    
+    # 分批读取并逐批输出，内存占用与导出总量无关
+    def generate():
+        yield encoder.start()
+        for batch in iter(lambda: cursor.fetchmany(EXPORT_BATCH_SIZE), []):
+            yield encoder.encode(batch)
+        yield encoder.end()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename=completions.{export_format}'}
+    )
+
+# 单个完成记录（含任务时间和运动名称）
+COMPLETION_DETAIL_SQL = '''
+    SELECT c.*, t.scheduled_time, e.name as exercise_name
+    FROM completions c
+    JOIN training_tasks t ON c.task_id = t.id
+    JOIN exercises e ON t.exercise_id = e.id
+    WHERE c.id = ?
+'''
 
 # 获取单个完成记录
 @completions_bp.route('/completions/<int:id>', methods=['GET'])
 def get_completion(id):
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT c.*, t.scheduled_time, e.name as exercise_name
-        FROM completions c
-        JOIN training_tasks t ON c.task_id = t.id
-        JOIN exercises e ON t.exercise_id = e.id
-        WHERE c.id = ?
-    ''', (id,))
+    cursor.execute(COMPLETION_DETAIL_SQL, (id,))
     
     completion = cursor.fetchone()
     
     if completion is None:
-        conn.close()
         return jsonify({"error": "完成记录不存在"}), 404
     
-    conn.close()
     return jsonify(dict(completion))
 
 # 创建完成记录
@@ -105,33 +280,35 @@ def create_completion():
     actual_sets = data.get('actual_sets')
     notes = data.get('notes', '')
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 验证任务是否存在
     cursor.execute('SELECT id FROM training_tasks WHERE id = ?', (task_id,))
     if not cursor.fetchone():
-        conn.close()
         return jsonify({"error": "任务不存在"}), 404
     
-    # 插入完成记录
+    # 可指定完成的任务实例，默认关联到完成当天的实例
+    occurrence_id = data.get('occurrence_id')
+    if occurrence_id is not None:
+        cursor.execute(
+            'SELECT id FROM task_occurrences WHERE id = ? AND task_id = ?',
+            (occurrence_id, task_id)
+        )
+        if not cursor.fetchone():
+            return jsonify({"error": "任务实例不存在"}), 404
+    
+    # 插入完成记录（任务和实例的完成状态由触发器更新）
     cursor.execute('''
         INSERT INTO completions (task_id, completed_at, actual_sets, notes)
         VALUES (?, datetime('now', 'localtime'), ?, ?)
     ''', (task_id, actual_sets, notes))
-    
-    # 更新任务状态为已完成
-    cursor.execute('''
-        UPDATE training_tasks
-        SET is_completed = 1
-        WHERE id = ?
-    ''', (task_id,))
-    
     completion_id = cursor.lastrowid
+    attach_completion(cursor, completion_id, occurrence_id)
+    
     conn.commit()
     
     # 获取新创建的记录
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     cursor.execute('''
         SELECT c.*, t.scheduled_time, e.name as exercise_name
@@ -143,7 +320,6 @@ def create_completion():
     
     new_completion = dict(cursor.fetchone())
     
-    conn.close()
     return jsonify(new_completion), 201
 
 # 更新完成记录
@@ -157,13 +333,12 @@ def update_completion(id):
     actual_sets = data.get('actual_sets')
     notes = data.get('notes')
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 验证记录是否存在
     cursor.execute('SELECT id FROM completions WHERE id = ?', (id,))
     if not cursor.fetchone():
-        conn.close()
         return jsonify({"error": "完成记录不存在"}), 404
     
     # 构建更新查询
@@ -179,7 +354,6 @@ def update_completion(id):
         params.append(notes)
     
     if not update_fields:
-        conn.close()
         return jsonify({"error": "没有提供要更新的字段"}), 400
     
     query = f'''
@@ -193,7 +367,6 @@ def update_completion(id):
     conn.commit()
     
     # 获取更新后的记录
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     cursor.execute('''
         SELECT c.*, t.scheduled_time, e.name as exercise_name
@@ -205,138 +378,116 @@ def update_completion(id):
     
     updated_completion = dict(cursor.fetchone())
     
-    conn.close()
     return jsonify(updated_completion)
 
 # 删除完成记录
 @completions_bp.route('/completions/<int:id>', methods=['DELETE'])
 def delete_completion(id):
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # 验证记录是否存在
-    cursor.execute('SELECT task_id FROM completions WHERE id = ?', (id,))
-    result = cursor.fetchone()
-    
-    if not result:
-        conn.close()
-        return jsonify({"error": "完成记录不存在"}), 404
-    
-    task_id = result[0]
-    
-    # 删除记录
+    # 删除记录；没有其他完成记录的实例和任务由触发器恢复为未完成
     cursor.execute('DELETE FROM completions WHERE id = ?', (id,))
-    
-    # 更新任务状态为未完成（如果没有其他完成记录）
-    cursor.execute('SELECT COUNT(*) FROM completions WHERE task_id = ?', (task_id,))
-    count = cursor.fetchone()[0]
-    
-    if count == 0:
-        cursor.execute('''
-            UPDATE training_tasks
-            SET is_completed = 0
-            WHERE id = ?
-        ''', (task_id,))
+    if cursor.rowcount == 0:
+        return jsonify({"error": "完成记录不存在"}), 404
     
     conn.commit()
-    conn.close()
     
     return jsonify({"message": "完成记录已删除", "id": id})
 
-# 获取统计数据
-@completions_bp.route('/completions/stats', methods=['GET'])
-def get_completion_stats():
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # 支持按日期范围筛选
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    cycle_id = request.args.get('cycle_id')
-    
-    params = []
-    where_clauses = []
+# 解析统计接口的筛选参数，返回 (query_stats 的参数, 错误信息)
+def stats_filters(args):
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    cycle_id = args.get('cycle_id')
     
     if start_date:
         try:
             datetime.strptime(start_date, '%Y-%m-%d')
-            where_clauses.append('date(c.completed_at) >= ?')
-            params.append(start_date)
         except ValueError:
-            conn.close()
-            return jsonify({"error": "开始日期格式无效，请使用YYYY-MM-DD格式"}), 400
+            return None, "开始日期格式无效，请使用YYYY-MM-DD格式"
     
     if end_date:
         try:
             datetime.strptime(end_date, '%Y-%m-%d')
-            where_clauses.append('date(c.completed_at) <= ?')
-            params.append(end_date)
         except ValueError:
-            conn.close()
-            return jsonify({"error": "结束日期格式无效，请使用YYYY-MM-DD格式"}), 400
+            return None, "结束日期格式无效，请使用YYYY-MM-DD格式"
     
+    cycle = None
     if cycle_id:
         try:
             cycle = int(cycle_id)
-            where_clauses.append('t.cycle_id = ?')
-            params.append(cycle)
         except ValueError:
-            conn.close()
-            return jsonify({"error": "周期ID必须是整数"}), 400
+            return None, "周期ID必须是整数"
     
-    where_clause = ' WHERE ' + ' AND '.join(where_clauses) if where_clauses else ''
-    
-    # 获取总完成任务数
-    query = f'''
-        SELECT COUNT(*) as total_completions
-        FROM completions c
-        JOIN training_tasks t ON c.task_id = t.id
-        {where_clause}
-    '''
-    cursor.execute(query, params)
-    total_completions = cursor.fetchone()['total_completions']
+    return {"start_date": start_date, "end_date": end_date, "cycle_id": cycle}, None
+
+# 获取统计数据（由完成记录汇总表计算）
+@completions_bp.route('/completions/stats', methods=['GET'])
+@cached('completion_rollups', 'exercises')
+def get_completion_stats():
+    filters, error = stats_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
     
-    # 获取总组数
-    query = f'''
-        SELECT SUM(c.actual_sets) as total_sets
-        FROM completions c
-        JOIN training_tasks t ON c.task_id = t.id
-        {where_clause}
-    '''
-    cursor.execute(query, params)
-    total_sets = cursor.fetchone()['total_sets'] or 0
+    stats = query_stats(get_db().cursor(), **filters)
     
-    # 按运动类型统计
-    query = f'''
-        SELECT e.name, COUNT(*) as count, SUM(c.actual_sets) as total_sets
-        FROM completions c
-        JOIN training_tasks t ON c.task_id = t.id
-        JOIN exercises e ON t.exercise_id = e.id
-        {where_clause}
-        GROUP BY e.name
-        ORDER BY count DESC
-    '''
-    cursor.execute(query, params)
-    exercise_stats = [dict(row) for row in cursor.fetchall()]
+    return jsonify(stats)
+
+# 批量创建、更新、删除完成记录（如离线设备同步）
+@completions_bp.route('/completions/bulk', methods=['POST'])
+def bulk_completions():
+    data = request.get_json()
     
-    # 按日期统计
-    query = f'''
-        SELECT date(c.completed_at) as date, COUNT(*) as count
-        FROM completions c
-        JOIN training_tasks t ON c.task_id = t.id
-        {where_clause}
-        GROUP BY date(c.completed_at)
-        ORDER BY date
-    '''
-    cursor.execute(query, params)
-    date_stats = [dict(row) for row in cursor.fetchall()]
+    if not isinstance(data, dict):
+        return jsonify({"error": "无效的请求数据"}), 400
     
-    conn.close()
+    conn = get_db()
+    cursor = conn.cursor()
     
-    return jsonify({
-        "total_completions": total_completions,
-        "total_sets": total_sets,
-        "exercise_stats": exercise_stats,
-        "date_stats": date_stats
-    })
\ No newline at end of file
+    task_ids = existing_ids(cursor, 'training_tasks', referenced_values(data, 'task_id'))
+    completion_ids = existing_ids(cursor, 'completions', target_ids(data))
+    
+    def create(cursor, item):
+        if 'task_id' not in item:
+            raise BulkItemError("缺少必填字段: task_id")
+        task_id = parse_int(item['task_id'])
+        if task_id not in task_ids:
+            raise BulkItemError("任务不存在")
+        
+        # 离线记录可携带完成时间，否则使用当前时间
+        completed_at = item.get('completed_at')
+        if completed_at:
+            try:
+                datetime.strptime(completed_at, '%Y-%m-%d %H:%M:%S')
+            except (TypeError, ValueError):
+                raise BulkItemError("完成时间格式无效，请使用YYYY-MM-DD HH:MM:SS格式")
+        
+        cursor.execute('''
+            INSERT INTO completions (task_id, completed_at, actual_sets, notes)
+            VALUES (?, COALESCE(?, datetime('now', 'localtime')), ?, ?)
+        ''', (task_id, completed_at, item.get('actual_sets'), item.get('notes', '')))
+        completion_id = cursor.lastrowid
+        attach_completion(cursor, completion_id)
+        return {"id": completion_id}
+    
+    def update(cursor, item):
+        id = item_id(item)
+        if id not in completion_ids:
+            raise BulkItemError("完成记录不存在")
+        fields = {k: item[k] for k in ('actual_sets', 'notes') if item.get(k) is not None}
+        if not fields:
+            raise BulkItemError("没有提供要更新的字段")
+        columns = ', '.join(f'{key} = ?' for key in fields)
+        cursor.execute(f'UPDATE completions SET {columns} WHERE id = ?', (*fields.values(), id))
+        return {"id": id}
+    
+    def delete(cursor, item):
+        id = item_id(item)
+        if id not in completion_ids:
+            raise BulkItemError("完成记录不存在")
+        cursor.execute('DELETE FROM completions WHERE id = ?', (id,))
+        completion_ids.discard(id)
+        return {"id": id}
+    
+    return run_bulk(conn, data, create=create, update=update, delete=delete)
@@ -1,51 +1,53 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
+from database import get_db
+from cache import cached
+from occurrences import sync_occurrences
 from datetime import datetime
 
 cycles_bp = Blueprint('cycles', __name__)
 
 # 获取所有康复周期
 @cycles_bp.route('/cycles', methods=['GET'])
+@cached('recovery_cycles')
 def get_cycles():
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM recovery_cycles ORDER BY start_date DESC')
     cycles = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
     return jsonify(cycles)
 
+# 周期下的所有训练任务
+CYCLE_TASKS_SQL = '''
+    SELECT t.*, e.name as exercise_name 
+    FROM training_tasks t
+    JOIN exercises e ON t.exercise_id = e.id
+    WHERE t.cycle_id = ?
+    ORDER BY t.day_of_week, t.scheduled_time
+'''
+
 # 获取单个康复周期
 @cycles_bp.route('/cycles/<int:id>', methods=['GET'])
+@cached('recovery_cycles', 'training_tasks', 'exercises')
 def get_cycle(id):
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM recovery_cycles WHERE id = ?', (id,))
     cycle = cursor.fetchone()
     
     if cycle is None:
-        conn.close()
         return jsonify({"error": "康复周期不存在"}), 404
     
     # 获取该周期的所有训练任务
-    cursor.execute('''
-        SELECT t.*, e.name as exercise_name 
-        FROM training_tasks t
-        JOIN exercises e ON t.exercise_id = e.id
-        WHERE t.cycle_id = ?
-        ORDER BY t.day_of_week, t.scheduled_time
-    ''', (id,))
+    cursor.execute(CYCLE_TASKS_SQL, (id,))
     
     tasks = [dict(row) for row in cursor.fetchall()]
     
     result = dict(cycle)
     result['tasks'] = tasks
     
-    conn.close()
     return jsonify(result)
 
 # 创建新的康复周期
@@ -56,7 +58,7 @@ def create_cycle():
     if not data or not all(k in data for k in ('name', 'start_date', 'end_date')):
         return jsonify({"error": "请提供必要的字段：name, start_date, end_date"}), 400
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     try:
@@ -65,7 +67,6 @@ def create_cycle():
         end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
         
         if start_date > end_date:
-            conn.close()
             return jsonify({"error": "开始日期不能晚于结束日期"}), 400
         
         cursor.execute(
@@ -75,12 +76,10 @@ def create_cycle():
         
         conn.commit()
         new_id = cursor.lastrowid
-        conn.close()
         
         return jsonify({"id": new_id, "message": "康复周期创建成功"}), 201
     
     except ValueError:
-        conn.close()
         return jsonify({"error": "日期格式无效，请使用YYYY-MM-DD格式"}), 400
 
 # 更新康复周期
@@ -91,13 +90,12 @@ def update_cycle(id):
     if not data:
         return jsonify({"error": "请提供更新数据"}), 400
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 检查康复周期是否存在
     cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (id,))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "康复周期不存在"}), 404
     
     # 构建更新语句
@@ -114,7 +112,6 @@ def update_cycle(id):
             fields.append('start_date = ?')
             values.append(data['start_date'])
         except ValueError:
-            conn.close()
             return jsonify({"error": "开始日期格式无效，请使用YYYY-MM-DD格式"}), 400
     
     if 'end_date' in data:
@@ -123,7 +120,6 @@ def update_cycle(id):
             fields.append('end_date = ?')
             values.append(data['end_date'])
         except ValueError:
-            conn.close()
             return jsonify({"error": "结束日期格式无效，请使用YYYY-MM-DD格式"}), 400
     
     if 'notes' in data:
@@ -131,7 +127,6 @@ def update_cycle(id):
         values.append(data['notes'])
     
     if not fields:
-        conn.close()
         return jsonify({"error": "没有提供有效的更新字段"}), 400
     
     values.append(id)
@@ -141,32 +136,25 @@ def update_cycle(id):
         tuple(values)
     )
     
+    # 周期日期变化时重新展开任务实例
+    if 'start_date' in data or 'end_date' in data:
+        sync_occurrences(cursor, cycle_ids=[id])
+    
     conn.commit()
-    conn.close()
     
     return jsonify({"message": "康复周期更新成功"})
 
 # 删除康复周期
 @cycles_bp.route('/cycles/<int:id>', methods=['DELETE'])
 def delete_cycle(id):
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # 检查康复周期是否存在
-    cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (id,))
-    if cursor.fetchone() is None:
-        conn.close()
-        return jsonify({"error": "康复周期不存在"}), 404
-    
-    # 检查是否有训练任务引用了该康复周期
-    cursor.execute('SELECT id FROM training_tasks WHERE cycle_id = ?', (id,))
-    if cursor.fetchone() is not None:
-        # 删除关联的训练任务
-        cursor.execute('DELETE FROM training_tasks WHERE cycle_id = ?', (id,))
-    
+    # 训练任务、任务实例及其完成记录由外键级联删除（见迁移 11）
     cursor.execute('DELETE FROM recovery_cycles WHERE id = ?', (id,))
+    if cursor.rowcount == 0:
+        return jsonify({"error": "康复周期不存在"}), 404
     
     conn.commit()
-    conn.close()
     
     return jsonify({"message": "康复周期及相关训练任务删除成功"})
\ No newline at end of file
@@ -0,0 +1,68 @@
+from flask import Blueprint, request, jsonify
+from database import get_db, read_transaction
+from cache import cached
+from rollups import query_stats
+from routes.tasks import build_tasks_query
+from datetime import datetime
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# 仪表盘中今日任务列表使用的字段
+DASHBOARD_TASK_FIELDS = 'id,occurrence_id,scheduled_time,exercise_name,sets,is_completed'
+
+# 指定的康复周期，未指定时取开始日期最晚的周期（与周期列表的第一项一致）
+DASHBOARD_CYCLE_SQL = 'SELECT * FROM recovery_cycles WHERE id = ?'
+LATEST_CYCLE_SQL = 'SELECT * FROM recovery_cycles ORDER BY start_date DESC LIMIT 1'
+
+# 获取仪表盘数据：周期信息、当日任务实例及完成状态、周期内的完成统计和每日趋势
+# date 为必填参数，"今天"以客户端所在时区为准；三次查询在同一个读事务中执行，结果来自同一快照
+@dashboard_bp.route('/dashboard', methods=['GET'])
+@cached('recovery_cycles', 'training_tasks', 'task_occurrences', 'exercises', 'completion_rollups')
+def get_dashboard():
+    day = request.args.get('date')
+    cycle_id = request.args.get('cycle_id')
+    
+    if not day:
+        return jsonify({"error": "请提供日期：date"}), 400
+    
+    try:
+        datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "日期格式无效，请使用YYYY-MM-DD格式"}), 400
+    
+    if cycle_id:
+        try:
+            cycle_id = int(cycle_id)
+        except ValueError:
+            return jsonify({"error": "周期ID必须是整数"}), 400
+    
+    conn = get_db()
+    
+    with read_transaction(conn):
+        cursor = conn.cursor()
+        
+        if cycle_id:
+            cursor.execute(DASHBOARD_CYCLE_SQL, (cycle_id,))
+        else:
+            cursor.execute(LATEST_CYCLE_SQL)
+        cycle = cursor.fetchone()
+        
+        if cycle is None:
+            return jsonify({"error": "康复周期不存在"}), 404
+        
+        query, params, _, _ = build_tasks_query({
+            "date": day,
+            "cycle_id": str(cycle['id']),
+            "fields": DASHBOARD_TASK_FIELDS,
+        })
+        cursor.execute(query, params)
+        tasks = [dict(row) for row in cursor.fetchall()]
+        
+        stats = query_stats(cursor, cycle_id=cycle['id'])
+    
+    return jsonify({
+        "cycle": dict(cycle),
+        "date": day,
+        "today_tasks": tasks,
+        **stats
+    })
\ No newline at end of file
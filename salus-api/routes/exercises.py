@@ -1,32 +1,32 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
+from database import get_db
+from cache import cached
+from bulk import BulkItemError, existing_ids, item_id, referenced_ids, run_bulk, target_ids
 
 exercises_bp = Blueprint('exercises', __name__)
 
 # 获取所有运动类型
 @exercises_bp.route('/exercises', methods=['GET'])
+@cached('exercises')
 def get_exercises():
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM exercises ORDER BY name')
     exercises = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
     return jsonify(exercises)
 
 # 获取单个运动类型
 @exercises_bp.route('/exercises/<int:id>', methods=['GET'])
+@cached('exercises')
 def get_exercise(id):
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM exercises WHERE id = ?', (id,))
     exercise = cursor.fetchone()
     
-    conn.close()
     
     if exercise is None:
         return jsonify({"error": "运动类型不存在"}), 404
@@ -41,7 +41,7 @@ def create_exercise():
     if not data or not all(k in data for k in ('name', 'duration_sec', 'rest_sec')):
         return jsonify({"error": "请提供必要的字段：name, duration_sec, rest_sec"}), 400
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute(
@@ -51,7 +51,6 @@ def create_exercise():
     
     conn.commit()
     new_id = cursor.lastrowid
-    conn.close()
     
     return jsonify({"id": new_id, "message": "运动类型创建成功"}), 201
 
@@ -63,13 +62,12 @@ def update_exercise(id):
     if not data:
         return jsonify({"error": "请提供更新数据"}), 400
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 检查运动类型是否存在
     cursor.execute('SELECT id FROM exercises WHERE id = ?', (id,))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "运动类型不存在"}), 404
     
     # 构建更新语句
@@ -93,7 +91,6 @@ def update_exercise(id):
         values.append(data['description'])
     
     if not fields:
-        conn.close()
         return jsonify({"error": "没有提供有效的更新字段"}), 400
     
     values.append(id)
@@ -104,31 +101,75 @@ def update_exercise(id):
     )
     
     conn.commit()
-    conn.close()
     
     return jsonify({"message": "运动类型更新成功"})
 
 # 删除运动类型
 @exercises_bp.route('/exercises/<int:id>', methods=['DELETE'])
 def delete_exercise(id):
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 检查运动类型是否存在
     cursor.execute('SELECT id FROM exercises WHERE id = ?', (id,))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "运动类型不存在"}), 404
     
     # 检查是否有训练任务引用了该运动类型
     cursor.execute('SELECT id FROM training_tasks WHERE exercise_id = ?', (id,))
     if cursor.fetchone() is not None:
-        conn.close()
         return jsonify({"error": "无法删除，该运动类型已被训练任务引用"}), 400
     
     cursor.execute('DELETE FROM exercises WHERE id = ?', (id,))
     
     conn.commit()
-    conn.close()
     
-    return jsonify({"message": "运动类型删除成功"})
\ No newline at end of file
+    return jsonify({"message": "运动类型删除成功"})
+
+# 批量创建、更新、删除运动类型
+@exercises_bp.route('/exercises/bulk', methods=['POST'])
+def bulk_exercises():
+    data = request.get_json()
+    
+    if not isinstance(data, dict):
+        return jsonify({"error": "无效的请求数据"}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    ids = target_ids(data)
+    exercise_ids = existing_ids(cursor, 'exercises', ids)
+    # 被训练任务引用的运动类型不能删除
+    referenced = referenced_ids(cursor, 'training_tasks', 'exercise_id', ids)
+    
+    def create(cursor, item):
+        if not all(k in item for k in ('name', 'duration_sec', 'rest_sec')):
+            raise BulkItemError("请提供必要的字段：name, duration_sec, rest_sec")
+        cursor.execute(
+            'INSERT INTO exercises (name, duration_sec, rest_sec, description) VALUES (?, ?, ?, ?)',
+            (item['name'], item['duration_sec'], item['rest_sec'], item.get('description', ''))
+        )
+        return {"id": cursor.lastrowid}
+    
+    def update(cursor, item):
+        id = item_id(item)
+        if id not in exercise_ids:
+            raise BulkItemError("运动类型不存在")
+        fields = {k: item[k] for k in ('name', 'duration_sec', 'rest_sec', 'description') if k in item}
+        if not fields:
+            raise BulkItemError("没有提供有效的更新字段")
+        columns = ', '.join(f'{key} = ?' for key in fields)
+        cursor.execute(f'UPDATE exercises SET {columns} WHERE id = ?', (*fields.values(), id))
+        return {"id": id}
+    
+    def delete(cursor, item):
+        id = item_id(item)
+        if id not in exercise_ids:
+            raise BulkItemError("运动类型不存在")
+        if id in referenced:
+            raise BulkItemError("无法删除，该运动类型已被训练任务引用")
+        cursor.execute('DELETE FROM exercises WHERE id = ?', (id,))
+        exercise_ids.discard(id)
+        return {"id": id}
+    
+    return run_bulk(conn, data, create=create, update=update, delete=delete)
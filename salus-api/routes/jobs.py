@@ -0,0 +1,115 @@
+from flask import Blueprint, request, jsonify, current_app, url_for
+from database import get_db
+from pagination import parse_limit, split_page
+import jobs
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# 读取布尔参数（表单中为字符串）
+def parse_flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+# 在当前请求的事务中提交后台任务，返回 202 和任务状态，Location 指向 GET /jobs/<id>
+# 排队任务数已达上限时返回 503
+def submit(kind, params=None, inputs=()):
+    queue = current_app.extensions['salus_jobs']
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        job_id = jobs.submit_job(cursor, kind, params, inputs, max_queued=queue.max_queued)
+    except jobs.QueueFull:
+        response = jsonify({"error": "排队的后台任务过多，请稍后重试"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    job = jobs.get_job(cursor, job_id)
+    conn.commit()
+    queue.wake()
+    
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.get_job_status', id=job_id)
+    return response
+
+# 查询后台任务列表（不含结果），可按状态和类型筛选，按ID倒序
+# 提供 limit 时分页，返回 {"items": [...], "next_cursor": {"before_id": ...}}
+@jobs_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    limit, error = parse_limit(request.args.get('limit'))
+    if error:
+        return jsonify({"error": error}), 400
+    
+    params = []
+    where_clauses = []
+    
+    status = request.args.get('status')
+    if status:
+        where_clauses.append('status = ?')
+        params.append(status)
+    
+    kind = request.args.get('kind')
+    if kind:
+        where_clauses.append('kind = ?')
+        params.append(kind)
+    
+    before_id = request.args.get('before_id')
+    if before_id:
+        try:
+            where_clauses.append('id < ?')
+            params.append(int(before_id))
+        except ValueError:
+            return jsonify({"error": "before_id必须是整数"}), 400
+    
+    query = '''
+        SELECT id, kind, status, stage, progress, error, cancel_requested, attempts,
+               created_at, started_at, finished_at
+        FROM jobs
+    '''
+    if where_clauses:
+        query += ' WHERE ' + ' AND '.join(where_clauses)
+    query += ' ORDER BY id DESC'
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit + 1)
+    
+    cursor = get_db().cursor()
+    cursor.execute(query, params)
+    items = [{**dict(row), "cancel_requested": bool(row['cancel_requested'])} for row in cursor.fetchall()]
+    
+    if limit is None:
+        return jsonify(items)
+    
+    items, has_more = split_page(items, limit)
+    return jsonify({
+        "items": items,
+        "next_cursor": {"before_id": items[-1]['id']} if has_more else None
+    })
+
+# 查询后台任务的状态、进度、结果和错误
+@jobs_bp.route('/jobs/<int:id>', methods=['GET'])
+def get_job_status(id):
+    job = jobs.get_job(get_db().cursor(), id)
+    if job is None:
+        return jsonify({"error": "后台任务不存在"}), 404
+    
+    return jsonify(job)
+
+# 取消后台任务：排队中的立即取消，执行中的在当前阶段或批次结束时停止
+@jobs_bp.route('/jobs/<int:id>/cancel', methods=['POST'])
+def cancel_job(id):
+    conn = get_db()
+    job = jobs.cancel_job(conn.cursor(), id)
+    if job is None:
+        return jsonify({"error": "后台任务不存在"}), 404
+    
+    conn.commit()
+    current_app.extensions['salus_jobs'].notify_cancel(id)
+    
+    if job['status'] in ('succeeded', 'failed'):
+        return jsonify({"error": "后台任务已结束", "job": job}), 409
+    
+    return jsonify(job)
\ No newline at end of file
@@ -0,0 +1,124 @@
+from flask import Blueprint, Response, request, jsonify, current_app
+import json
+import llm
+from routes.jobs import parse_flag
+
+llm_bp = Blueprint('llm', __name__)
+
+# 获取大模型生成服务，未安装依赖时返回 None
+def get_service():
+    return current_app.extensions.get('salus_llm')
+
+# Server-Sent Events 的一条事件
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# 读取请求中的生成参数（max_new_tokens 和 llm.REQUEST_PARAMS），返回 (参数, 错误信息)
+def parse_generation_params(data, max_new_tokens):
+    params = {}
+    value = data.get('max_new_tokens')
+    if value is not None:
+        if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= max_new_tokens:
+            return None, f"max_new_tokens必须是1-{max_new_tokens}之间的整数"
+        params['max_new_tokens'] = value
+    
+    for name, kind in llm.REQUEST_PARAMS.items():
+        value = data.get(name)
+        if value is None:
+            continue
+        if kind is bool:
+            valid = isinstance(value, bool)
+        elif kind is int:
+            valid = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+        else:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+        if not valid:
+            return None, f"{name}参数无效"
+        params[name] = kind(value)
+    
+    return params, None
+
+# 排队的生成请求过多时返回 503
+def queue_full():
+    response = jsonify({"error": "排队的生成请求过多，请稍后重试"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '10'
+    return response
+
+# 由提示词生成文本（JSON：prompt；可选 max_new_tokens 不超过 LLM_MAX_NEW_TOKENS，
+# 以及 do_sample、temperature、top_p、top_k、repetition_penalty），同一客户端的请求与其他客户端轮流生成
+# system 为多个请求共用的固定指令，放在提示词之前，开启前缀缓存时只计算一次；
+# json_schema 为 JSON Schema 对象，输出受其约束；thinking 为 false 时关闭思考过程
+# stream 为 true 时以 Server-Sent Events 逐段推送：text 事件为新生成的文字，
+# 结束时 done 事件为首 token 延迟、token 数和生成速度（同步返回时与文本一起返回），出错时为 error 事件；
+# 客户端断开连接后在下一个 token 处停止生成
+@llm_bp.route('/llm/generate', methods=['POST'])
+def generate_text():
+    service = get_service()
+    if service is None:
+        return jsonify({"error": "大模型生成未启用：需要安装 openvino-genai 并开启 LLM_ENABLED"}), 501
+    
+    data = request.get_json(silent=True) or {}
+    prompt = data.get('prompt')
+    if not isinstance(prompt, str) or not prompt.strip():
+        return jsonify({"error": "请提供提示词：prompt"}), 400
+    
+    system = data.get('system')
+    if system is not None and not isinstance(system, str):
+        return jsonify({"error": "system必须是字符串"}), 400
+    
+    params, error = parse_generation_params(data, service.max_new_tokens)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    json_schema = data.get('json_schema')
+    if json_schema is not None and not isinstance(json_schema, dict):
+        return jsonify({"error": "json_schema必须是对象"}), 400
+    thinking = parse_flag(data.get('thinking', True))
+    
+    client = request.remote_addr
+    if not parse_flag(data.get('stream', False)):
+        try:
+            return jsonify(service.generate(
+                prompt, client=client, system=system, thinking=thinking, json_schema=json_schema, **params
+            ))
+        except llm.QueueFull:
+            return queue_full()
+        except llm.ModelNotFound as e:
+            return jsonify({"error": str(e)}), 503
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    try:
+        stream = service.stream(
+            prompt, client=client, system=system, thinking=thinking, json_schema=json_schema, **params
+        )
+    except llm.QueueFull:
+        return queue_full()
+    
+    # 生成在后台线程中进行，响应只转发事件；等待时发送注释保活，客户端断开后写入失败，生成器随之关闭
+    def events():
+        for event, value in stream:
+            if event == 'text':
+                yield sse('text', {"text": value})
+            elif event == 'ping':
+                yield ': ping\n\n'
+            elif event == 'done':
+                yield sse('done', {key: item for key, item in value.items() if key != 'text'})
+            else:
+                yield sse('error', {"error": str(value)})
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # 不让 nginx 等反向代理缓冲，每段文字立即送达客户端
+        'X-Accel-Buffering': 'no',
+    })
+
+# 查看大模型生成服务状态：模型是否已加载、加载和预热耗时、排队和生成中的请求数、累计生成的 token 数和速度
+@llm_bp.route('/llm/stats', methods=['GET'])
+def get_llm_stats():
+    service = get_service()
+    if service is None:
+        return jsonify({"error": "大模型生成未启用：需要安装 openvino-genai 并开启 LLM_ENABLED"}), 501
+    
+    return jsonify(service.stats())
\ No newline at end of file
@@ -0,0 +1,64 @@
+from flask import Blueprint, request, jsonify, current_app
+import time
+import ocr
+from routes.jobs import parse_flag, submit
+
+ocr_bp = Blueprint('ocr', __name__)
+
+# 获取OCR服务，未安装依赖时返回 None
+def get_service():
+    return current_app.extensions.get('salus_ocr')
+
+# 识别上传的康复计划表格图片（multipart/form-data，字段 images 可上传多张）
+# format 为 markdown（默认）、latex 或 text；图片按 OCR_BATCH_SIZE 分批推理，已识别过的图片直接返回缓存结果
+# async 为 true 时作为后台任务执行，返回 202，结果通过 GET /jobs/<id> 查询
+@ocr_bp.route('/ocr', methods=['POST'])
+def recognize_images():
+    service = get_service()
+    if service is None:
+        return jsonify({"error": "OCR 需要安装 Pillow、transformers 和 optimum-intel"}), 501
+    
+    output_format = request.form.get('format', 'markdown')
+    if output_format not in ocr.FORMATS:
+        return jsonify({"error": f"format必须是{'、'.join(ocr.FORMATS)}之一"}), 400
+    
+    files = [f for f in request.files.getlist('images') if f.filename]
+    if not files:
+        return jsonify({"error": "请上传图片：images"}), 400
+    
+    max_images = current_app.config['OCR_MAX_IMAGES']
+    if len(files) > max_images:
+        return jsonify({"error": f"每次最多上传{max_images}张图片"}), 400
+    
+    # 按原始字节识别，重复上传的图片直接从结果缓存返回
+    images = [f.read() for f in files]
+    
+    if parse_flag(request.form.get('async', False)):
+        return submit('ocr', {"format": output_format}, [(f.filename, data) for f, data in zip(files, images)])
+    
+    started = time.perf_counter()
+    try:
+        results = service.recognize(images, output_format)
+    except ocr.InvalidImage as e:
+        return jsonify({"error": f"无法识别的图片：{files[e.index].filename}"}), 400
+    except ocr.ModelNotFound as e:
+        return jsonify({"error": f"OCR 模型不存在：{e}"}), 503
+    except ImportError:
+        return jsonify({"error": "OCR 需要安装 Pillow、transformers 和 optimum-intel"}), 501
+    elapsed = time.perf_counter() - started
+    
+    return jsonify({
+        "format": output_format,
+        "results": [{"filename": f.filename, **result} for f, result in zip(files, results)],
+        "seconds": round(elapsed, 3),
+        "images_per_minute": round(len(images) / elapsed * 60, 2) if elapsed else None,
+    })
+
+# 查看OCR服务状态：模型是否已加载、加载耗时、累计识别的图片数和吞吐量
+@ocr_bp.route('/ocr/stats', methods=['GET'])
+def get_ocr_stats():
+    service = get_service()
+    if service is None:
+        return jsonify({"error": "OCR 需要安装 Pillow、transformers 和 optimum-intel"}), 501
+    
+    return jsonify(service.stats())
\ No newline at end of file
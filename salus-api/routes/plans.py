@@ -0,0 +1,45 @@
+from flask import Blueprint, request, jsonify, current_app
+from database import get_db
+from routes.jobs import parse_flag, submit
+
+plans_bp = Blueprint('plans', __name__)
+
+# 提交医嘱表格导入任务，返回 202 和后台任务状态，之后通过 GET /jobs/<id> 查询进度和结果
+# multipart/form-data：images 上传表格图片（可多张）；JSON：table 提交 LaTeX 或 Markdown 表格文本
+# cycle_id 为导入到的康复周期；dry_run 为 true 时只提取计划，不写入数据库
+@plans_bp.route('/plans/import', methods=['POST'])
+def import_plan():
+    if 'salus_llm' not in current_app.extensions:
+        return jsonify({"error": "计划导入未启用：需要安装 openvino-genai 并开启 LLM_ENABLED"}), 501
+    
+    if request.files:
+        data = request.form
+        files = [f for f in request.files.getlist('images') if f.filename]
+        table = None
+        if not files:
+            return jsonify({"error": "请上传图片：images"}), 400
+        if 'salus_ocr' not in current_app.extensions:
+            return jsonify({"error": "识别图片需要安装 Pillow、transformers 和 optimum-intel"}), 501
+        max_images = current_app.config['OCR_MAX_IMAGES']
+        if len(files) > max_images:
+            return jsonify({"error": f"每次最多上传{max_images}张图片"}), 400
+    else:
+        data = request.get_json(silent=True) or {}
+        files = []
+        table = data.get('table')
+        if not isinstance(table, str) or not table.strip():
+            return jsonify({"error": "请上传图片 images 或提供表格文本 table"}), 400
+    
+    try:
+        cycle_id = int(data.get('cycle_id'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "请提供康复周期ID：cycle_id"}), 400
+    
+    # 验证周期ID是否存在（写入时会在事务中再次检查）
+    cursor = get_db().cursor()
+    cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (cycle_id,))
+    if cursor.fetchone() is None:
+        return jsonify({"error": "指定的康复周期不存在"}), 400
+    
+    params = {"cycle_id": cycle_id, "table": table, "dry_run": parse_flag(data.get('dry_run', False))}
+    return submit('plan_import', params, [(f.filename, f.read()) for f in files])
\ No newline at end of file
@@ -1,26 +1,144 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
+from database import get_db
+from cache import cached
+from occurrences import attach_completion, find_occurrence, sync_occurrences, week_dates
+from pagination import parse_fields, parse_limit, split_page
+from bulk import BulkItemError, existing_ids, item_id, parse_int, referenced_values, run_bulk, target_ids
 from datetime import datetime, date
 
 tasks_bp = Blueprint('tasks', __name__)
 
-# 获取所有训练任务
-@tasks_bp.route('/tasks', methods=['GET'])
-def get_tasks():
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+# 规范化时间字符串为HH:MM:SS，格式无效时返回None
+def normalize_time(value):
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%H:%M:%S')
+        except (TypeError, ValueError):
+            continue
+    return None
+
+# 校验训练任务字段，partial为True时用于更新（所有字段可选）
+# 返回 (规范化后的字段, 错误信息)，不检查周期和运动是否存在
+def validate_task_fields(data, partial=False):
+    required_fields = ['cycle_id', 'exercise_id', 'scheduled_time', 'sets']
+    if not partial and not all(k in data for k in required_fields):
+        return None, f"请提供必要的字段：{', '.join(required_fields)}"
+    
+    fields = {}
+    
+    # 单个和批量接口共用这里的类型检查，ID 转换为整数后再检查是否存在
+    for key, error in (('cycle_id', "周期ID必须是整数"), ('exercise_id', "运动ID必须是整数")):
+        if key in data:
+            fields[key] = parse_int(data[key])
+            if fields[key] is None:
+                return None, error
+    
+    if 'sets' in data:
+        fields['sets'] = parse_int(data['sets'])
+        if fields['sets'] is None or fields['sets'] < 1:
+            return None, "组数必须是正整数"
+    
+    # 验证时间格式
+    if 'scheduled_time' in data:
+        fields['scheduled_time'] = normalize_time(data['scheduled_time'])
+        if fields['scheduled_time'] is None:
+            return None, "时间格式无效，请使用HH:MM:SS或HH:MM格式"
+    
+    # 验证day_of_week（如果提供）
+    if 'day_of_week' in data:
+        if data['day_of_week'] is not None:
+            try:
+                day = int(data['day_of_week'])
+                if not (0 <= day <= 6):
+                    return None, "星期几必须是0-6之间的整数"
+            except (TypeError, ValueError):
+                return None, "星期几必须是整数"
+        
+        fields['day_of_week'] = data['day_of_week']
+    
+    # 验证specific_date格式（如果提供）
+    if 'specific_date' in data:
+        if data['specific_date']:
+            try:
+                datetime.strptime(data['specific_date'], '%Y-%m-%d')
+            except (TypeError, ValueError):
+                return None, "日期格式无效，请使用YYYY-MM-DD格式"
+        
+        fields['specific_date'] = data['specific_date']
     
+    # 完成状态由 completions 上的触发器维护，直接写入会与任务实例和完成汇总不一致
+    if 'is_completed' in data:
+        return None, "完成状态由完成记录维护，不能直接修改，请创建或删除完成记录"
+    
+    return fields, None
+
+# 插入训练任务，返回新任务ID
+def insert_task(cursor, fields):
+    cursor.execute(
+        '''
+        INSERT INTO training_tasks 
+        (cycle_id, exercise_id, scheduled_time, sets, day_of_week, specific_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+        (
+            fields['cycle_id'], 
+            fields['exercise_id'], 
+            fields['scheduled_time'], 
+            fields['sets'], 
+            fields.get('day_of_week'), 
+            fields.get('specific_date')
+        )
+    )
+    return cursor.lastrowid
+
+# 按字段更新训练任务
+def update_task_fields(cursor, id, fields):
+    columns = ', '.join(f'{key} = ?' for key in fields)
+    cursor.execute(
+        f'UPDATE training_tasks SET {columns} WHERE id = ?',
+        (*fields.values(), id)
+    )
+
+# GET /tasks 可选字段及其SQL表达式
+TASK_COLUMNS = {
+    'id': 't.id',
+    'cycle_id': 't.cycle_id',
+    'exercise_id': 't.exercise_id',
+    'scheduled_time': 't.scheduled_time',
+    'sets': 't.sets',
+    'day_of_week': 't.day_of_week',
+    'specific_date': 't.specific_date',
+    'is_completed': 't.is_completed',
+    'created_at': 't.created_at',
+    'exercise_name': 'e.name',
+    'duration_sec': 'e.duration_sec',
+    'rest_sec': 'e.rest_sec',
+}
+
+# 按日期查询时返回任务实例，完成状态取该日实例的状态
+OCCURRENCE_COLUMNS = {
+    **TASK_COLUMNS,
+    'is_completed': 'o.is_completed',
+    'occurrence_id': 'o.id',
+    'occurs_on': 'o.occurs_on',
+}
+
+# 根据查询参数构建 GET /tasks 的查询，返回 (SQL, 参数, 分页条数, 错误信息)
+def build_tasks_query(args):
     # 支持按日期筛选
-    specific_date = request.args.get('date')
-    day_of_week = request.args.get('day_of_week')
-    cycle_id = request.args.get('cycle_id')
+    specific_date = args.get('date')
+    day_of_week = args.get('day_of_week')
+    cycle_id = args.get('cycle_id')
+    after_id = args.get('after_id')
+    
+    limit, error = parse_limit(args.get('limit'))
+    if error:
+        return None, None, None, error
     
-    query = '''
-        SELECT t.*, e.name as exercise_name, e.duration_sec, e.rest_sec
-        FROM training_tasks t
-        JOIN exercises e ON t.exercise_id = e.id
-    '''
+    columns = OCCURRENCE_COLUMNS if specific_date else TASK_COLUMNS
+    select, error = parse_fields(args.get('fields'), columns, required=('id',) if limit else ())
+    if error:
+        return None, None, None, error
     
     params = []
     where_clauses = []
@@ -28,82 +146,130 @@ def get_tasks():
     if specific_date:
         try:
             # 验证日期格式
-            parsed_date = datetime.strptime(specific_date, '%Y-%m-%d').date()
-            where_clauses.append('(t.specific_date = ? OR t.specific_date IS NULL)')
-            params.append(specific_date)
+            datetime.strptime(specific_date, '%Y-%m-%d')
         except ValueError:
-            conn.close()
-            return jsonify({"error": "日期格式无效，请使用YYYY-MM-DD格式"}), 400
+            return None, None, None, "日期格式无效，请使用YYYY-MM-DD格式"
+        
+        # 按日期查询时直接查找当天的任务实例
+        query = f'''
+            SELECT {select}
+            FROM task_occurrences o
+            JOIN training_tasks t ON o.task_id = t.id
+            JOIN exercises e ON t.exercise_id = e.id
+        '''
+        where_clauses.append('o.occurs_on = ?')
+        params.append(specific_date)
+        cycle_column = 'o.cycle_id'
+    else:
+        query = f'''
+            SELECT {select}
+            FROM training_tasks t
+            JOIN exercises e ON t.exercise_id = e.id
+        '''
+        cycle_column = 't.cycle_id'
     
     if day_of_week:
         try:
             day = int(day_of_week)
-            if 0 <= day <= 6:
-                if where_clauses:
-                    where_clauses.append('(t.day_of_week = ? OR t.day_of_week IS NULL)')
-                else:
-                    where_clauses.append('t.day_of_week = ?')
-                params.append(day)
-            else:
-                conn.close()
-                return jsonify({"error": "星期几必须是0-6之间的整数"}), 400
+            if not (0 <= day <= 6):
+                return None, None, None, "星期几必须是0-6之间的整数"
         except ValueError:
-            conn.close()
-            return jsonify({"error": "星期几必须是整数"}), 400
+            return None, None, None, "星期几必须是整数"
+        
+        # 按日期查询时实例已按星期展开，无需再筛选
+        if not specific_date:
+            where_clauses.append('t.day_of_week = ?')
+            params.append(day)
     
     if cycle_id:
         try:
             cycle = int(cycle_id)
-            where_clauses.append('t.cycle_id = ?')
+            where_clauses.append(f'{cycle_column} = ?')
             params.append(cycle)
         except ValueError:
-            conn.close()
-            return jsonify({"error": "周期ID必须是整数"}), 400
+            return None, None, None, "周期ID必须是整数"
+    
+    if after_id:
+        try:
+            where_clauses.append('t.id > ?')
+            params.append(int(after_id))
+        except ValueError:
+            return None, None, None, "after_id必须是整数"
     
     if where_clauses:
         query += ' WHERE ' + ' AND '.join(where_clauses)
     
-    query += ' ORDER BY t.specific_date'
+    if limit:
+        query += ' ORDER BY t.id LIMIT ?'
+        params.append(limit + 1)
+    elif specific_date:
+        query += ' ORDER BY t.scheduled_time'
+    else:
+        query += ' ORDER BY t.specific_date'
     
+    return query, params, limit, None
+
+# 不分页时直接返回列表，否则返回一页数据和下一页游标
+def tasks_page(tasks, limit):
+    if limit is None:
+        return tasks
+    
+    tasks, has_more = split_page(tasks, limit)
+    return {
+        "items": tasks,
+        "next_cursor": {"after_id": tasks[-1]['id']} if has_more else None
+    }
+
+# 获取所有训练任务
+# 提供 limit 时按任务ID分页，返回 {"items": [...], "next_cursor": {"after_id": ...}}
+@tasks_bp.route('/tasks', methods=['GET'])
+@cached('training_tasks', 'task_occurrences', 'exercises')
+def get_tasks():
+    query, params, limit, error = build_tasks_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    cursor = get_db().cursor()
     cursor.execute(query, params)
     tasks = [dict(row) for row in cursor.fetchall()]
     
-    conn.close()
-    return jsonify(tasks)
+    return jsonify(tasks_page(tasks, limit))
+
+# 单个训练任务及其完成记录
+TASK_DETAIL_SQL = '''
+    SELECT t.*, e.name as exercise_name, e.duration_sec, e.rest_sec
+    FROM training_tasks t
+    JOIN exercises e ON t.exercise_id = e.id
+    WHERE t.id = ?
+'''
+
+TASK_COMPLETIONS_SQL = '''
+    SELECT * FROM completions
+    WHERE task_id = ?
+    ORDER BY completed_at DESC
+'''
 
 # 获取单个训练任务
 @tasks_bp.route('/tasks/<int:id>', methods=['GET'])
 def get_task(id):
-    conn = sqlite3.connect('salus.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT t.*, e.name as exercise_name, e.duration_sec, e.rest_sec
-        FROM training_tasks t
-        JOIN exercises e ON t.exercise_id = e.id
-        WHERE t.id = ?
-    ''', (id,))
+    cursor.execute(TASK_DETAIL_SQL, (id,))
     
     task = cursor.fetchone()
     
     if task is None:
-        conn.close()
         return jsonify({"error": "训练任务不存在"}), 404
     
     # 获取完成记录
-    cursor.execute('''
-        SELECT * FROM completions
-        WHERE task_id = ?
-        ORDER BY completed_at DESC
-    ''', (id,))
+    cursor.execute(TASK_COMPLETIONS_SQL, (id,))
     
     completions = [dict(row) for row in cursor.fetchall()]
     
     result = dict(task)
     result['completions'] = completions
     
-    conn.close()
     return jsonify(result)
 
 # 创建新的训练任务
@@ -111,77 +277,135 @@ def get_task(id):
 def create_task():
     data = request.get_json()
     
-    required_fields = ['cycle_id', 'exercise_id', 'scheduled_time', 'sets']
-    if not data or not all(k in data for k in required_fields):
-        return jsonify({"error": f"请提供必要的字段：{', '.join(required_fields)}"}), 400
+    if not data:
+        return jsonify({"error": "请提供必要的字段：cycle_id, exercise_id, scheduled_time, sets"}), 400
     
-    conn = sqlite3.connect('salus.db')
+    fields, error = validate_task_fields(data)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    conn = get_db()
     cursor = conn.cursor()
     
     # 验证周期ID是否存在
-    cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (data['cycle_id'],))
+    cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (fields['cycle_id'],))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "指定的康复周期不存在"}), 400
     
     # 验证运动ID是否存在
-    cursor.execute('SELECT id FROM exercises WHERE id = ?', (data['exercise_id'],))
+    cursor.execute('SELECT id FROM exercises WHERE id = ?', (fields['exercise_id'],))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "指定的运动类型不存在"}), 400
     
-    # 验证时间格式
+    new_id = insert_task(cursor, fields)
+    sync_occurrences(cursor, task_ids=[new_id])
+    conn.commit()
+    
+    return jsonify({"id": new_id, "message": "训练任务创建成功"}), 201
+
+# 批量创建训练任务：按周和星期展开为具体日期，一次事务写入
+@tasks_bp.route('/tasks/batch', methods=['POST'])
+def create_tasks_batch():
+    data = request.get_json()
+    
+    required_fields = ['cycle_id', 'start_week', 'end_week', 'days', 'scheduled_time', 'sets']
+    if not data or not all(k in data for k in required_fields):
+        return jsonify({"error": f"请提供必要的字段：{', '.join(required_fields)}"}), 400
+    
+    # 支持单个 exercise_id 或多个 exercise_ids
+    exercise_ids = data.get('exercise_ids') or ([data['exercise_id']] if data.get('exercise_id') is not None else [])
+    if not exercise_ids:
+        return jsonify({"error": "请提供必要的字段：exercise_id 或 exercise_ids"}), 400
+    
     try:
-        datetime.strptime(data['scheduled_time'], '%H:%M:%S')
-    except ValueError:
-        try:
-            # 尝试没有秒的格式
-            time_str = datetime.strptime(data['scheduled_time'], '%H:%M').strftime('%H:%M:%S')
-            data['scheduled_time'] = time_str
-        except ValueError:
-            conn.close()
-            return jsonify({"error": "时间格式无效，请使用HH:MM:SS或HH:MM格式"}), 400
+        exercise_ids = sorted({int(e) for e in exercise_ids})
+        start_week = int(data['start_week'])
+        end_week = int(data['end_week'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "周数和运动ID必须是整数"}), 400
+    
+    if start_week < 1 or start_week > end_week:
+        return jsonify({"error": "开始周必须大于0且不能大于结束周"}), 400
+    
+    # days 必须是整数列表（字符串会被逐个字符读取），在写入前校验
+    days = data['days']
+    if (not isinstance(days, list) or not days
+            or not all(isinstance(d, int) and not isinstance(d, bool) and 0 <= d <= 6 for d in days)):
+        return jsonify({"error": "星期几必须是0-6之间的整数列表"}), 400
+    days = sorted(set(days))
+    
+    sets = parse_int(data['sets'])
+    if sets is None or sets < 1:
+        return jsonify({"error": "组数必须是正整数"}), 400
     
-    # 验证specific_date格式（如果提供）
-    if 'specific_date' in data and data['specific_date']:
-        try:
-            datetime.strptime(data['specific_date'], '%Y-%m-%d')
-        except ValueError:
-            conn.close()
-            return jsonify({"error": "日期格式无效，请使用YYYY-MM-DD格式"}), 400
+    # 验证时间格式
+    scheduled_time = normalize_time(data['scheduled_time'])
+    if scheduled_time is None:
+        return jsonify({"error": "时间格式无效，请使用HH:MM:SS或HH:MM格式"}), 400
     
-    # 验证day_of_week（如果提供）
-    if 'day_of_week' in data and data['day_of_week'] is not None:
-        try:
-            day = int(data['day_of_week'])
-            if not (0 <= day <= 6):
-                conn.close()
-                return jsonify({"error": "星期几必须是0-6之间的整数"}), 400
-        except ValueError:
-            conn.close()
-            return jsonify({"error": "星期几必须是整数"}), 400
+    conn = get_db()
+    cursor = conn.cursor()
     
-    cursor.execute(
+    # 验证周期ID是否存在，并取得周期日期范围
+    cursor.execute('SELECT start_date, end_date FROM recovery_cycles WHERE id = ?', (data['cycle_id'],))
+    cycle = cursor.fetchone()
+    if cycle is None:
+        return jsonify({"error": "指定的康复周期不存在"}), 400
+    
+    # 一次查询验证所有运动ID
+    placeholders = ', '.join('?' * len(exercise_ids))
+    cursor.execute(f'SELECT id FROM exercises WHERE id IN ({placeholders})', exercise_ids)
+    missing = set(exercise_ids) - {row['id'] for row in cursor.fetchall()}
+    if missing:
+        return jsonify({"error": f"指定的运动类型不存在：{', '.join(map(str, sorted(missing)))}"}), 400
+    
+    cycle_start = datetime.strptime(cycle['start_date'], '%Y-%m-%d').date()
+    cycle_end = datetime.strptime(cycle['end_date'], '%Y-%m-%d').date()
+    
+    dates = week_dates(cycle_start, cycle_end, start_week, end_week, days)
+    
+    if not dates:
+        return jsonify({"error": "所选周次超出康复周期范围"}), 400
+    
+    # 查找已存在的相同任务（同周期、运动、日期和时间）
+    cursor.execute(f'''
+        SELECT id, exercise_id, specific_date FROM training_tasks
+        WHERE cycle_id = ? AND scheduled_time = ?
+          AND specific_date BETWEEN ? AND ?
+          AND exercise_id IN ({placeholders})
+    ''', (data['cycle_id'], scheduled_time, dates[0][0], dates[-1][0], *exercise_ids))
+    existing = {(row['exercise_id'], row['specific_date']): row['id'] for row in cursor.fetchall()}
+    
+    rows = []
+    conflicts = []
+    for exercise_id in exercise_ids:
+        for specific_date, day in dates:
+            task_id = existing.get((exercise_id, specific_date))
+            if task_id is not None:
+                conflicts.append({"task_id": task_id, "exercise_id": exercise_id, "date": specific_date})
+                continue
+            rows.append((data['cycle_id'], exercise_id, scheduled_time, sets, day, specific_date))
+    
+    cursor.executemany(
         '''
         INSERT INTO training_tasks 
         (cycle_id, exercise_id, scheduled_time, sets, day_of_week, specific_date)
         VALUES (?, ?, ?, ?, ?, ?)
         ''',
-        (
-            data['cycle_id'], 
-            data['exercise_id'], 
-            data['scheduled_time'], 
-            data['sets'], 
-            data.get('day_of_week'), 
-            data.get('specific_date')
-        )
+        rows
     )
     
+    # 生成新任务的日期实例
+    sync_occurrences(cursor, cycle_ids=[data['cycle_id']])
+    
     conn.commit()
-    new_id = cursor.lastrowid
-    conn.close()
     
-    return jsonify({"id": new_id, "message": "训练任务创建成功"}), 201
+    return jsonify({
+        "message": "批量创建训练任务成功",
+        "created": len(rows),
+        "skipped": len(conflicts),
+        "conflicts": conflicts
+    }), 201
 
 # 更新训练任务
 @tasks_bp.route('/tasks/<int:id>', methods=['PUT'])
@@ -191,124 +415,51 @@ def update_task(id):
     if not data:
         return jsonify({"error": "请提供更新数据"}), 400
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 检查训练任务是否存在
     cursor.execute('SELECT id FROM training_tasks WHERE id = ?', (id,))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "训练任务不存在"}), 404
     
-    # 构建更新语句
-    fields = []
-    values = []
+    fields, error = validate_task_fields(data, partial=True)
+    if error:
+        return jsonify({"error": error}), 400
     
-    if 'cycle_id' in data:
+    if 'cycle_id' in fields:
         # 验证周期ID是否存在
-        cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (data['cycle_id'],))
+        cursor.execute('SELECT id FROM recovery_cycles WHERE id = ?', (fields['cycle_id'],))
         if cursor.fetchone() is None:
-            conn.close()
             return jsonify({"error": "指定的康复周期不存在"}), 400
-        
-        fields.append('cycle_id = ?')
-        values.append(data['cycle_id'])
     
-    if 'exercise_id' in data:
+    if 'exercise_id' in fields:
         # 验证运动ID是否存在
-        cursor.execute('SELECT id FROM exercises WHERE id = ?', (data['exercise_id'],))
+        cursor.execute('SELECT id FROM exercises WHERE id = ?', (fields['exercise_id'],))
         if cursor.fetchone() is None:
-            conn.close()
             return jsonify({"error": "指定的运动类型不存在"}), 400
-        
-        fields.append('exercise_id = ?')
-        values.append(data['exercise_id'])
-    
-    if 'scheduled_time' in data:
-        # 验证时间格式
-        try:
-            datetime.strptime(data['scheduled_time'], '%H:%M:%S')
-            fields.append('scheduled_time = ?')
-            values.append(data['scheduled_time'])
-        except ValueError:
-            try:
-                # 尝试没有秒的格式
-                time_str = datetime.strptime(data['scheduled_time'], '%H:%M').strftime('%H:%M:%S')
-                fields.append('scheduled_time = ?')
-                values.append(time_str)
-            except ValueError:
-                conn.close()
-                return jsonify({"error": "时间格式无效，请使用HH:MM:SS或HH:MM格式"}), 400
-    
-    if 'sets' in data:
-        fields.append('sets = ?')
-        values.append(data['sets'])
-    
-    if 'day_of_week' in data:
-        if data['day_of_week'] is not None:
-            try:
-                day = int(data['day_of_week'])
-                if not (0 <= day <= 6):
-                    conn.close()
-                    return jsonify({"error": "星期几必须是0-6之间的整数"}), 400
-            except ValueError:
-                conn.close()
-                return jsonify({"error": "星期几必须是整数"}), 400
-        
-        fields.append('day_of_week = ?')
-        values.append(data['day_of_week'])
-    
-    if 'specific_date' in data:
-        if data['specific_date']:
-            try:
-                datetime.strptime(data['specific_date'], '%Y-%m-%d')
-            except ValueError:
-                conn.close()
-                return jsonify({"error": "日期格式无效，请使用YYYY-MM-DD格式"}), 400
-        
-        fields.append('specific_date = ?')
-        values.append(data['specific_date'])
-    
-    if 'is_completed' in data:
-        fields.append('is_completed = ?')
-        values.append(1 if data['is_completed'] else 0)
     
     if not fields:
-        conn.close()
         return jsonify({"error": "没有提供有效的更新字段"}), 400
     
-    values.append(id)
-    
-    cursor.execute(
-        f'UPDATE training_tasks SET {", ".join(fields)} WHERE id = ?',
-        tuple(values)
-    )
-    
+    update_task_fields(cursor, id, fields)
+    sync_occurrences(cursor, task_ids=[id])
     conn.commit()
-    conn.close()
     
     return jsonify({"message": "训练任务更新成功"})
 
 # 删除训练任务
 @tasks_bp.route('/tasks/<int:id>', methods=['DELETE'])
 def delete_task(id):
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # 检查训练任务是否存在
-    cursor.execute('SELECT id FROM training_tasks WHERE id = ?', (id,))
-    if cursor.fetchone() is None:
-        conn.close()
-        return jsonify({"error": "训练任务不存在"}), 404
-    
-    # 删除相关的完成记录
-    cursor.execute('DELETE FROM completions WHERE task_id = ?', (id,))
-    
-    # 删除训练任务
+    # 相关的完成记录和任务实例由外键级联删除（见迁移 11）
     cursor.execute('DELETE FROM training_tasks WHERE id = ?', (id,))
+    if cursor.rowcount == 0:
+        return jsonify({"error": "训练任务不存在"}), 404
     
     conn.commit()
-    conn.close()
     
     return jsonify({"message": "训练任务及相关完成记录删除成功"})
 
@@ -317,29 +468,94 @@ def delete_task(id):
 def complete_task(id):
     data = request.get_json() or {}
     
-    conn = sqlite3.connect('salus.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 检查训练任务是否存在
     cursor.execute('SELECT id FROM training_tasks WHERE id = ?', (id,))
     if cursor.fetchone() is None:
-        conn.close()
         return jsonify({"error": "训练任务不存在"}), 404
     
-    # 更新任务状态为已完成
-    cursor.execute('UPDATE training_tasks SET is_completed = 1 WHERE id = ?', (id,))
+    # 可指定完成哪一天的实例，默认为完成记录当天
+    occurrence_id = None
+    if data.get('date'):
+        occurrence_id = find_occurrence(cursor, id, data['date'])
+        if occurrence_id is None:
+            return jsonify({"error": "该任务在指定日期没有安排"}), 400
     
-    # 添加完成记录
+    # 添加完成记录（任务和实例的完成状态由触发器更新）
     cursor.execute(
         'INSERT INTO completions (task_id, actual_sets, notes) VALUES (?, ?, ?)',
         (id, data.get('actual_sets'), data.get('notes', ''))
     )
+    completion_id = cursor.lastrowid
+    attach_completion(cursor, completion_id, occurrence_id)
     
     conn.commit()
-    completion_id = cursor.lastrowid
-    conn.close()
     
     return jsonify({
         "message": "任务已标记为完成",
         "completion_id": completion_id
-    })
\ No newline at end of file
+    })
+
+# 批量创建、更新、删除训练任务
+@tasks_bp.route('/tasks/bulk', methods=['POST'])
+def bulk_tasks():
+    data = request.get_json()
+    
+    if not isinstance(data, dict):
+        return jsonify({"error": "无效的请求数据"}), 400
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    # 每类引用只查询一次
+    cycle_ids = existing_ids(cursor, 'recovery_cycles', referenced_values(data, 'cycle_id'))
+    exercise_ids = existing_ids(cursor, 'exercises', referenced_values(data, 'exercise_id'))
+    task_ids = existing_ids(cursor, 'training_tasks', target_ids(data))
+    
+    # 新建或修改过的任务，提交前统一同步实例
+    changed = set()
+    
+    def check_references(fields):
+        if 'cycle_id' in fields and fields['cycle_id'] not in cycle_ids:
+            raise BulkItemError("指定的康复周期不存在")
+        if 'exercise_id' in fields and fields['exercise_id'] not in exercise_ids:
+            raise BulkItemError("指定的运动类型不存在")
+    
+    def create(cursor, item):
+        fields, error = validate_task_fields(item)
+        if error:
+            raise BulkItemError(error)
+        check_references(fields)
+        new_id = insert_task(cursor, fields)
+        changed.add(new_id)
+        return {"id": new_id}
+    
+    def update(cursor, item):
+        id = item_id(item)
+        if id not in task_ids:
+            raise BulkItemError("训练任务不存在")
+        fields, error = validate_task_fields({k: v for k, v in item.items() if k != 'id'}, partial=True)
+        if error:
+            raise BulkItemError(error)
+        if not fields:
+            raise BulkItemError("没有提供有效的更新字段")
+        check_references(fields)
+        update_task_fields(cursor, id, fields)
+        changed.add(id)
+        return {"id": id}
+    
+    def delete(cursor, item):
+        id = item_id(item)
+        if id not in task_ids:
+            raise BulkItemError("训练任务不存在")
+        cursor.execute('DELETE FROM training_tasks WHERE id = ?', (id,))
+        task_ids.discard(id)
+        changed.discard(id)
+        return {"id": id}
+    
+    return run_bulk(
+        conn, data, create=create, update=update, delete=delete,
+        before_commit=lambda cursor: sync_occurrences(cursor, task_ids=changed)
+    )
@@ -16,6 +16,8 @@ const api = {
   createTask: (data) => axios.post(`${API_BASE_URL}/tasks`, data),
   updateTask: (id, data) => axios.put(`${API_BASE_URL}/tasks/${id}`, data),
   completeTask: (id, data) => axios.post(`${API_BASE_URL}/tasks/${id}/complete`, data),
+  createTasksBatch: (data) => axios.post(`${API_BASE_URL}/tasks/batch`, data),
+  bulkTasks: (data) => axios.post(`${API_BASE_URL}/tasks/bulk`, data),
   
   // 运动类型相关
   getExercises: () => axios.get(`${API_BASE_URL}/exercises`),
@@ -23,6 +25,7 @@ const api = {
   createExercise: (data) => axios.post(`${API_BASE_URL}/exercises`, data),
   updateExercise: (id, data) => axios.put(`${API_BASE_URL}/exercises/${id}`, data),
   deleteExercise: (id) => axios.delete(`${API_BASE_URL}/exercises/${id}`),
+  bulkExercises: (data) => axios.post(`${API_BASE_URL}/exercises/bulk`, data),
   
   // 完成记录相关
   getCompletions: (params) => axios.get(`${API_BASE_URL}/completions`, { params }),
@@ -31,6 +34,10 @@ const api = {
   updateCompletion: (id, data) => axios.put(`${API_BASE_URL}/completions/${id}`, data),
   deleteCompletion: (id) => axios.delete(`${API_BASE_URL}/completions/${id}`),
   getCompletionStats: (params) => axios.get(`${API_BASE_URL}/completions/stats`, { params }),
+  bulkCompletions: (data) => axios.post(`${API_BASE_URL}/completions/bulk`, data),
+  
+  // 仪表盘
+  getDashboard: (params) => axios.get(`${API_BASE_URL}/dashboard`, { params }),
 };
 
 export default api;
\ No newline at end of file